@@ -97,6 +97,22 @@ export interface FallbackEndpoint {
   skin_domains?: string
 }
 
+// Fallback endpoint runtime health (circuit breaker + latency)
+export interface FallbackHealth {
+  state: 'closed' | 'open' | 'half_open'
+  error_rate: number
+  consecutive_failures: number
+  successes: number
+  failures: number
+  timeouts: number
+  retry_in_seconds: number
+  samples: number
+  latency_ms_ewma: number
+  latency_ms_p50: number
+  latency_ms_p95: number
+  hedge_delay_ms: number
+}
+
 // Whitelist entry
 export interface WhitelistEntry {
   username: string
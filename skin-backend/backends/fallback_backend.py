@@ -1,28 +1,86 @@
 import aiohttp
 import asyncio
 import logging
+import time
 from typing import Optional, List, Dict, Callable
 from fastapi.responses import Response
 from database_module import Database
+from services.fallback_cache import FallbackResponseCache
+from services.fallback_health import FallbackHealth, is_failure_status
+from services.http_client import OutboundHTTPClient
+from utils.singleflight import SingleFlight
 
 logger = logging.getLogger("yggdrasil.fallback")
 
+# 上游明确答复「不存在」的状态码，作为负结果缓存；其它失败不缓存
+_NOT_FOUND_STATUSES = (204, 404)
+
+
+def _json_response(content: bytes) -> Response:
+    return Response(content=content, status_code=200, media_type="application/json")
+
+
+def _share(resp: Optional[Response]) -> Optional[Response]:
+    """合并执行的结果由多个请求共享，每个请求各自拿一个新的 Response。"""
+    return _json_response(resp.body) if resp is not None else None
+
+
 class FallbackBackend:
-    def __init__(self, db: Database):
+    def __init__(
+        self,
+        db: Database,
+        cache: Optional[FallbackResponseCache] = None,
+        http: Optional[OutboundHTTPClient] = None,
+        health: Optional[FallbackHealth] = None,
+    ):
         self.db = db
+        self.cache = cache if cache is not None else FallbackResponseCache()
+        # 共享连接池由 lifespan 启动/关闭；超时由连接池统一配置
+        self.http = http if http is not None else OutboundHTTPClient()
+        self.health = health if health is not None else FallbackHealth()
+        # 合并相同的并发查询：同一玩家名 / UUID 同时只向上游发一次
+        self.flights = SingleFlight()
+
+    def _observe(self, service: dict, started: float, status: int) -> None:
+        """收到上游响应头时调用：限流与 5xx 计为端点故障，其余记录应答耗时。"""
+        if is_failure_status(status):
+            self.health.record_failure(service.get("id"))
+        else:
+            self.health.observe(service.get("id"), (time.perf_counter() - started) * 1000)
+
+    def _acquire(self, service: dict) -> bool:
+        """紧挨着真正发出上游请求前调用：熔断冷却结束的端点只放行一个探测请求。
+
+        缓存命中、开关关闭、白名单拦截等不发请求的路径不占用探测名额。
+        """
+        return self.health.acquire(service.get("id"))
+
+    def _cancelled(self, service: dict) -> None:
+        """请求被取消（并行/对冲中落败）：交还探测名额，不计成功也不计失败。"""
+        self.health.release(service.get("id"))
+
+    def _failed(self, service: dict, error: Exception, label: str) -> None:
+        """连接错误、超时等异常：记录日志并计为端点故障。"""
+        logger.error(f"[Fallback] {label} failed: {error} | Service: {service.get('id')}")
+        self.health.record_failure(service.get("id"), error)
 
     async def _resolve_fallbacks(self) -> tuple[list[dict], str]:
         services = await self.db.fallback.list_endpoints()
+        # 端点配置变更后整体清空响应缓存与端点健康状态
+        self.cache.sync(self.db.fallback.version)
+        self.health.sync(self.db.fallback.version)
         if not services:
             return [], "serial"
         strategy = await self.db.setting.get("fallback_strategy", "serial")
-        return services, strategy
+        # 跳过熔断中的端点；可选按实测延迟重排
+        adaptive = await self.db.setting.get("fallback_adaptive_order", "false") == "true"
+        return self.health.order(services, adaptive), strategy
 
     async def _run_fallbacks(self, services: list[dict], strategy: str, request_func: Callable):
         if not services:
             return None
 
-        async with aiohttp.ClientSession() as session:
+        async with self.http.session() as session:
             async def run_one(service: dict):
                 return await request_func(service, session)
 
@@ -42,12 +100,56 @@ class FallbackBackend:
                             task.cancel()
                 return None
 
+            if strategy == "hedged":
+                return await self._run_hedged(services, run_one)
+
             for service in services:
                 result = await run_one(service)
                 if result is not None:
                     return result
         return None
 
+    async def _run_hedged(self, services: list[dict], run_one: Callable):
+        """对冲调度：先请求首选端点，超过其 p95 延迟仍无应答则补发下一个端点。
+
+        某个端点答复「无结果」时立即转向下一个端点（同顺序策略）；
+        先到的有效应答胜出，其余请求取消。
+        """
+        pending: dict = {}  # {task: 是否为超时补发}
+        next_index = 0
+        hedges = 0
+
+        def launch(hedge: bool) -> dict:
+            nonlocal next_index
+            service = services[next_index]
+            next_index += 1
+            pending[asyncio.create_task(run_one(service))] = hedge
+            return service
+
+        current = launch(False)
+        try:
+            while pending:
+                timeout = self.health.hedge_delay(current.get("id")) if next_index < len(services) else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # 超时未应答：补发下一个端点，原请求继续等待
+                    hedges += 1
+                    current = launch(True)
+                    continue
+                for task in done:
+                    hedge = pending.pop(task)
+                    result = None if task.cancelled() or task.exception() else task.result()
+                    if result is not None:
+                        self.health.record_hedge(hedges, hedge)
+                        return result
+                if not pending and next_index < len(services):
+                    current = launch(False)
+        finally:
+            for task in pending:
+                task.cancel()
+        self.health.record_hedge(hedges, False)
+        return None
+
     async def has_joined(self, username: str, serverId: str, ip: Optional[str] = None) -> Optional[Response]:
         services, strategy = await self._resolve_fallbacks()
         if not services:
@@ -72,18 +174,58 @@ class FallbackBackend:
                 params["ip"] = ip
             
             target_url = f"{session_url}/session/minecraft/hasJoined"
+            if not self._acquire(service):
+                return None
             try:
-                async with session.get(target_url, params=params, timeout=5) as resp:
+                started = time.perf_counter()
+                async with session.get(target_url, params=params) as resp:
+                    self._observe(service, started, resp.status)
                     if resp.status == 200:
                         content = await resp.read()
                         return Response(content=content, status_code=200, media_type="application/json")
+            except asyncio.CancelledError:
+                self._cancelled(service)
+                raise
             except Exception as e:
-                logger.error(f"[Fallback] hasJoined failed: {e} | Service: {service.get('id')}")
+                self._failed(service, e, "hasJoined")
             return None
 
         return await self._run_fallbacks(services, strategy, request_has_joined)
 
+    async def _cached_get(
+        self, service: dict, session: aiohttp.ClientSession, key: tuple, target_url: str, label: str
+    ) -> Optional[Response]:
+        """按 (端点 id, *key) 读穿缓存的 GET：200 按端点 cache_ttl 缓存，204/404 作为负结果短时缓存。"""
+        cache_key = (service.get("id"), *key)
+        hit, content = self.cache.lookup(cache_key)
+        if hit:
+            return _json_response(content) if content is not None else None
+
+        version = self.cache.version
+        if not self._acquire(service):
+            return None
+        try:
+            started = time.perf_counter()
+            async with session.get(target_url) as resp:
+                self._observe(service, started, resp.status)
+                if resp.status == 200:
+                    content = await resp.read()
+                    self.cache.fill(cache_key, content, service.get("cache_ttl"), version)
+                    return _json_response(content)
+                if resp.status in _NOT_FOUND_STATUSES:
+                    self.cache.fill(cache_key, None, service.get("cache_ttl"), version)
+        except asyncio.CancelledError:
+            self._cancelled(service)
+            raise
+        except Exception as e:
+            self._failed(service, e, label)
+        return None
+
     async def get_profile(self, uuid: str, unsigned: bool = True) -> Optional[Response]:
+        key = ("profile", uuid.lower(), unsigned)
+        return _share(await self.flights.do(key, lambda: self._get_profile(uuid, unsigned)))
+
+    async def _get_profile(self, uuid: str, unsigned: bool) -> Optional[Response]:
         services, strategy = await self._resolve_fallbacks()
         
         async def request_profile(service: dict, session: aiohttp.ClientSession):
@@ -95,18 +237,17 @@ class FallbackBackend:
                 return None
             
             target_url = f"{session_url}/session/minecraft/profile/{uuid}?unsigned={str(unsigned).lower()}"
-            try:
-                async with session.get(target_url, timeout=5) as resp:
-                    if resp.status == 200:
-                        content = await resp.read()
-                        return Response(content=content, status_code=200, media_type="application/json")
-            except Exception as e:
-                logger.error(f"[Fallback] Profile fetch failed: {e} | Service: {service.get('id')}")
-            return None
+            return await self._cached_get(
+                service, session, ("profile", uuid.lower(), unsigned), target_url, "Profile fetch"
+            )
 
         return await self._run_fallbacks(services, strategy, request_profile)
 
     async def get_profile_by_name(self, playerName: str) -> Optional[Response]:
+        key = ("name", playerName.lower())
+        return _share(await self.flights.do(key, lambda: self._get_profile_by_name(playerName)))
+
+    async def _get_profile_by_name(self, playerName: str) -> Optional[Response]:
         services, strategy = await self._resolve_fallbacks()
 
         async def request_uuid(service: dict, session: aiohttp.ClientSession):
@@ -118,14 +259,9 @@ class FallbackBackend:
                 return None
             
             target_url = f"{account_url}/users/profiles/minecraft/{playerName}"
-            try:
-                async with session.get(target_url, timeout=5) as resp:
-                    if resp.status == 200:
-                        content = await resp.read()
-                        return Response(content=content, status_code=200, media_type="application/json")
-            except Exception as e:
-                logger.error(f"[Fallback] UUID lookup failed: {e} | Service: {service.get('id')}")
-            return None
+            return await self._cached_get(
+                service, session, ("name", playerName.lower()), target_url, "UUID lookup"
+            )
 
         return await self._run_fallbacks(services, strategy, request_uuid)
 
@@ -140,18 +276,58 @@ class FallbackBackend:
             if not account_url:
                 return None
             
+            # 按名称逐个缓存：已缓存的直接取用，只向上游查询其余名称
+            endpoint_id = service.get("id")
+            found, pending = [], []
+            for name in names:
+                hit, profile = self.cache.lookup((endpoint_id, "bulk", name.lower()))
+                if not hit:
+                    pending.append(name)
+                elif profile is not None:
+                    found.append(profile)
+            if not pending:
+                return found
+
+            version = self.cache.version
             target_url = f"{account_url}/profiles/minecraft"
+            if not self._acquire(service):
+                return None
             try:
-                async with session.post(target_url, json=names, timeout=5) as resp:
+                started = time.perf_counter()
+                async with session.post(target_url, json=pending) as resp:
+                    self._observe(service, started, resp.status)
                     if resp.status == 200:
-                        return await resp.json()
+                        profiles = await resp.json()
+                        if isinstance(profiles, list):
+                            # 上游只返回存在的角色，请求中缺席的名称记为负结果
+                            by_name = {
+                                p["name"].lower(): p
+                                for p in profiles
+                                if isinstance(p, dict) and isinstance(p.get("name"), str)
+                            }
+                            for name in pending:
+                                self.cache.fill(
+                                    (endpoint_id, "bulk", name.lower()),
+                                    by_name.get(name.lower()),
+                                    service.get("cache_ttl"),
+                                    version,
+                                )
+                            return found + profiles
+                        return profiles
+            except asyncio.CancelledError:
+                self._cancelled(service)
+                raise
             except Exception as e:
-                logger.error(f"[Fallback] Bulk lookup failed: {e} | Service: {service.get('id')}")
+                self._failed(service, e, "Bulk lookup")
             return None
 
         return await self._run_fallbacks(services, strategy, request_bulk)
 
     async def services_lookup(self, playerName: str) -> Optional[Response]:
+        key = ("services_name", playerName.lower())
+        return _share(await self.flights.do(key, lambda: self._services_lookup(playerName)))
+
+    async def _services_lookup(self, playerName: str) -> Optional[Response]:
         services, strategy = await self._resolve_fallbacks()
 
         async def request_services_lookup(service: dict, session: aiohttp.ClientSession):
@@ -163,13 +339,8 @@ class FallbackBackend:
                 return None
             
             target_url = f"{services_url}/minecraft/profile/lookup/name/{playerName}"
-            try:
-                async with session.get(target_url, timeout=5) as resp:
-                    if resp.status == 200:
-                        content = await resp.read()
-                        return Response(content=content, status_code=200, media_type="application/json")
-            except Exception as e:
-                logger.error(f"[Fallback] Services lookup failed: {e} | Service: {service.get('id')}")
-            return None
+            return await self._cached_get(
+                service, session, ("services_name", playerName.lower()), target_url, "Services lookup"
+            )
 
         return await self._run_fallbacks(services, strategy, request_services_lookup)
@@ -14,7 +14,7 @@ from fastapi import HTTPException
 from utils.profile_naming import generate_unique_profile_name
 from utils.typing import PlayerProfile, normalize_texture_model
 from utils.http import download_texture as download_texture
-from services import assert_texture_size, resolve_max_texture_bytes
+from services import TextureWorkerBusy, assert_texture_size, resolve_max_texture_bytes
 
 logger = logging.getLogger(__name__)
 
@@ -365,6 +365,9 @@ class MicrosoftBackend:
                         pass
                 raise
             return texture_hash
+        except TextureWorkerBusy:
+            # 工作池饱和不是材质本身的问题：上抛为 503，而不是静默导入一个没有材质的角色
+            raise
         except Exception as e:
             logger.warning("Failed to download %s: %s", texture_type, e)
             return None
\ No newline at end of file
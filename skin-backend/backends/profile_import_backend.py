@@ -10,7 +10,7 @@ from backends.yggdrasil_client import YggdrasilClient, download_texture
 from utils.profile_naming import generate_unique_profile_name
 from utils.typing import PlayerProfile, normalize_texture_model
 from database_module import Database
-from services import TextureStorage, assert_texture_size, resolve_max_texture_bytes
+from services import TextureStorage, TextureWorkerBusy, assert_texture_size, resolve_max_texture_bytes
 
 logger = logging.getLogger(__name__)
 
@@ -84,6 +84,8 @@ class ProfileImportBackend:
                 skin_hash = await self._import_texture(
                     user_id, skin_bytes, "skin", f"Imported from {api_url}", model=skin_model
                 )
+            except TextureWorkerBusy:
+                raise
             except Exception as e:
                 logger.warning("Failed to download/upload skin: %s", e)
 
@@ -95,6 +97,8 @@ class ProfileImportBackend:
                 cape_hash = await self._import_texture(
                     user_id, cape_bytes, "cape", f"Imported from {api_url}"
                 )
+            except TextureWorkerBusy:
+                raise
             except Exception as e:
                 logger.warning("Failed to download/upload cape: %s", e)
 
@@ -113,8 +117,8 @@ class ProfileImportBackend:
         client = YggdrasilClient(api_url)
         try:
             return await self._import_single_ygg_profile(user_id, api_url, profile_id, profile_name, client)
-        except HTTPException:
-            raise  # 已是面向用户的业务错误，原样抛
+        except (HTTPException, TextureWorkerBusy):
+            raise  # 已是面向用户的业务错误 / 工作池饱和（503），原样抛
         except Exception:
             logger.warning("profile import failed for %s", profile_id, exc_info=True)
             raise HTTPException(status_code=400, detail="导入失败，请稍后重试")
@@ -149,6 +153,13 @@ class ProfileImportBackend:
                     "profile_name": profile_name,
                     "detail": exc.detail,
                 })
+            except TextureWorkerBusy:
+                # 工作池饱和：本项记为失败，客户端可稍后单独重试
+                failed.append({
+                    "profile_id": profile_id,
+                    "profile_name": profile_name,
+                    "detail": "服务器繁忙，请稍后重试",
+                })
             except Exception:
                 logger.warning("batch import item failed: %s", profile_id, exc_info=True)
                 failed.append({
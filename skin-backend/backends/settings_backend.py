@@ -37,6 +37,7 @@ SETTING_DEFAULTS = {
     "smtp_ssl": "true",
     "smtp_sender": "",
     "fallback_strategy": "serial",
+    "fallback_adaptive_order": "false",
 }
 
 
@@ -53,9 +54,11 @@ def _str(s: dict, key: str) -> str:
 
 
 class SettingsBackend:
-    def __init__(self, db: Database, config=None):
+    def __init__(self, db: Database, config=None, fallback_health=None):
         self.db = db
         self.config = config
+        # 回退端点运行时健康状态（熔断、延迟），随回退设置一并返回给管理端
+        self.fallback_health = fallback_health
 
     async def get_public_settings(self) -> dict:
         s = await self.db.setting.get_all()
@@ -135,9 +138,17 @@ class SettingsBackend:
 
     async def get_fallback_settings(self) -> dict:
         s = await self.db.setting.get_all()
+        fallbacks = await self.db.fallback.list_endpoints()
+        health = {}
+        if self.fallback_health is not None:
+            # 刚保存过端点时不展示已删除/已修改端点的旧状态
+            self.fallback_health.sync(self.db.fallback.version)
+            health = self.fallback_health.snapshot()
         return {
             "fallback_strategy": _str(s, "fallback_strategy"),
-            "fallbacks": await self.db.fallback.list_endpoints(),
+            "fallback_adaptive_order": _bool(s, "fallback_adaptive_order"),
+            "fallbacks": fallbacks,
+            "fallback_health": health,
         }
 
     async def save_settings_group(self, group: str, body: dict):
@@ -160,7 +171,7 @@ class SettingsBackend:
             "auth": ["jwt_expire_days"],
             "microsoft": ["microsoft_client_id", "microsoft_client_secret", "microsoft_redirect_uri"],
             "email": ["email_verify_enabled", "email_verify_ttl", "smtp_host", "smtp_port", "smtp_user", "smtp_password", "smtp_ssl", "smtp_sender"],
-            "fallback": ["fallback_strategy"],
+            "fallback": ["fallback_strategy", "fallback_adaptive_order"],
         }
 
         if group not in allowed_keys:
@@ -175,6 +186,11 @@ class SettingsBackend:
                     if mode not in ["random", "offline"]:
                         raise HTTPException(status_code=400, detail="profile_uuid_mode must be random or offline")
                     val = mode
+                if key == "fallback_strategy":
+                    strategy = str(val).strip().lower()
+                    if strategy not in ["serial", "parallel", "hedged"]:
+                        raise HTTPException(status_code=400, detail="fallback_strategy must be serial, parallel or hedged")
+                    val = strategy
                 # Special handling for password
                 if key == "smtp_password" and not val:
                     continue
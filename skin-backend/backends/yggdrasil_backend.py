@@ -2,16 +2,24 @@ import asyncio
 import time
 import json
 import base64
+import hashlib
 import logging
 from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
 
 from utils.crypto import CryptoUtils
 from utils.typing import User, PlayerProfile, Token, Session, normalize_texture_model
 from utils.uuid_utils import generate_random_uuid
 from utils.password_utils import hash_password_async, verify_password_async
-from utils.public_urls import public_site_url
+from utils.public_urls import public_api_url, public_site_url
 from database_module import Database
-from services import TextureStorage, assert_texture_size
+from services import (
+    SignedPropertyCache,
+    SigningService,
+    TextureStorage,
+    TextureWorkerBusy,
+    assert_texture_size,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -41,19 +49,59 @@ class YggdrasilBackend:
         self.config = config
         self.TOKEN_TTL = 15 * 24 * 3600 * 1000  # 15天 (毫秒)
         self.SESSION_TTL = 30 * 1000  # 30秒 (用于join验证)
+        self.MAX_TOKENS_PER_USER = 5  # 每个用户保留的最近 token 数
+        # textures 属性（序列化 + RSA 签名）缓存，角色变更时由 UserModule 通知失效
+        self.signed_properties = SignedPropertyCache.from_config(config)
+        db.user.add_profile_listener(self.signed_properties.invalidate)
+        # RSA 签名在线程池中执行，不阻塞事件循环
+        self.signer = SigningService.from_config(crypto, config)
+        # 元数据文档：公钥 PEM 进程内不变，只序列化一次；文档按 (站点名, 回退皮肤域名) 缓存
+        self._public_key_pem = crypto.get_public_key_pem()
+        self._metadata_document: Optional[Tuple[tuple, bytes, str]] = None
 
     def _site_url(self) -> str:
         return public_site_url(self.config)
 
-    def build_profile_json(self, profile: PlayerProfile, sign: bool = False) -> Dict:
-        """构建角色 JSON，包含 textures 和签名。"""
+    def _texture_base_url(self) -> str:
+        """材质文件的对外地址：后端直接提供材质时用 API 地址，否则由前端站点（Nginx）提供。"""
+        if self.config.get("textures.serve.enabled", False):
+            return public_api_url(self.config) or self._site_url()
+        return self._site_url()
+
+    async def build_profile_json(self, profile: PlayerProfile, sign: bool = False) -> Dict:
+        """构建角色 JSON，包含 textures 和签名。
+
+        textures 属性在新鲜期内复用缓存（含签名），避免每次请求都序列化并做 RSA 签名；
+        需要签名时交给签名服务在线程池中完成。
+        """
+        entry = self.signed_properties.get(profile)
+        if entry is None:
+            entry = self.signed_properties.put(profile, self._build_textures_value(profile))
+
+        prop = {"name": "textures", "value": entry.value}
+        if sign:
+            if entry.signature is None:
+                entry.signature = await self.signer.sign(entry.value)
+            prop["signature"] = entry.signature
+
+        return {
+            "id": profile.id,
+            "name": profile.name,
+            "properties": [
+                prop,
+                {"name": "uploadableTextures", "value": "skin,cape"},
+            ],
+        }
+
+    def _build_textures_value(self, profile: PlayerProfile) -> str:
+        """序列化 textures 属性值（base64 JSON）。"""
         textures_payload = {
             "timestamp": int(time.time() * 1000),
             "profileId": profile.id,
             "profileName": profile.name,
             "textures": {},
         }
-        base_texture_url = f"{self._site_url()}/static/textures/"
+        base_texture_url = f"{self._texture_base_url()}/static/textures/"
 
         if profile.skin_hash:
             textures_payload["textures"]["SKIN"] = {
@@ -67,27 +115,14 @@ class YggdrasilBackend:
                 "url": base_texture_url + profile.cape_hash + ".png"
             }
 
-        textures_base64 = base64.b64encode(
+        return base64.b64encode(
             json.dumps(textures_payload).encode("utf-8")
         ).decode("utf-8")
 
-        prop = {"name": "textures", "value": textures_base64}
-        if sign:
-            prop["signature"] = self.crypto.sign_data(textures_base64)
-
-        return {
-            "id": profile.id,
-            "name": profile.name,
-            "properties": [
-                prop,
-                {"name": "uploadableTextures", "value": "skin,cape"},
-            ],
-        }
-
     async def build_authenticate_response(
         self, username, password, client_token, request_user: bool
     ) -> Dict:
-        access_token, avail_players, selected_profile, user_id = await self.authenticate(
+        access_token, avail_players, selected_profile, user = await self._authenticate(
             username, password, client_token
         )
         resp = {
@@ -101,30 +136,55 @@ class YggdrasilBackend:
                 "name": selected_profile.name,
             }
         if request_user:
-            user_obj = await self.db.user.get_by_id(user_id)
-            if user_obj:
-                resp["user"] = {
-                    "id": user_id,
-                    "properties": [
-                        {"name": "preferredLanguage", "value": user_obj.preferred_language}
-                    ],
-                }
+            # 凭据校验时已取到用户行，无需再查
+            resp["user"] = {
+                "id": user.id,
+                "properties": [
+                    {"name": "preferredLanguage", "value": user.preferred_language}
+                ],
+            }
         return resp
 
     async def lookup_profile_by_name(self, player_name: str) -> Optional[Dict]:
-        p = await self.db.user.get_profile_by_name(player_name)
+        p = await self.db.user.get_profile_by_name_cached(player_name)
         if p:
             return {"id": p.id, "name": p.name}
         return None
 
     async def build_metadata(self) -> Dict:
         site_name = await self.db.setting.get("site_name", "Yggdrasil 皮肤站")
+        fallback_domains = await self.db.fallback.collect_skin_domains()
+        return self._render_metadata(site_name, fallback_domains)
+
+    async def metadata_document(self) -> Tuple[bytes, str]:
+        """返回预先序列化的元数据文档 (body, etag)。
+
+        站点名与回退端点都来自内存缓存，比较成本极低；二者不变时直接复用上次的字节，
+        变化（管理员修改设置 / 回退端点）后下一次请求重新渲染。
+        """
+        site_name = await self.db.setting.get("site_name", "Yggdrasil 皮肤站")
+        fallback_domains = await self.db.fallback.collect_skin_domains()
+        key = (site_name, tuple(fallback_domains))
+        cached = self._metadata_document
+        if cached is None or cached[0] != key:
+            body = json.dumps(
+                self._render_metadata(site_name, fallback_domains), ensure_ascii=False
+            ).encode("utf-8")
+            etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+            cached = self._metadata_document = (key, body, etag)
+        return cached[1], cached[2]
+
+    def _render_metadata(self, site_name: str, fallback_domains: list) -> Dict:
         site_url = public_site_url(self.config)
         host = (
             site_url.replace("https://", "").replace("http://", "").split("/")[0]
             if site_url
             else "localhost"
         )
+        skin_domains = [host]
+        texture_host = urlsplit(self._texture_base_url()).hostname
+        if texture_host and texture_host != host.split(":")[0]:
+            skin_domains.append(texture_host)
         return {
             "meta": {
                 "serverName": site_name,
@@ -136,25 +196,16 @@ class YggdrasilBackend:
                 },
                 "feature.non_email_login": True,
             },
-            "skinDomains": await self.db.fallback.collect_skin_domains() + [host],
-            "signaturePublickey": self.crypto.get_public_key_pem(),
+            "skinDomains": list(fallback_domains) + skin_domains,
+            "signaturePublickey": self._public_key_pem,
         }
 
-    async def _cleanup_tokens(self, user_id: str):
-        cutoff = int(time.time() * 1000) - self.TOKEN_TTL
-        await self.db.user.delete_expired_tokens(user_id, cutoff)
-        await self.db.user.delete_surplus_tokens(user_id, keep=5)
-
     async def _verify_credentials(self, username, password) -> Tuple[Optional[User], Optional[PlayerProfile]]:
-        user = await self.db.user.get_by_email(username)
-        login_profile = None
-        if not user:
-            login_profile = await self.db.user.get_profile_by_name(username)
-            if login_profile:
-                user = await self.db.user.get_by_id(login_profile.user_id)
-
-        if not user:
+        # 邮箱 / 角色名 / 角色所属用户合并为一次查询
+        candidate = await self.db.user.get_login_candidate(username)
+        if not candidate:
             return None, None
+        user, login_profile = candidate
 
         if await verify_password_async(password, user.password):
             if not user.password.startswith("$2"):
@@ -167,6 +218,14 @@ class YggdrasilBackend:
     async def authenticate(
         self, username, password, clientToken
     ) -> Tuple[str, list, Optional[PlayerProfile], str]:
+        access_token, avail_players, selected_profile, user = await self._authenticate(
+            username, password, clientToken
+        )
+        return access_token, avail_players, selected_profile, user.id
+
+    async def _authenticate(
+        self, username, password, clientToken
+    ) -> Tuple[str, list, Optional[PlayerProfile], User]:
         user, login_profile = await self._verify_credentials(username, password)
         if not user:
             raise ForbiddenOperationException(
@@ -191,20 +250,14 @@ class YggdrasilBackend:
 
         pid_to_bind = selected_profile.id if selected_profile else None
         created_at = int(time.time() * 1000)
-        await self.db.user.add_token(
-            Token(access_token, client_token, user_id, pid_to_bind, created_at)
+        # 写入新 token 与裁剪过期/超额 token 在同一条语句内完成
+        await self.db.user.issue_token(
+            Token(access_token, client_token, user_id, pid_to_bind, created_at),
+            expired_before=created_at - self.TOKEN_TTL,
+            keep=self.MAX_TOKENS_PER_USER,
         )
-        await self._cleanup_tokens(user_id)
 
-        return access_token, avail_players, selected_profile, user_id
-
-    async def _ensure_token_profile_owned(self, token_data: Token) -> None:
-        if not token_data.profile_id:
-            return
-        if not await self.db.user.verify_profile_ownership(
-            token_data.user_id, token_data.profile_id
-        ):
-            raise ForbiddenOperationException("Invalid token.")
+        return access_token, avail_players, selected_profile, user
 
     async def refresh(
         self, accessToken, clientToken, selectedProfile_uuid, requestUser=False
@@ -217,7 +270,6 @@ class YggdrasilBackend:
             raise ForbiddenOperationException("Invalid token.")
         if clientToken and clientToken != token_data.client_token:
             raise ForbiddenOperationException("Invalid token.")
-        await self._ensure_token_profile_owned(token_data)
 
         new_profile_id = token_data.profile_id
         selected_profile_resp = None
@@ -227,18 +279,14 @@ class YggdrasilBackend:
                 raise IllegalArgumentException(
                     "Access token already has a profile assigned."
                 )
-            p_check = await self.db.user.verify_profile_ownership(
-                token_data.user_id, selectedProfile_uuid
-            )
-            if not p_check:
+            # 归属校验与取角色合并：角色行本身带 user_id
+            p_obj = await self.db.user.get_profile_by_id_cached(selectedProfile_uuid)
+            if not p_obj or p_obj.user_id != token_data.user_id:
                 raise ForbiddenOperationException("Invalid profile.")
             new_profile_id = selectedProfile_uuid
-            p_obj = await self.db.user.get_profile_by_id(selectedProfile_uuid)
-            if not p_obj:
-                raise ForbiddenOperationException("Invalid profile.")
             selected_profile_resp = {"id": p_obj.id, "name": p_obj.name}
         elif token_data.profile_id:
-            p_obj = await self.db.user.get_profile_by_id(token_data.profile_id)
+            p_obj = await self.db.user.get_profile_by_id_cached(token_data.profile_id)
             if not p_obj:
                 raise ForbiddenOperationException("Invalid token.")
             selected_profile_resp = {"id": p_obj.id, "name": p_obj.name}
@@ -260,10 +308,11 @@ class YggdrasilBackend:
                 new_profile_id,
                 created_at,
             ),
+            expired_before=created_at - self.TOKEN_TTL,
+            keep=self.MAX_TOKENS_PER_USER,
         )
         if not rotated:
             raise ForbiddenOperationException("Invalid token.")
-        await self._cleanup_tokens(token_data.user_id)
 
         resp = {"accessToken": new_access_token, "clientToken": token_data.client_token}
         if selected_profile_resp:
@@ -285,7 +334,6 @@ class YggdrasilBackend:
             raise ForbiddenOperationException("Invalid token.")
         if (int(time.time() * 1000) - token_data.created_at) > self.TOKEN_TTL:
             raise ForbiddenOperationException("Invalid token.")
-        await self._ensure_token_profile_owned(token_data)
 
     async def invalidate(self, access_token: str):
         await self.db.user.delete_token(access_token)
@@ -299,38 +347,23 @@ class YggdrasilBackend:
         await self.db.user.delete_tokens_by_user(user.id)
 
     async def join_server(self, access_token, selected_profile_id, server_id, ip: str):
-        token_data = await self.db.user.get_token(access_token)
-        if not token_data:
-            raise ForbiddenOperationException("Invalid token.")
-        if token_data.profile_id != selected_profile_id:
-            raise ForbiddenOperationException("Invalid token.")
-        if not await self.db.user.verify_profile_ownership(
-            token_data.user_id, selected_profile_id
-        ):
-            raise ForbiddenOperationException("Invalid token.")
-        await self.db.user.delete_session(server_id)
-        await self.db.user.add_session(
-            Session(server_id, access_token, ip, int(time.time() * 1000))
+        # token 校验、角色归属校验与会话写入合并为一条语句（一次往返）
+        joined = await self.db.user.join_session(
+            Session(server_id, access_token, ip, int(time.time() * 1000)), selected_profile_id
         )
+        if not joined:
+            raise ForbiddenOperationException("Invalid token.")
 
     async def has_joined(
         self, username: str, server_id: str
     ) -> Optional[PlayerProfile]:
-        session = await self.db.user.get_session(server_id)
-        if not session:
-            return None
-        if (int(time.time() * 1000) - session.created_at) > self.SESSION_TTL:
+        now = int(time.time() * 1000)
+        # 会话、token、角色与封禁状态一次查出
+        joined = await self.db.user.get_joined_profile(server_id, username, now - self.SESSION_TTL)
+        if not joined:
             return None
-
-        token_data = await self.db.user.get_token(session.access_token)
-        if not token_data or not token_data.profile_id:
-            return None
-
-        profile = await self.db.user.get_profile_by_id(token_data.profile_id)
-        if not profile or profile.user_id != token_data.user_id or profile.name != username:
-            return None
-
-        if await self.db.user.is_banned(profile.user_id):
+        profile, banned_until = joined
+        if banned_until and now < banned_until:
             raise ForbiddenOperationException(
                 "Account is banned. Please contact administrator."
             )
@@ -339,15 +372,12 @@ class YggdrasilBackend:
 
     async def get_profile(self, uuid: str) -> Optional[PlayerProfile]:
         uuid = uuid.replace("-", "")
-        profile = await self.db.user.get_profile_by_id(uuid)
-        if not profile:
-            return None
-        return profile
+        return await self.db.user.get_profile_by_id_cached(uuid)
 
     async def get_profiles_by_names(self, names: list) -> list[Dict]:
         if not names:
             return []
-        profiles = await self.db.user.search_profiles_by_names(names[:100], limit=100)
+        profiles = await self.db.user.search_profiles_by_names(names, limit=100)
         return [{"id": p.id, "name": p.name} for p in profiles]
 
     async def _authorize_profile_owner(self, access_token: str, uuid: str) -> Token:
@@ -392,7 +422,7 @@ class YggdrasilBackend:
         except ValueError as e:
             raise IllegalArgumentException(str(e))
         except Exception as e:
-            if isinstance(e, YggdrasilError):
+            if isinstance(e, (YggdrasilError, TextureWorkerBusy)):
                 raise
             logger.warning("Texture processing error: %s", e)
             raise IllegalArgumentException("Failed to process texture")
@@ -0,0 +1,69 @@
+"""为存量材质补生成预览图（<hash>.head.png / .body.png / .cape.png）。
+
+新上传的材质在入库时已生成预览；预览端点也会按需补生成，本脚本只是提前把存量
+材质一次性处理完，避免上线初期列表页集中触发解码。可在服务运行期间执行，
+按批处理并在批间休眠。
+
+材质文件本身不记录类型，按尺寸推断：方形为皮肤，22:17 为披风，
+2:1（64x32 等）既可能是旧版皮肤也可能是披风，两类预览都生成。
+
+用法：
+    python backfill_texture_previews.py [--dir textures] [--batch-size 200] [--pause 0.5]
+"""
+
+import argparse
+import os
+import time
+
+from config_loader import config
+from services.texture_gc import scan_texture_files
+from services.texture_storage import find_texture_file, write_previews
+from utils.image_utils import decode_png
+
+
+def _texture_types(width: int, height: int) -> tuple[str, ...]:
+    if width == height:
+        return ("skin",)
+    if width == height * 2:
+        return ("skin", "cape")
+    if width * 17 == height * 22:
+        return ("cape",)
+    return ()
+
+
+def backfill(textures_dir: str, batch_size: int, pause: float) -> int:
+    if not os.path.isdir(textures_dir):
+        print(f"❌ 错误: 找不到材质目录 '{textures_dir}'")
+        return 0
+
+    print(f"--- 开始补生成材质预览图: {textures_dir} ---")
+    hashes = sorted(scan_texture_files(textures_dir, 0).present)
+    written = 0
+    for i, texture_hash in enumerate(hashes, 1):
+        path = find_texture_file(textures_dir, texture_hash)
+        if path is None:
+            continue
+        try:
+            with open(path, "rb") as f:
+                img = decode_png(f.read())
+            for texture_type in _texture_types(*img.size):
+                written += write_previews(textures_dir, texture_hash, texture_type, img)
+        except (OSError, ValueError) as e:
+            print(f"  ⚠️ 跳过 {texture_hash}: {e}")
+            continue
+
+        if i % batch_size == 0:
+            print(f"  已处理 {i}/{len(hashes)} 个材质，新生成 {written} 张预览")
+            time.sleep(pause)
+
+    print(f"--- 完成: 处理 {len(hashes)} 个材质，新生成 {written} 张预览 ---")
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="为存量材质补生成预览图")
+    parser.add_argument("--dir", default=config.get("textures.directory", "textures"), help="材质目录")
+    parser.add_argument("--batch-size", type=int, default=200, help="每批处理的材质数")
+    parser.add_argument("--pause", type=float, default=0.5, help="批间休眠秒数")
+    args = parser.parse_args()
+    backfill(args.dir, max(1, args.batch_size), max(0.0, args.pause))
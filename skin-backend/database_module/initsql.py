@@ -132,6 +132,15 @@ CREATE TABLE IF NOT EXISTS whitelisted_users (
     FOREIGN KEY(endpoint_id) REFERENCES fallback_endpoints(id) ON DELETE CASCADE
 );
 
+-- 创建上传指纹表：原始上传字节的快速哈希 → 规范材质 hash，重复上传时跳过图像解码
+CREATE TABLE IF NOT EXISTS texture_fingerprints (
+    fingerprint TEXT NOT NULL,
+    texture_type TEXT NOT NULL,
+    texture_hash TEXT NOT NULL,
+    created_at BIGINT NOT NULL,
+    PRIMARY KEY(fingerprint, texture_type)
+);
+
 -- 创建验证码表
 CREATE TABLE IF NOT EXISTS verification_codes (
     email TEXT,
@@ -147,9 +156,13 @@ CREATE TABLE IF NOT EXISTS verification_codes (
 
 -- profiles：按 user_id 查询角色 + 按 id 游标分页（get_profiles_by_user_cursor 等）
 CREATE INDEX IF NOT EXISTS idx_profiles_user_id ON profiles (user_id, id);
+-- profiles：按名称批量解析（大小写不敏感，search_profiles_by_names 按 lower(name) 与输入的 lower() 连接）
+-- name 上的 UNIQUE 约束区分大小写，无法服务 lower(name) 查询
+CREATE INDEX IF NOT EXISTS idx_profiles_lower_name ON profiles (lower(name));
 
--- tokens：按用户清理 / 按时间裁剪 / 保留最近 N 个（delete_expired_tokens、delete_surplus_tokens、
--- delete_tokens_by_user 均以 user_id 为前缀，单个复合索引即可覆盖）
+-- tokens：按用户清理 / 按时间裁剪 / 保留最近 N 个（issue_token、rotate_token 的裁剪子句，
+-- delete_expired_tokens、delete_surplus_tokens、delete_tokens_by_user 均以 user_id 为前缀，
+-- 单个复合索引即可覆盖）
 CREATE INDEX IF NOT EXISTS idx_tokens_user_created ON tokens (user_id, created_at);
 -- tokens：按角色删除（delete_profile_cascade 事务内清 profile 的游戏 token）
 CREATE INDEX IF NOT EXISTS idx_tokens_profile_id ON tokens (profile_id);
@@ -183,6 +196,7 @@ INSERT INTO settings (key, value) VALUES
 ('microsoft_client_secret', ''),
 ('microsoft_redirect_uri', 'http://localhost:8000/microsoft/callback'),
 ('fallback_strategy', 'serial'),
+('fallback_adaptive_order', 'false'),
 ('profile_uuid_mode', 'random'),
 ('enable_skin_library', 'true'),
 ('email_verify_enabled', 'false'),
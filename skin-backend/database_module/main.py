@@ -4,15 +4,25 @@ from .modules.setting import SettingModule
 from .modules.texture import TextureModule
 from .modules.verification import VerificationModule
 from .modules.fallback import FallbackModule
+from .session_store import MemorySessionStore
+from .token_cache import TokenCache
+from .profile_cache import ProfileCache
 
 from .initsql import INIT_SQL
 
 class Database(BaseDB):
-    def __init__(self, dsn: str, max_connections: int = 10):
+    def __init__(
+        self,
+        dsn: str,
+        max_connections: int = 10,
+        session_store: MemorySessionStore | None = None,
+        token_cache: TokenCache | None = None,
+        profile_cache: ProfileCache | None = None,
+    ):
         super().__init__(dsn, max_connections)
-        self.user = UserModule(self)
+        self.user = UserModule(self, session_store, token_cache, profile_cache)
         self.setting = SettingModule(self)
-        self.texture = TextureModule(self)
+        self.texture = TextureModule(self, on_profile_changed=self.user._profile_changed)
         self.verification = VerificationModule(self)
         self.fallback = FallbackModule(self)
 
@@ -29,3 +39,5 @@ class Database(BaseDB):
         # 2. 触发各模块内部逻辑 (加载缓存等)
         await self.setting.init()
         await self.fallback.init()
+        self.texture.init()
+        self.user.init()
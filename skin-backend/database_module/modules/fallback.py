@@ -7,6 +7,8 @@ class FallbackModule:
         self._endpoints_cache = []
         self._domains_cache = []
         self._whitelist_cache = {} # {endpoint_id: set(usernames)}
+        # 端点配置版本：每次重新加载端点递增，回退响应缓存据此整体失效
+        self.version = 0
 
     async def init(self):
         """Initialize all fallback related caches"""
@@ -23,6 +25,7 @@ class FallbackModule:
                 parts = [part.strip() for part in raw.split(",") if part.strip()]
                 domains.extend(parts)
         self._domains_cache = list(set(domains))
+        self.version += 1
 
     async def refresh_whitelist_cache(self):
         rows = await self.db.fetch("SELECT username, endpoint_id FROM whitelisted_users")
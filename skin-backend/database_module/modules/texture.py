@@ -1,8 +1,13 @@
 from ..core import BaseDB
 import time
+from collections import OrderedDict
 from typing import Optional
 
 
+# 上传指纹 LRU 容量：每项约 200 字节，数千项的内存开销可忽略
+FINGERPRINT_CACHE_SIZE = 4096
+
+
 async def _lock_library_texture(conn, texture_hash: str, texture_type: str) -> bool:
     """事务内对 skin_library(skin_hash, texture_type) 行取 FOR UPDATE 锁。
 
@@ -19,8 +24,81 @@ async def _lock_library_texture(conn, texture_hash: str, texture_type: str) -> b
 
 
 class TextureModule:
-    def __init__(self, db: BaseDB):
+    def __init__(self, db: BaseDB, on_profile_changed=None):
         self.db = db
+        # 批量改写 profiles.texture_model 后逐个通知（角色缓存 / 签名缓存失效）
+        self._on_profile_changed = on_profile_changed
+        self._fingerprint_cache: OrderedDict = OrderedDict()  # {(fingerprint, type): texture_hash}
+        self._fingerprint_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
+    def init(self):
+        """重置上传指纹 LRU（持久化的指纹表按需回填，无需预加载）"""
+        self._fingerprint_cache.clear()
+        self._fingerprint_stats = {"memory_hits": 0, "db_hits": 0, "misses": 0}
+
+    def _remember_fingerprint(self, key: tuple, texture_hash: str):
+        self._fingerprint_cache[key] = texture_hash
+        self._fingerprint_cache.move_to_end(key)
+        while len(self._fingerprint_cache) > FINGERPRINT_CACHE_SIZE:
+            self._fingerprint_cache.popitem(last=False)
+
+    async def lookup_fingerprint(self, fingerprint: str, texture_type: str) -> Optional[str]:
+        """按原始上传字节指纹查规范材质 hash：先查内存 LRU，未命中再查指纹表并回填"""
+        key = (fingerprint, texture_type)
+        texture_hash = self._fingerprint_cache.get(key)
+        if texture_hash is not None:
+            self._fingerprint_cache.move_to_end(key)
+            self._fingerprint_stats["memory_hits"] += 1
+            return texture_hash
+        texture_hash = await self.db.fetchval(
+            "SELECT texture_hash FROM texture_fingerprints WHERE fingerprint=$1 AND texture_type=$2",
+            fingerprint, texture_type,
+        )
+        if texture_hash is None:
+            self._fingerprint_stats["misses"] += 1
+            return None
+        self._fingerprint_stats["db_hits"] += 1
+        self._remember_fingerprint(key, texture_hash)
+        return texture_hash
+
+    async def record_fingerprint(self, fingerprint: str, texture_type: str, texture_hash: str):
+        """记录指纹 → 材质 hash。同一原始字节总是得到同一 hash，冲突时保留已有行"""
+        await self.db.execute(
+            "INSERT INTO texture_fingerprints (fingerprint, texture_type, texture_hash, created_at) VALUES ($1, $2, $3, $4) ON CONFLICT DO NOTHING",
+            fingerprint, texture_type, texture_hash, int(time.time() * 1000),
+        )
+        self._remember_fingerprint((fingerprint, texture_type), texture_hash)
+
+    async def prune_fingerprints(self, cutoff: int) -> int:
+        """删除 created_at 早于 cutoff 且指向的材质已无任何引用的指纹行，返回删除数。
+
+        指纹只是去重加速，材质被删后行会一直留在表里；宽限期内的行保留，
+        覆盖"指纹已记录、引用尚未写库"的上传窗口。
+        """
+        rows = await self.db.fetch(
+            f"""
+            DELETE FROM texture_fingerprints
+            WHERE created_at < $1
+              AND texture_hash NOT IN ({self._LIVE_HASHES_SQL})
+            RETURNING fingerprint, texture_type
+            """,
+            cutoff,
+        )
+        for row in rows:
+            self._fingerprint_cache.pop((row[0], row[1]), None)
+        return len(rows)
+
+    def forget_fingerprint(self, fingerprint: str, texture_type: str):
+        """指纹指向的文件已不存在时，从内存 LRU 中剔除（指纹表保留，文件重建后仍有效）"""
+        self._fingerprint_cache.pop((fingerprint, texture_type), None)
+
+    def fingerprint_stats(self) -> dict:
+        stats = dict(self._fingerprint_stats)
+        lookups = sum(stats.values())
+        hits = stats["memory_hits"] + stats["db_hits"]
+        stats["size"] = len(self._fingerprint_cache)
+        stats["hit_rate"] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
 
     async def add_to_library(self, user_id: str, texture_hash: str, texture_type: str, note: str = "", is_public: bool = False, model: str = "default") -> bool:
         async with self.db.get_conn() as conn:
@@ -184,7 +262,14 @@ class TextureModule:
                     note, texture_hash, user_id,
                 )
 
+    def _profiles_changed(self, rows) -> None:
+        if self._on_profile_changed is None:
+            return
+        for row in rows:
+            self._on_profile_changed(row[0])
+
     async def update_model(self, user_id: str, texture_hash: str, texture_type: str, model: str):
+        changed = []
         async with self.db.get_conn() as conn:
             async with conn.transaction():
                 await _lock_library_texture(conn, texture_hash, texture_type)
@@ -200,10 +285,11 @@ class TextureModule:
                 )
                 # If it's a skin, also update all profiles using this skin to match the new model
                 if texture_type.lower() == "skin":
-                    await conn.execute(
-                        "UPDATE profiles SET texture_model=$1 WHERE skin_hash=$2 AND user_id=$3",
+                    changed = await conn.fetch(
+                        "UPDATE profiles SET texture_model=$1 WHERE skin_hash=$2 AND user_id=$3 RETURNING id",
                         model, texture_hash, user_id,
                     )
+        self._profiles_changed(changed)
 
     async def update_is_public(self, user_id: str, texture_hash: str, texture_type: str, is_public: bool):
         async with self.db.get_conn() as conn:
@@ -238,6 +324,7 @@ class TextureModule:
         """
         if note is None and model is None and is_public is None:
             return True
+        changed = []
         async with self.db.get_conn() as conn:
             async with conn.transaction():
                 # 取库行写锁；不存在也不阻塞 user_textures 的更新（用户行可独立存在）
@@ -268,8 +355,8 @@ class TextureModule:
                         model, texture_hash, user_id, texture_type,
                     )
                     if texture_type.lower() == "skin":
-                        await conn.execute(
-                            "UPDATE profiles SET texture_model=$1 WHERE skin_hash=$2 AND user_id=$3",
+                        changed = await conn.fetch(
+                            "UPDATE profiles SET texture_model=$1 WHERE skin_hash=$2 AND user_id=$3 RETURNING id",
                             model, texture_hash, user_id,
                         )
                 if is_public is not None:
@@ -277,6 +364,7 @@ class TextureModule:
                         "UPDATE skin_library SET is_public=$1 WHERE skin_hash=$2 AND uploader=$3 AND texture_type=$4",
                         1 if is_public else 0, texture_hash, user_id, texture_type,
                     )
+        self._profiles_changed(changed)
         return True
 
     async def admin_patch(
@@ -293,6 +381,7 @@ class TextureModule:
         """
         if note is None and model is None and is_public is None:
             return True
+        changed = []
         async with self.db.get_conn() as conn:
             async with conn.transaction():
                 if not await _lock_library_texture(conn, texture_hash, texture_type):
@@ -324,10 +413,11 @@ class TextureModule:
                     texture_hash, texture_type,
                 )
                 if model is not None and texture_type.lower() == "skin":
-                    await conn.execute(
-                        "UPDATE profiles SET texture_model=$1 WHERE skin_hash=$2",
+                    changed = await conn.fetch(
+                        "UPDATE profiles SET texture_model=$1 WHERE skin_hash=$2 RETURNING id",
                         model, texture_hash,
                     )
+        self._profiles_changed(changed)
         return True
 
     async def get_from_library_cursor(
@@ -594,3 +684,30 @@ class TextureModule:
                             texture_hash,
                         )
 
+    # ========== Texture GC (mark phase) ==========
+
+    # 所有仍引用材质文件的位置；fingerprint 表不算引用（命中时会校验文件是否存在）
+    _LIVE_HASHES_SQL = """
+        SELECT skin_hash FROM skin_library
+        UNION SELECT hash FROM user_textures
+        UNION SELECT skin_hash FROM profiles WHERE skin_hash IS NOT NULL
+        UNION SELECT cape_hash FROM profiles WHERE cape_hash IS NOT NULL
+        UNION SELECT avatar_hash FROM users WHERE avatar_hash IS NOT NULL
+    """
+
+    async def iter_live_hashes(self, batch_size: int = 1000):
+        """以服务端游标流式产出所有被引用的材质 hash，避免一次性把整张表拉进内存"""
+        async with self.db.get_conn() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(self._LIVE_HASHES_SQL, prefetch=batch_size):
+                    yield row[0]
+
+    async def filter_live_hashes(self, hashes: list[str]) -> set[str]:
+        """返回 hashes 中当前仍被引用的子集；GC 删除前的二次确认"""
+        if not hashes:
+            return set()
+        rows = await self.db.fetch(
+            f"SELECT h FROM ({self._LIVE_HASHES_SQL}) AS live(h) WHERE h = ANY($1::text[])",
+            hashes,
+        )
+        return {row[0] for row in rows}
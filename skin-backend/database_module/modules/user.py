@@ -1,4 +1,7 @@
 from ..core import BaseDB
+from ..session_store import MemorySessionStore
+from ..token_cache import TokenCache
+from ..profile_cache import ProfileCache
 from utils.typing import User, PlayerProfile, InviteCode, Token, Session
 import time
 import asyncpg
@@ -20,8 +23,45 @@ _DISPLAY_NAME_LOCK_SEED = 0x444953504C4159
 
 
 class UserModule:
-    def __init__(self, db: BaseDB):
+    def __init__(
+        self,
+        db: BaseDB,
+        session_store: MemorySessionStore | None = None,
+        token_cache: TokenCache | None = None,
+        profile_cache: ProfileCache | None = None,
+    ):
         self.db = db
+        # join 会话存储：None 表示使用 Postgres sessions 表（多实例部署）
+        self.session_store = session_store
+        # access token 读穿缓存；所有删除 token 的路径在写库后精确失效
+        self.token_cache = token_cache if token_cache is not None else TokenCache()
+        # 名称 / id → 角色的读穿缓存；所有写 profiles 的路径经 _profile_changed 失效
+        self.profile_cache = profile_cache if profile_cache is not None else ProfileCache()
+        # 角色变更监听（接收 profile_id），供上层缓存失效；不随 init 清空
+        self._profile_listeners: list = []
+
+    def init(self):
+        """清空进程内 join 会话（重启后旧会话本就失效）与 token / 角色缓存"""
+        if self.session_store is not None:
+            self.session_store.clear()
+        self.token_cache.clear()
+        self.profile_cache.clear()
+
+    def session_stats(self) -> dict:
+        """join 会话存储指标，供指标端点输出"""
+        if self.session_store is not None:
+            return self.session_store.stats()
+        return {"backend": "postgres"}
+
+    def add_profile_listener(self, listener):
+        """注册角色变更回调：皮肤/披风/模型/名称更新或角色删除后以 profile_id 调用"""
+        self._profile_listeners.append(listener)
+
+    def _profile_changed(self, profile_id: str, *names: str):
+        """角色写库后调用；names 为涉及的新名称（创建 / 改名），用于清掉名称负缓存"""
+        self.profile_cache.invalidate(profile_id, *names)
+        for listener in self._profile_listeners:
+            listener(profile_id)
 
     # ========== User ==========
     async def get_by_email(self, email: str) -> User | None:
@@ -33,6 +73,37 @@ class UserModule:
             return User(*row)
         return None
 
+    async def get_login_candidate(self, username: str) -> tuple[User, PlayerProfile | None] | None:
+        """Yggdrasil 登录的账号解析：一次查询按邮箱或角色名找到用户。
+
+        邮箱优先；按角色名命中时一并返回该角色（登录角色）。都不存在返回 None。
+        """
+        row = await self.db.fetchrow(
+            """
+            SELECT * FROM (
+                SELECT 0 AS pri, u.id, u.email, u.password, u.is_admin, u.preferred_language,
+                       u.display_name, u.banned_until, u.avatar_hash,
+                       NULL AS p_id, NULL AS p_user_id, NULL AS p_name,
+                       NULL AS p_model, NULL AS p_skin, NULL AS p_cape
+                FROM users u WHERE u.email = $1
+                UNION ALL
+                SELECT 1, u.id, u.email, u.password, u.is_admin, u.preferred_language,
+                       u.display_name, u.banned_until, u.avatar_hash,
+                       p.id, p.user_id, p.name, p.texture_model, p.skin_hash, p.cape_hash
+                FROM profiles p JOIN users u ON u.id = p.user_id
+                WHERE p.name = $1
+            ) c
+            ORDER BY pri
+            LIMIT 1
+            """,
+            username,
+        )
+        if not row:
+            return None
+        user = User(*row[1:9])
+        profile = PlayerProfile(*row[9:15]) if row["p_id"] is not None else None
+        return user, profile
+
     async def get_by_id(self, user_id: str) -> User | None:
         row = await self.db.fetchrow(
             "SELECT id, email, password, is_admin, preferred_language, display_name, banned_until, avatar_hash FROM users WHERE id=$1",
@@ -52,6 +123,8 @@ class UserModule:
         await self.db.execute(
             "UPDATE users SET password=$1 WHERE id=$2", new_password_hash, user_id
         )
+        # 改密流程会随后吊销 token；这里先丢弃缓存，不依赖调用方顺序
+        self.token_cache.invalidate_user(user_id)
 
     async def update_email(self, user_id: str, new_email: str):
         await self.db.execute(
@@ -127,7 +200,9 @@ class UserModule:
                 )
                 if not exists:
                     return False
-                await conn.execute("DELETE FROM profiles WHERE user_id=$1", user_id)
+                deleted_profiles = await conn.fetch(
+                    "DELETE FROM profiles WHERE user_id=$1 RETURNING id", user_id
+                )
                 await conn.execute("DELETE FROM tokens WHERE user_id=$1", user_id)
                 await conn.execute("DELETE FROM site_refresh_tokens WHERE user_id=$1", user_id)
                 # 删除该用户上传的库材质所对应的所有用户衣柜引用
@@ -147,7 +222,10 @@ class UserModule:
                 # 最后删除该用户自己的衣柜行（如有剩余）
                 await conn.execute("DELETE FROM user_textures WHERE user_id=$1", user_id)
                 await conn.execute("DELETE FROM users WHERE id=$1", user_id)
-                return True
+        self.token_cache.invalidate_user(user_id)
+        for row in deleted_profiles:
+            self._profile_changed(row[0])
+        return True
 
     async def count(self) -> int:
         return await self.db.fetchval("SELECT COUNT(*) FROM users") or 0
@@ -292,6 +370,45 @@ class UserModule:
             return PlayerProfile(*row)
         return None
 
+    async def get_profile_by_id_cached(self, profile_id: str) -> PlayerProfile | None:
+        """经进程内缓存读穿的 get_profile_by_id，供 UUID 查询等公共读路径使用。
+
+        写路径上的存在性检查（创建、导入）仍应直接查库。
+        """
+        cache = self.profile_cache
+        if cache.enabled:
+            hit, profile = cache.lookup_id(profile_id)
+            if hit:
+                return profile
+        generation = cache.generation
+        profile = await self.get_profile_by_id(profile_id)
+        cache.fill_id(profile_id, profile, generation)
+        return profile
+
+    async def get_profile_by_name_cached(self, name: str) -> PlayerProfile | None:
+        """按名称（大小写不敏感，与 Mojang 一致）查角色，经进程内缓存读穿。
+
+        走 lower(name) 函数索引；同一小写名存在多个角色时优先大小写完全一致的。
+        """
+        cache = self.profile_cache
+        if cache.enabled:
+            hit, profile = cache.lookup_name(name)
+            if hit:
+                return profile
+        generation = cache.generation
+        row = await self.db.fetchrow(
+            """
+            SELECT id, user_id, name, texture_model, skin_hash, cape_hash FROM profiles
+            WHERE lower(name) = lower($1)
+            ORDER BY name = $1 DESC, id
+            LIMIT 1
+            """,
+            name,
+        )
+        profile = PlayerProfile(*row) if row else None
+        cache.fill_name(name, profile, generation)
+        return profile
+
     async def get_profile_by_name(self, name: str) -> PlayerProfile | None:
         row = await self.db.fetchrow(
             "SELECT id, user_id, name, texture_model, skin_hash, cape_hash FROM profiles WHERE name=$1",
@@ -410,6 +527,7 @@ class UserModule:
             "INSERT INTO profiles (id, user_id, name, texture_model, skin_hash, cape_hash) VALUES ($1, $2, $3, $4, $5, $6)",
             profile.id, profile.user_id, profile.name, profile.texture_model, profile.skin_hash, profile.cape_hash,
         )
+        self._profile_changed(profile.id, profile.name)
 
     async def create_user_with_profile(
         self,
@@ -460,6 +578,7 @@ class UserModule:
                             "UPDATE invites SET used_by=$1 WHERE code=$2 AND used_by IS NULL",
                             used_by, invite_code,
                         )
+        self._profile_changed(profile.id, profile.name)
         return True
 
     async def delete_profile_cascade(self, profile_id: str) -> bool:
@@ -471,6 +590,8 @@ class UserModule:
             async with conn.transaction():
                 await conn.execute("DELETE FROM tokens WHERE profile_id=$1", profile_id)
                 result = await conn.execute("DELETE FROM profiles WHERE id=$1", profile_id)
+        self.token_cache.invalidate_profile(profile_id)
+        self._profile_changed(profile_id)
         return result.split()[-1] != "0"
 
     async def verify_profile_ownership(self, user_id: str, profile_id: str) -> bool:
@@ -484,6 +605,7 @@ class UserModule:
         await self.db.execute(
             "UPDATE profiles SET skin_hash=$1 WHERE id=$2", skin_hash, profile_id
         )
+        self._profile_changed(profile_id)
 
     async def update_profile_skin_and_model(
         self, profile_id: str, skin_hash: str | None, texture_model: str
@@ -493,17 +615,20 @@ class UserModule:
             "UPDATE profiles SET skin_hash=$1, texture_model=$2 WHERE id=$3",
             skin_hash, texture_model, profile_id,
         )
+        self._profile_changed(profile_id)
 
     async def update_profile_cape(self, profile_id: str, cape_hash: str | None = None):
         await self.db.execute(
             "UPDATE profiles SET cape_hash=$1 WHERE id=$2", cape_hash, profile_id
         )
+        self._profile_changed(profile_id)
             
     async def update_profile_texture_model(self, profile_id: str, texture_model: str):
         await self.db.execute(
             "UPDATE profiles SET texture_model=$1 WHERE id=$2",
             texture_model, profile_id,
         )
+        self._profile_changed(profile_id)
 
     async def update_profile_name(self, profile_id: str, name: str) -> bool:
         """更新角色名，返回是否真的更新到行（不处理验证）。
@@ -514,16 +639,38 @@ class UserModule:
             result = await self.db.execute("UPDATE profiles SET name=$1 WHERE id=$2", name, profile_id)
         except asyncpg.exceptions.UniqueViolationError:
             return False
+        self._profile_changed(profile_id, name)
         return result.split()[-1] != "0"
 
     async def search_profiles_by_names(self, names: list[str], limit: int = 20) -> list[PlayerProfile]:
-        # asyncpg handle array nicely with ANY
+        """按名称批量解析角色，大小写不敏感（与 Mojang 一致）。
+
+        输入按小写去重后取前 limit 个，整批走 lower(name) 函数索引一次查完；
+        同一小写名存在多个角色时优先大小写完全一致的。结果按输入顺序返回。
+        小写折叠全部由 Postgres 的 lower() 完成：Python 的 str.lower() 对非 ASCII
+        字符（如 'İ'、C 排序规则下的 'Ä'）可能与之不一致，导致匹配到的行被丢弃。
+        """
+        spellings = [name for name in names if isinstance(name, str) and name]
+        if not spellings:
+            return []
         rows = await self.db.fetch(
-            "SELECT id, user_id, name, texture_model, skin_hash, cape_hash FROM profiles WHERE name = ANY($1) LIMIT $2",
-            names, limit,
+            """
+            WITH wanted AS (
+                SELECT lower(n) AS key, min(ord) AS ord
+                FROM unnest($1::text[]) WITH ORDINALITY AS t(n, ord)
+                GROUP BY lower(n)
+                ORDER BY min(ord)
+                LIMIT $2
+            )
+            SELECT DISTINCT ON (w.ord) p.id, p.user_id, p.name, p.texture_model, p.skin_hash, p.cape_hash
+            FROM wanted w
+            JOIN profiles p ON lower(p.name) = w.key
+            ORDER BY w.ord, p.name = ANY($1::text[]) DESC, p.id
+            """,
+            spellings, limit,
         )
         return [PlayerProfile(*r) for r in rows]
-                
+
     async def count_profiles_by_user(self, user_id: str) -> int:
         return await self.db.fetchval("SELECT COUNT(*) FROM profiles WHERE user_id=$1", user_id) or 0
 
@@ -543,46 +690,126 @@ class UserModule:
             "INSERT INTO tokens (access_token, client_token, user_id, profile_id, created_at) VALUES ($1, $2, $3, $4, $5)",
             token.access_token, token.client_token, token.user_id, token.profile_id, token.created_at,
         )
+        # 清掉可能存在的负缓存
+        self.token_cache.invalidate_token(token.access_token)
+
+    async def issue_token(self, token: Token, expired_before: int, keep: int) -> list[str]:
+        """写入新 token，并在同一条语句内裁掉该用户的过期 token 与超出 keep 个的旧 token。
+
+        等价于 add_token + delete_expired_tokens + delete_surplus_tokens（新 token 计入 keep），
+        一次往返完成。返回被裁掉的 access token。
+        """
+        rows = await self.db.fetch(
+            """
+            WITH ins AS (
+                INSERT INTO tokens (access_token, client_token, user_id, profile_id, created_at)
+                VALUES ($1, $2, $3, $4, $5)
+            )
+            DELETE FROM tokens t
+            WHERE t.user_id = $3
+              AND (t.created_at < $6 OR t.access_token IN (
+                  SELECT access_token FROM tokens
+                  WHERE user_id = $3
+                  ORDER BY created_at DESC, access_token DESC
+                  OFFSET $7
+              ))
+            RETURNING t.access_token
+            """,
+            token.access_token, token.client_token, token.user_id, token.profile_id, token.created_at,
+            expired_before, max(0, keep - 1),
+        )
+        trimmed = [r[0] for r in rows]
+        self.token_cache.invalidate_token(token.access_token)
+        for access_token in trimmed:
+            self.token_cache.invalidate_token(access_token)
+        return trimmed
 
     async def get_token(self, access_token: str) -> Token | None:
+        """按 access token 取 Token，经进程内缓存读穿（含不存在 token 的负缓存）。
+
+        绑定的角色不属于 token 用户时视同 token 不存在：角色归属不会变更，
+        角色删除时其 token 随之删除并失效缓存，因此缓存的 Token 无需再校验归属。
+        """
+        cache = self.token_cache
+        if cache.enabled:
+            hit, token = cache.lookup(access_token)
+            if hit:
+                return token
+        generation = cache.generation
         row = await self.db.fetchrow(
-            "SELECT access_token, client_token, user_id, profile_id, created_at FROM tokens WHERE access_token=$1",
+            """
+            SELECT t.access_token, t.client_token, t.user_id, t.profile_id, t.created_at
+            FROM tokens t
+            WHERE t.access_token = $1
+              AND (t.profile_id IS NULL OR EXISTS (
+                  SELECT 1 FROM profiles p WHERE p.id = t.profile_id AND p.user_id = t.user_id
+              ))
+            """,
             access_token,
         )
-        if row:
-            return Token(*row)
-        return None
+        token = Token(*row) if row else None
+        cache.fill(access_token, token, generation)
+        return token
 
     async def delete_token(self, access_token: str):
         await self.db.execute("DELETE FROM tokens WHERE access_token=$1", access_token)
+        self.token_cache.invalidate_token(access_token)
 
-    async def rotate_token(self, old_access: str, new_token: Token) -> bool:
-        """事务内删除旧 yggdrasil token 并写入新 token；旧 token 不存在或被并发消费返回 False。
+    async def rotate_token(
+        self,
+        old_access: str,
+        new_token: Token,
+        expired_before: int | None = None,
+        keep: int | None = None,
+    ) -> bool:
+        """单条语句内删除旧 yggdrasil token 并写入新 token；旧 token 不存在或被并发消费返回 False。
 
-        将删除与写入合并为单事务，避免任意单步失败导致用户的 yggdrasil 会话被强制销毁。
+        删除与写入在同一语句（同一隐式事务）中，任意一步失败都不会销毁用户的 yggdrasil 会话。
+        给出 expired_before / keep 时同一语句内顺带裁掉该用户的过期与超额 token（新 token 计入 keep）。
         """
-        async with self.db.get_conn() as conn:
-            async with conn.transaction():
-                tag = await conn.execute(
-                    "DELETE FROM tokens WHERE access_token=$1", old_access
-                )
-                deleted = int(tag.split()[-1] or 0)
-                if deleted == 0:
-                    return False
-                await conn.execute(
-                    "INSERT INTO tokens (access_token, client_token, user_id, profile_id, created_at) VALUES ($1, $2, $3, $4, $5)",
-                    new_token.access_token, new_token.client_token, new_token.user_id, new_token.profile_id, new_token.created_at,
-                )
-                return True
+        row = await self.db.fetchrow(
+            """
+            WITH old AS (
+                DELETE FROM tokens WHERE access_token = $1 RETURNING 1
+            ), ins AS (
+                INSERT INTO tokens (access_token, client_token, user_id, profile_id, created_at)
+                SELECT $2, $3, $4, $5, $6 FROM old
+                RETURNING 1
+            ), trimmed AS (
+                DELETE FROM tokens t
+                WHERE EXISTS (SELECT 1 FROM old)
+                  AND t.user_id = $4 AND t.access_token <> $1
+                  AND (t.created_at < $7 OR ($8::int IS NOT NULL AND t.access_token IN (
+                      SELECT access_token FROM tokens
+                      WHERE user_id = $4 AND access_token <> $1
+                      ORDER BY created_at DESC, access_token DESC
+                      OFFSET $8
+                  )))
+                RETURNING t.access_token
+            )
+            SELECT EXISTS (SELECT 1 FROM ins), ARRAY(SELECT access_token FROM trimmed)
+            """,
+            old_access, new_token.access_token, new_token.client_token, new_token.user_id,
+            new_token.profile_id, new_token.created_at,
+            expired_before, max(0, keep - 1) if keep is not None else None,
+        )
+        rotated, trimmed = row[0], row[1]
+        self.token_cache.invalidate_token(old_access)
+        self.token_cache.invalidate_token(new_token.access_token)
+        for access_token in trimmed:
+            self.token_cache.invalidate_token(access_token)
+        return bool(rotated)
 
     async def delete_tokens_by_user(self, user_id: str):
         await self.db.execute("DELETE FROM tokens WHERE user_id=$1", user_id)
+        self.token_cache.invalidate_user(user_id)
 
     async def delete_expired_tokens(self, user_id: str, cutoff: int):
         await self.db.execute(
             "DELETE FROM tokens WHERE user_id=$1 AND created_at < $2",
             user_id, cutoff,
         )
+        self.token_cache.invalidate_user(user_id)
 
     async def delete_surplus_tokens(self, user_id: str, keep: int = 5):
         # Using a subquery in DELETE is fine in PG
@@ -600,6 +827,7 @@ class UserModule:
             """,
             user_id, keep,
         )
+        self.token_cache.invalidate_user(user_id)
             
     # ========== Site Refresh Tokens ==========
     # 站点会话的 refresh token（不透明随机串，库中仅存 SHA-256 哈希）。
@@ -670,15 +898,103 @@ class UserModule:
     # ========== Sessions ==========
 
     async def add_session(self, session: Session):
+        if self.session_store is not None:
+            self.session_store.put(session)
+            return
         await self.db.execute(
             "INSERT INTO sessions (server_id, access_token, ip, created_at) VALUES ($1, $2, $3, $4)",
             session.server_id, session.access_token, session.ip, session.created_at,
         )
 
     async def delete_session(self, server_id: str):
+        if self.session_store is not None:
+            self.session_store.delete(server_id)
+            return
         await self.db.execute("DELETE FROM sessions WHERE server_id=$1", server_id)
 
+    async def delete_expired_sessions(self, cutoff: int):
+        """清理 Postgres 会话表中 created_at 早于 cutoff 的行；进程内存储由时间轮自行过期"""
+        if self.session_store is None:
+            await self.db.execute("DELETE FROM sessions WHERE created_at < $1", cutoff)
+
+    async def join_session(self, session: Session, profile_id: str) -> bool:
+        """单条语句完成 join：校验 token 绑定该角色且角色归属 token 用户，通过则写入/覆盖会话。
+
+        等价于 get_token + verify_profile_ownership + delete_session + add_session，
+        但只占用一次连接、一次往返；同一 serverId 并发 join 由 UPSERT 收敛，不会撞主键。
+        校验不通过时不写入任何行，返回 False。
+        使用进程内会话存储时，校验仍是一次查询，会话写入内存。
+        """
+        if self.session_store is not None:
+            val = await self.db.fetchval(
+                """
+                SELECT 1 FROM tokens t
+                JOIN profiles p ON p.id = t.profile_id AND p.user_id = t.user_id
+                WHERE t.access_token = $1 AND t.profile_id = $2
+                """,
+                session.access_token, profile_id,
+            )
+            if val is None:
+                return False
+            self.session_store.put(session)
+            return True
+        val = await self.db.fetchval(
+            """
+            INSERT INTO sessions (server_id, access_token, ip, created_at)
+            SELECT $1, t.access_token, $3, $4
+            FROM tokens t
+            JOIN profiles p ON p.id = t.profile_id AND p.user_id = t.user_id
+            WHERE t.access_token = $2 AND t.profile_id = $5
+            ON CONFLICT (server_id) DO UPDATE
+                SET access_token = EXCLUDED.access_token, ip = EXCLUDED.ip, created_at = EXCLUDED.created_at
+            RETURNING 1
+            """,
+            session.server_id, session.access_token, session.ip, session.created_at, profile_id,
+        )
+        return val is not None
+
+    async def get_joined_profile(
+        self, server_id: str, username: str, min_created_at: int
+    ) -> tuple[PlayerProfile, int | None] | None:
+        """单条查询完成 hasJoined：会话未过期 → token 绑定角色 → 角色归属 token 用户且名称一致。
+
+        返回 (角色, 用户 banned_until)，任一条件不满足返回 None；封禁判断由调用方完成。
+        """
+        if self.session_store is not None:
+            session = self.session_store.get(server_id)
+            if session is None or session.created_at < min_created_at:
+                return None
+            row = await self.db.fetchrow(
+                """
+                SELECT p.id, p.user_id, p.name, p.texture_model, p.skin_hash, p.cape_hash, u.banned_until
+                FROM tokens t
+                JOIN profiles p ON p.id = t.profile_id AND p.user_id = t.user_id
+                LEFT JOIN users u ON u.id = p.user_id
+                WHERE t.access_token = $1 AND p.name = $2
+                """,
+                session.access_token, username,
+            )
+            if not row:
+                return None
+            return PlayerProfile(*row[:6]), row[6]
+        row = await self.db.fetchrow(
+            """
+            SELECT p.id, p.user_id, p.name, p.texture_model, p.skin_hash, p.cape_hash, u.banned_until
+            FROM sessions s
+            JOIN tokens t ON t.access_token = s.access_token
+            JOIN profiles p ON p.id = t.profile_id AND p.user_id = t.user_id
+            LEFT JOIN users u ON u.id = p.user_id
+            WHERE s.server_id = $1 AND s.created_at >= $2 AND p.name = $3
+            """,
+            server_id, min_created_at, username,
+        )
+        if not row:
+            return None
+        return PlayerProfile(*row[:6]), row[6]
+
     async def get_session(self, server_id: str) -> Session | None:
+        if self.session_store is not None:
+            return self.session_store.get(server_id)
         row = await self.db.fetchrow(
             "SELECT server_id, access_token, ip, created_at FROM sessions WHERE server_id=$1",
             server_id,
@@ -0,0 +1,182 @@
+"""角色查询的进程内双向缓存：名称 → 角色 id、角色 id → PlayerProfile。
+
+服务器群整天反复解析同一批玩家名与 UUID，每次都查 Postgres，未命中的还要
+转发到回退服务。这里把两类查询结果（含不存在的负结果）缓存在进程内，
+按条目数与估算字节数双重限界，负结果使用更短的 TTL。
+
+一致性：所有写 profiles 的路径在写库后调用 invalidate（创建 / 改名 / 删除 /
+材质与模型变更）。名称项只记录 id，命中后再经 id 项取角色并核对名称，
+即使某个旧名称项未被精确清除，也只会 miss 而不会返回改名前的角色。
+与 TokenCache 相同，回填前取 generation，期间有失效则丢弃回填。
+"""
+
+import sys
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from utils.typing import PlayerProfile
+
+
+# 单个缓存项除字符串本身外的固定开销估算（tuple、OrderedDict 节点、对象头）
+_ENTRY_OVERHEAD = 200
+
+
+def _profile_size(profile: Optional[PlayerProfile]) -> int:
+    if profile is None:
+        return _ENTRY_OVERHEAD
+    fields = (profile.id, profile.user_id, profile.name, profile.texture_model, profile.skin_hash, profile.cape_hash)
+    return _ENTRY_OVERHEAD + sum(sys.getsizeof(f) for f in fields if f is not None)
+
+
+class ProfileCache:
+    """按条目数与字节数限界的角色缓存（LRU + TTL）。
+
+    Args:
+        max_entries: 条目上限（id 项与名称项合计）
+        max_bytes: 估算内存上限
+        ttl_seconds: 存在的角色的缓存时长，0 表示关闭缓存
+        negative_ttl_seconds: 不存在的 id / 名称的缓存时长，0 表示不做负缓存
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 50000,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl_seconds: float = 300,
+        negative_ttl_seconds: float = 10,
+    ):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.ttl_seconds = float(ttl_seconds)
+        self.negative_ttl_seconds = float(negative_ttl_seconds)
+        # {("id", profile_id) | ("name", lower_name): (PlayerProfile | profile_id | None, expires_at, size)}
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "invalidations": 0}
+
+    @classmethod
+    def from_config(cls, config) -> "ProfileCache":
+        """按 yggdrasil.profile_cache.* 配置构建；config 为 None 时使用默认值。"""
+        if config is None:
+            return cls()
+        return cls(
+            max_entries=config.get("yggdrasil.profile_cache.max_entries", 50000),
+            max_bytes=int(float(config.get("yggdrasil.profile_cache.max_mb", 32)) * 1024 * 1024),
+            ttl_seconds=config.get("yggdrasil.profile_cache.ttl_seconds", 300),
+            negative_ttl_seconds=config.get("yggdrasil.profile_cache.negative_ttl_seconds", 10),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    @property
+    def generation(self) -> int:
+        """回填前读取，传给 fill_*；期间有失效发生时回填被丢弃。"""
+        return self._generation
+
+    def _get(self, key: tuple):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if time.monotonic() >= entry[1]:
+            self._remove(key)
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry[0]
+
+    def _count(self, hit: bool, value) -> None:
+        if not hit:
+            self._stats["misses"] += 1
+        elif value is None:
+            self._stats["negative_hits"] += 1
+        else:
+            self._stats["hits"] += 1
+
+    def lookup_id(self, profile_id: str) -> tuple[bool, Optional[PlayerProfile]]:
+        """返回 (是否命中, PlayerProfile | None)；命中且为 None 表示已知不存在。"""
+        hit, profile = self._get(("id", profile_id))
+        self._count(hit, profile)
+        return hit, profile
+
+    def lookup_name(self, name: str) -> tuple[bool, Optional[PlayerProfile]]:
+        """按名称（大小写不敏感）查，语义同 lookup_id。
+
+        名称项指向的 id 项缺失或名称已不一致（改名）时按未命中处理。
+        """
+        key = name.lower()
+        hit, profile_id = self._get(("name", key))
+        if hit and profile_id is not None:
+            hit, profile = self._get(("id", profile_id))
+            if not hit or profile is None or profile.name.lower() != key:
+                hit, profile = False, None
+        else:
+            profile = None
+        self._count(hit, profile)
+        return hit, profile
+
+    def _put(self, key: tuple, value, ttl: float, size: int) -> None:
+        self._remove(key)
+        self._entries[key] = (value, time.monotonic() + ttl, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _ttl(self, found: bool) -> float:
+        return self.ttl_seconds if found else self.negative_ttl_seconds
+
+    def fill_id(self, profile_id: str, profile: Optional[PlayerProfile], generation: int) -> None:
+        if not self.enabled or generation != self._generation:
+            return
+        ttl = self._ttl(profile is not None)
+        if ttl > 0:
+            self._put(("id", profile_id), profile, ttl, _profile_size(profile))
+
+    def fill_name(self, name: str, profile: Optional[PlayerProfile], generation: int) -> None:
+        """写回名称查询结果；找到角色时同时写入 id 项。"""
+        if not self.enabled or generation != self._generation:
+            return
+        ttl = self._ttl(profile is not None)
+        if ttl <= 0:
+            return
+        if profile is not None:
+            self._put(("id", profile.id), profile, ttl, _profile_size(profile))
+        key = name.lower()
+        self._put(("name", key), profile.id if profile else None, ttl, _ENTRY_OVERHEAD + sys.getsizeof(key))
+
+    def _remove(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def invalidate(self, profile_id: str, *names: str) -> None:
+        """角色创建 / 改名 / 删除 / 材质变更后调用；names 为新旧名称（清除可能存在的负缓存）。"""
+        self._generation += 1
+        self._stats["invalidations"] += 1
+        entry = self._entries.get(("id", profile_id))
+        if entry is not None and entry[0] is not None:
+            self._remove(("name", entry[0].name.lower()))
+        self._remove(("id", profile_id))
+        for name in names:
+            if name:
+                self._remove(("name", name.lower()))
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        """命中/负命中/未命中计数、命中率与当前占用，供指标端点输出。"""
+        lookups = self._stats["hits"] + self._stats["negative_hits"] + self._stats["misses"]
+        hit_ratio = (self._stats["hits"] + self._stats["negative_hits"]) / lookups if lookups else 0.0
+        return {
+            **self._stats,
+            "hit_ratio": round(hit_ratio, 4),
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,98 @@
+"""Yggdrasil join 会话的进程内存储。
+
+join 会话只存活 SESSION_TTL（30 秒），写入 Postgres 只会制造 WAL 与索引抖动。
+单实例部署默认把会话放在进程内存：字典 O(1) 查找，哈希时间轮按秒批量过期，
+总条目数有上限（满时淘汰最早写入的会话）。多实例部署（join 与 hasJoined 可能落在
+不同实例）需改用 Postgres 会话表，见 config.yaml 的 yggdrasil.session_store。
+"""
+
+import math
+import time
+
+from utils.typing import Session
+
+
+class MemorySessionStore:
+    """带 TTL 的会话存储。
+
+    Args:
+        ttl_ms: 会话有效期（毫秒），以 session.created_at 起算
+        max_entries: 条目上限，超过时淘汰最早写入的会话
+        tick_ms: 时间轮刻度（毫秒），过期清理的粒度
+    """
+
+    def __init__(self, ttl_ms: int = 30000, max_entries: int = 100000, tick_ms: int = 1000):
+        self.ttl_ms = max(1, int(ttl_ms))
+        self.max_entries = max(1, int(max_entries))
+        self.tick_ms = max(1, int(tick_ms))
+        self._slots = math.ceil(self.ttl_ms / self.tick_ms) + 1
+        self._entries: dict = {}  # {server_id: (Session, expires_at)}，按写入顺序
+        self._wheel: list = [set() for _ in range(self._slots)]
+        self._last_tick = self._tick(self._now())
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    @staticmethod
+    def _now() -> int:
+        return int(time.time() * 1000)
+
+    def _tick(self, ms: int) -> int:
+        return ms // self.tick_ms
+
+    def _advance(self, now: int) -> None:
+        """转动时间轮到 now，清理到期刻度上的会话；每个刻度只处理一次，均摊 O(1)。"""
+        current = self._tick(now)
+        # 长时间无操作时最多转一整圈
+        start = max(self._last_tick + 1, current - self._slots + 1)
+        for tick in range(start, current + 1):
+            bucket = self._wheel[tick % self._slots]
+            for server_id in bucket:
+                entry = self._entries.get(server_id)
+                # 会话可能已被覆盖写入（挂在更晚的刻度上），只删真正到期的
+                if entry is not None and entry[1] <= now:
+                    del self._entries[server_id]
+                    self._stats["expired"] += 1
+            bucket.clear()
+        self._last_tick = max(self._last_tick, current)
+
+    def put(self, session: Session) -> None:
+        now = self._now()
+        self._advance(now)
+        expires_at = session.created_at + self.ttl_ms
+        if expires_at <= now:
+            return
+        # 重新插入以刷新写入顺序
+        self._entries.pop(session.server_id, None)
+        self._entries[session.server_id] = (session, expires_at)
+        expire_tick = -(-expires_at // self.tick_ms)  # 向上取整：到该刻度时必已过期
+        self._wheel[expire_tick % self._slots].add(session.server_id)
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+            self._stats["evicted"] += 1
+
+    def get(self, server_id: str) -> Session | None:
+        now = self._now()
+        self._advance(now)
+        entry = self._entries.get(server_id)
+        if entry is None or entry[1] <= now:
+            self._stats["misses"] += 1
+            return None
+        self._stats["hits"] += 1
+        return entry[0]
+
+    def delete(self, server_id: str) -> None:
+        self._entries.pop(server_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        for bucket in self._wheel:
+            bucket.clear()
+
+    def stats(self) -> dict:
+        """条目数与命中/过期/淘汰计数，供指标端点输出。"""
+        self._advance(self._now())
+        return {
+            **self._stats,
+            "backend": "memory",
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+        }
@@ -0,0 +1,137 @@
+"""Yggdrasil access token 的进程内读穿缓存。
+
+validate / refresh / 材质上传删除等接口的第一步都是按 access token 查 tokens 表。
+token 行写入后除删除外不再变化，适合按 access token 缓存：命中直接返回 Token，
+不存在的 token 也短时缓存（负缓存），挡住无效 token 的重复查询。
+
+所有删除 token 的路径都必须调用对应的 invalidate_*：按 token、按用户、按角色
+精确失效。为避免「查询进行中 token 被删除，查询结果随后写回缓存」的竞态，
+回填前取 generation，期间发生过任何失效则丢弃这次回填。
+"""
+
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from utils.typing import Token
+
+
+class TokenCache:
+    """按 access token 缓存 Token 的有界 LRU。
+
+    Args:
+        max_entries: 缓存条目上限（含负缓存）
+        ttl_seconds: 存在的 token 的缓存时长，0 表示关闭缓存
+        negative_ttl_seconds: 不存在的 token 的缓存时长，0 表示不做负缓存
+    """
+
+    def __init__(self, max_entries: int = 50000, ttl_seconds: float = 60, negative_ttl_seconds: float = 5):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.negative_ttl_seconds = float(negative_ttl_seconds)
+        self._entries: OrderedDict = OrderedDict()  # {access_token: (Token | None, expires_at)}
+        self._by_user: dict = {}     # {user_id: {access_token}}
+        self._by_profile: dict = {}  # {profile_id: {access_token}}
+        self._generation = 0
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "invalidations": 0}
+
+    @classmethod
+    def from_config(cls, config) -> "TokenCache":
+        """按 yggdrasil.token_cache.* 配置构建；config 为 None 时使用默认值。"""
+        if config is None:
+            return cls()
+        return cls(
+            max_entries=config.get("yggdrasil.token_cache.max_entries", 50000),
+            ttl_seconds=config.get("yggdrasil.token_cache.ttl_seconds", 60),
+            negative_ttl_seconds=config.get("yggdrasil.token_cache.negative_ttl_seconds", 5),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    @property
+    def generation(self) -> int:
+        """回填前读取，传给 fill；期间有失效发生时回填被丢弃。"""
+        return self._generation
+
+    def lookup(self, access_token: str) -> tuple[bool, Optional[Token]]:
+        """返回 (是否命中, Token | None)；命中且为 None 表示已知不存在。"""
+        entry = self._entries.get(access_token)
+        if entry is None:
+            self._stats["misses"] += 1
+            return False, None
+        token, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self._remove(access_token)
+            self._stats["misses"] += 1
+            return False, None
+        self._entries.move_to_end(access_token)
+        if token is None:
+            self._stats["negative_hits"] += 1
+        else:
+            self._stats["hits"] += 1
+        return True, token
+
+    def fill(self, access_token: str, token: Optional[Token], generation: int) -> None:
+        """写回查询结果；generation 过期（期间有失效）则丢弃。"""
+        if not self.enabled or generation != self._generation:
+            return
+        ttl = self.ttl_seconds if token is not None else self.negative_ttl_seconds
+        if ttl <= 0:
+            return
+        self._remove(access_token)
+        self._entries[access_token] = (token, time.monotonic() + ttl)
+        if token is not None:
+            self._by_user.setdefault(token.user_id, set()).add(access_token)
+            if token.profile_id:
+                self._by_profile.setdefault(token.profile_id, set()).add(access_token)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, access_token: str) -> None:
+        entry = self._entries.pop(access_token, None)
+        if entry is None or entry[0] is None:
+            return
+        token = entry[0]
+        self._discard_index(self._by_user, token.user_id, access_token)
+        if token.profile_id:
+            self._discard_index(self._by_profile, token.profile_id, access_token)
+
+    @staticmethod
+    def _discard_index(index: dict, key: str, access_token: str) -> None:
+        tokens = index.get(key)
+        if tokens is not None:
+            tokens.discard(access_token)
+            if not tokens:
+                del index[key]
+
+    def invalidate_token(self, access_token: str) -> None:
+        """token 被删除或新写入（清掉可能存在的负缓存）时调用。"""
+        self._generation += 1
+        self._stats["invalidations"] += 1
+        self._remove(access_token)
+
+    def invalidate_user(self, user_id: str) -> None:
+        """用户的 token 被批量删除、密码变更或用户被删除时调用。"""
+        self._generation += 1
+        self._stats["invalidations"] += 1
+        for access_token in list(self._by_user.get(user_id, ())):
+            self._remove(access_token)
+
+    def invalidate_profile(self, profile_id: str) -> None:
+        """角色被删除（其 token 随之删除）时调用。"""
+        self._generation += 1
+        self._stats["invalidations"] += 1
+        for access_token in list(self._by_profile.get(profile_id, ())):
+            self._remove(access_token)
+
+    def clear(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+        self._by_user.clear()
+        self._by_profile.clear()
+
+    def stats(self) -> dict:
+        """命中/负命中/失效计数与当前条目数，供指标端点输出。"""
+        return {**self._stats, "entries": len(self._entries), "max_entries": self.max_entries}
@@ -0,0 +1,61 @@
+"""把平铺布局的材质文件（<dir>/<hash>.png）在线迁移到分片布局（<dir>/ab/cd/<hash>.png）。
+
+可在服务运行期间执行：每个文件先硬链接到新路径再删除旧路径，迁移中文件始终可读。
+按批处理并在批间休眠，限制对磁盘的 I/O 压力。
+
+步骤：先给 nginx 配置分片改写规则（见 nginx-host.conf），再把 config.yaml 的
+textures.layout 设为 sharded 并重启（新上传改写分片布局），最后运行本脚本迁移存量文件。
+
+用法：
+    python migrate_textures_sharded.py [--dir textures] [--batch-size 500] [--pause 0.5] [--dry-run]
+
+nginx 需同步配置分片改写规则（见 nginx-host.conf），否则迁移后的材质 URL 会 404。
+"""
+
+import argparse
+import os
+import time
+
+from config_loader import config
+from services.texture_storage import iter_legacy_textures, shard_legacy_texture
+
+
+def migrate(textures_dir: str, batch_size: int, pause: float, dry_run: bool = False) -> int:
+    if not os.path.isdir(textures_dir):
+        print(f"❌ 错误: 找不到材质目录 '{textures_dir}'")
+        return 0
+
+    print(f"--- 开始迁移材质到分片布局: {textures_dir} ---")
+    moved = 0
+    batch = 0
+    for texture_hash in iter_legacy_textures(textures_dir):
+        if dry_run:
+            print(f"  [dry-run] {texture_hash}.png")
+            moved += 1
+            continue
+        try:
+            if shard_legacy_texture(textures_dir, texture_hash):
+                moved += 1
+        except OSError as e:
+            print(f"  ⚠️ 跳过 {texture_hash}.png: {e}")
+            continue
+
+        batch += 1
+        if batch >= batch_size:
+            print(f"  已迁移 {moved} 个文件")
+            batch = 0
+            time.sleep(pause)
+
+    action = "待迁移" if dry_run else "已迁移"
+    print(f"--- 完成: {action} {moved} 个文件 ---")
+    return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="迁移材质文件到分片目录布局")
+    parser.add_argument("--dir", default=config.get("textures.directory", "textures"), help="材质目录")
+    parser.add_argument("--batch-size", type=int, default=500, help="每批迁移的文件数")
+    parser.add_argument("--pause", type=float, default=0.5, help="批间休眠秒数")
+    parser.add_argument("--dry-run", action="store_true", help="只列出待迁移文件")
+    args = parser.parse_args()
+    migrate(args.dir, max(1, args.batch_size), max(0.0, args.pause), args.dry_run)
@@ -0,0 +1,98 @@
+"""离线重压缩存量材质文件：以最高 zlib 压缩级别重新编码 PNG，减小存储与下载体积。
+
+像素不变，因此材质 hash（文件名）不变；每个文件替换前都会校验解码后的像素 hash，
+不一致则跳过并报告。可在服务运行期间执行，多进程并行处理，
+进度写入状态文件，中断后重新执行会跳过已处理的材质。
+
+用法：
+    python recompress_textures.py [--dir textures] [--workers 4] [--batch-size 200]
+                                  [--pause 0.5] [--state recompress_textures.state] [--dry-run]
+"""
+
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from config_loader import config
+from services.texture_gc import scan_texture_files
+from services.texture_storage import recompress_texture
+
+
+def _recompress_one(args: tuple[str, str, bool]) -> tuple[str, int, int, str]:
+    textures_dir, texture_hash, dry_run = args
+    try:
+        before, after = recompress_texture(textures_dir, texture_hash, dry_run)
+        return texture_hash, before, after, ""
+    except (OSError, ValueError) as e:
+        return texture_hash, 0, 0, str(e) or type(e).__name__
+
+
+def _load_state(state_path: str) -> set:
+    if not os.path.exists(state_path):
+        return set()
+    with open(state_path, "r", encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def recompress(textures_dir: str, workers: int, batch_size: int, pause: float,
+               state_path: str, dry_run: bool = False) -> dict:
+    if not os.path.isdir(textures_dir):
+        print(f"❌ 错误: 找不到材质目录 '{textures_dir}'")
+        return {}
+
+    done = set() if dry_run else _load_state(state_path)
+    pending = sorted(scan_texture_files(textures_dir, 0).present - done)
+    print(f"--- 开始重压缩材质: {textures_dir}（待处理 {len(pending)}，已完成 {len(done)}）---")
+
+    report = {"processed": 0, "replaced": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0}
+    state = None if dry_run else open(state_path, "a", encoding="utf-8")
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for i in range(0, len(pending), batch_size):
+                batch = pending[i:i + batch_size]
+                jobs = [(textures_dir, h, dry_run) for h in batch]
+                for texture_hash, before, after, error in pool.map(_recompress_one, jobs):
+                    report["processed"] += 1
+                    if error:
+                        report["failed"] += 1
+                        print(f"  ⚠️ 跳过 {texture_hash}: {error}")
+                        continue
+                    report["bytes_before"] += before
+                    report["bytes_after"] += after
+                    if after < before:
+                        report["replaced"] += 1
+                    if state is not None:
+                        state.write(texture_hash + "\n")
+                if state is not None:
+                    state.flush()
+                saved = report["bytes_before"] - report["bytes_after"]
+                print(f"  已处理 {report['processed']}/{len(pending)}，节省 {saved} 字节")
+                if i + batch_size < len(pending):
+                    time.sleep(pause)
+    finally:
+        if state is not None:
+            state.close()
+
+    saved = report["bytes_before"] - report["bytes_after"]
+    ratio = saved / report["bytes_before"] * 100 if report["bytes_before"] else 0.0
+    action = "可节省" if dry_run else "已节省"
+    print(
+        f"--- 完成: 处理 {report['processed']} 个，重写 {report['replaced']} 个，失败 {report['failed']} 个；"
+        f"{action} {saved} 字节（{ratio:.1f}%）---"
+    )
+    report["bytes_saved"] = saved
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="离线重压缩材质 PNG 文件")
+    parser.add_argument("--dir", default=config.get("textures.directory", "textures"), help="材质目录")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="并行进程数")
+    parser.add_argument("--batch-size", type=int, default=200, help="每批处理的材质数（每批后写入进度）")
+    parser.add_argument("--pause", type=float, default=0.5, help="批间休眠秒数")
+    parser.add_argument("--state", default="recompress_textures.state", help="进度文件，用于中断后续跑")
+    parser.add_argument("--dry-run", action="store_true", help="只统计可节省的字节，不改动文件")
+    args = parser.parse_args()
+    recompress(args.dir, max(1, args.workers), max(1, args.batch_size), max(0.0, args.pause),
+               args.state, args.dry_run)
@@ -11,13 +11,19 @@ from fastapi import (
 import os
 
 from routers.deps import admin_required
+from utils import metrics
 from utils.uuid_utils import generate_random_uuid
 from utils.pagination import clamp_limit
+from utils.fast_json import FastJSONResponse
+from utils.uploads import UploadTooLarge, read_upload
 
 router = APIRouter()
 
+# 轮播图上传上限（字节）；同时用于 routes_reference 中的请求体硬上限
+CAROUSEL_MAX_BYTES = 5 * 1024 * 1024
 
-def setup_routes(admin_backend, settings_backend):
+
+def setup_routes(admin_backend, settings_backend, texture_gc=None):
     """设置路由（注入依赖）"""
 
     # ========== Settings (Granular) ==========
@@ -204,12 +210,12 @@ def setup_routes(admin_backend, settings_backend):
         payload: dict = Depends(admin_required)
     ):
         """获取所有材质列表（支持搜索、类型过滤和游标分页）"""
-        return await admin_backend.get_all_textures(
+        return FastJSONResponse(await admin_backend.get_all_textures(
             limit=clamp_limit(limit),
             cursor=cursor,
             query=q.strip() if q and q.strip() else None,
             type_filter=type,
-        )
+        ))
 
     @router.patch("/admin/textures/{hash}")
     async def update_admin_texture(
@@ -284,9 +290,11 @@ def setup_routes(admin_backend, settings_backend):
             raise HTTPException(status_code=400, detail="Unsupported file format")
 
         filename = f"{generate_random_uuid()}{ext}"
-        content = await file.read()
         # 轮播图大小上限：5MB。轮播图不走材质存储，单独设固定上限防止超大文件落盘。
-        if len(content) > 5 * 1024 * 1024:
+        # 分块读取，超限即中断，不把整个请求体读进内存。
+        try:
+            content = await read_upload(file, CAROUSEL_MAX_BYTES, sniff_png=False)
+        except UploadTooLarge:
             raise HTTPException(status_code=400, detail="File too large")
         return await admin_backend.upload_carousel_image(filename, content)
 
@@ -294,4 +302,19 @@ def setup_routes(admin_backend, settings_backend):
     async def delete_carousel(filename: str, payload: dict = Depends(admin_required)):
         return await admin_backend.delete_carousel_image(filename)
 
+    # ========== Texture GC ==========
+
+    @router.post("/admin/textures/gc")
+    async def run_texture_gc(dry_run: bool = True, payload: dict = Depends(admin_required)):
+        """手动触发孤儿材质回收；默认 dry-run，仅返回报告不删除文件"""
+        if texture_gc is None:
+            raise HTTPException(status_code=404, detail="Texture GC is not configured")
+        return await texture_gc.run(dry_run=dry_run)
+
+    # ========== Metrics ==========
+
+    @router.get("/admin/metrics")
+    async def get_metrics(payload: dict = Depends(admin_required)):
+        return metrics.snapshot()
+
     return router
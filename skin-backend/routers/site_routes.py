@@ -10,16 +10,24 @@ from fastapi import (
     File,
     Form,
 )
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse
 from typing import Optional
+import re
 
 from utils.jwt_utils import get_access_cookie_settings, get_refresh_cookie_settings
 from utils.pagination import clamp_limit
+from utils.fast_json import FastJSONResponse
 from routers.deps import get_current_user
 from config_loader import Config
+from services import resolve_max_texture_bytes
+from utils.uploads import UploadTooLarge, read_upload
 
 router = APIRouter()
 
+_TEXTURE_HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+# 预览图按 hash 寻址，内容永不变化
+_PREVIEW_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
 
 def _set_session_cookies(response: JSONResponse, access_token: str, refresh_token: str) -> None:
     """在响应上写入 access + refresh 两个 httponly cookie。"""
@@ -35,6 +43,15 @@ def _set_session_cookies(response: JSONResponse, access_token: str, refresh_toke
 def setup_routes(site_backend, profile_import_backend, settings_backend, rate_limiter, config: Config):
     """设置路由（注入依赖）"""
 
+    async def _read_texture_upload(file: UploadFile) -> bytes:
+        """按 max_texture_size 分块读取材质上传，首块嗅探 PNG 头，超限/非 PNG 提前拒绝"""
+        try:
+            return await read_upload(file, await resolve_max_texture_bytes(site_backend.db))
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
     @router.post("/site-login")
     async def site_login(req: dict, request: Request):
         await rate_limiter.check(request, is_auth_endpoint=True)
@@ -196,7 +213,7 @@ def setup_routes(site_backend, profile_import_backend, settings_backend, rate_li
         model: str = Form("default"),
     ):
         user_id = payload.get("sub")
-        content = await file.read()
+        content = await _read_texture_upload(file)
         public_bool = is_public.lower() == "true"
         try:
             texture_hash, texture_type = await site_backend.upload_texture_to_library(
@@ -214,9 +231,9 @@ def setup_routes(site_backend, profile_import_backend, settings_backend, rate_li
         payload: dict = Depends(get_current_user)
     ):
         """获取我的材质列表（仅支持游标分页）"""
-        return await site_backend.list_my_textures(
+        return FastJSONResponse(await site_backend.list_my_textures(
             payload.get("sub"), cursor, clamp_limit(limit), texture_type
-        )
+        ))
 
     @router.get("/me/profiles")
     async def list_my_profiles(
@@ -225,7 +242,9 @@ def setup_routes(site_backend, profile_import_backend, settings_backend, rate_li
         payload: dict = Depends(get_current_user)
     ):
         """获取我的角色列表（仅支持游标分页）"""
-        return await site_backend.list_my_profiles(payload.get("sub"), cursor, clamp_limit(limit))
+        return FastJSONResponse(
+            await site_backend.list_my_profiles(payload.get("sub"), cursor, clamp_limit(limit))
+        )
 
     @router.get("/me/textures/{hash}/{texture_type}")
     async def get_my_texture_detail(
@@ -270,10 +289,10 @@ def setup_routes(site_backend, profile_import_backend, settings_backend, rate_li
         q: str | None = None,
     ):
         """获取公开皮肤库（支持游标分页、类型过滤与名称搜索）"""
-        return await site_backend.get_public_skin_library(
+        return FastJSONResponse(await site_backend.get_public_skin_library(
             cursor, clamp_limit(limit), texture_type,
             query=q.strip() if q and q.strip() else None,
-        )
+        ))
 
     @router.post("/me/textures/{hash}/apply")
     async def apply_texture_to_profile(
@@ -303,7 +322,7 @@ def setup_routes(site_backend, profile_import_backend, settings_backend, rate_li
         前端直接上传材质接口.
         此接口现在是 Web API 的一部分，强制使用 JWT 进行身份验证。
         """
-        content = await file.read()
+        content = await _read_texture_upload(file)
         public_bool = is_public.lower() == "true"
         try:
             return await site_backend.upload_and_apply_texture(
@@ -312,12 +331,27 @@ def setup_routes(site_backend, profile_import_backend, settings_backend, rate_li
         except ValueError as e:
             raise HTTPException(status_code=403, detail=str(e))
 
+    @router.get("/textures/{hash}/preview/{kind}")
+    async def get_texture_preview(hash: str, kind: str):
+        """材质平面预览图（head/body 用于皮肤，cape 用于披风），缺失时按需补生成
+
+        材质不存在或无法解码时 404；工作池饱和或生成超时时 503 + Retry-After（TextureWorkerBusy）。
+        """
+        if not _TEXTURE_HASH_RE.match(hash) or kind not in ("head", "body", "cape"):
+            raise HTTPException(status_code=404, detail="Preview not found")
+        path = await site_backend.texture_storage.ensure_preview_async(hash, kind)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Preview not found")
+        return FileResponse(
+            path, media_type="image/png", headers={"Cache-Control": _PREVIEW_CACHE_CONTROL}
+        )
+
     @router.get("/public/settings")
     async def get_public_settings():
-        return await settings_backend.get_public_settings()
+        return FastJSONResponse(await settings_backend.get_public_settings())
 
     @router.get("/public/carousel")
     async def get_carousel():
-        return await site_backend.list_carousel_images()
+        return FastJSONResponse(await site_backend.list_carousel_images())
 
     return router
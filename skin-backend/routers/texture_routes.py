@@ -0,0 +1,29 @@
+"""材质静态文件路由（可选）：无 Nginx 的部署由后端直接提供 /static/textures/"""
+
+from fastapi import APIRouter, Request
+from fastapi.responses import FileResponse, Response
+
+from utils.http_cache import etag_matches
+
+router = APIRouter()
+
+# 材质按 hash 寻址，内容永不变化
+_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def setup_routes(file_cache):
+    """设置路由（注入依赖）"""
+
+    @router.api_route("/static/textures/{name}", methods=["GET", "HEAD"], include_in_schema=False)
+    async def serve_texture(name: str, request: Request):
+        entry = await file_cache.get(name)
+        if entry is None:
+            return Response(status_code=404)
+        headers = {"ETag": entry.etag, "Cache-Control": _IMMUTABLE_CACHE_CONTROL}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+        if entry.data is not None:
+            return Response(entry.data, media_type="image/png", headers=headers)
+        return FileResponse(entry.path, media_type="image/png", headers=headers, stat_result=entry.stat)
+
+    return router
@@ -11,9 +11,13 @@ from fastapi import (
 )
 from fastapi.responses import Response
 from utils.schemas import AuthRequest, RefreshRequest, JoinRequest
-from backends.yggdrasil_backend import YggdrasilBackend
+from backends.yggdrasil_backend import YggdrasilBackend, IllegalArgumentException
 from backends.fallback_backend import FallbackBackend
 from database_module import Database
+from services import resolve_max_texture_bytes
+from utils.uploads import read_upload
+from utils.http_cache import etag_matches
+from utils.fast_json import FastJSONResponse
 
 router = APIRouter()
 
@@ -26,10 +30,11 @@ def _require_bearer_token(authorization: str | None) -> str:
     raise HTTPException(status_code=401, detail="access token required")
 
 
-def setup_routes(backend: YggdrasilBackend, db: Database, rate_limiter):
+def setup_routes(backend: YggdrasilBackend, db: Database, rate_limiter, fallback_backend: FallbackBackend | None = None):
     """设置路由（注入依赖）"""
 
-    fallback_backend = FallbackBackend(db)
+    if fallback_backend is None:
+        fallback_backend = FallbackBackend(db)
 
     @router.post("/authserver/authenticate")
     async def authenticate(req: AuthRequest, request: Request):
@@ -39,7 +44,7 @@ def setup_routes(backend: YggdrasilBackend, db: Database, rate_limiter):
             req.username, req.password, req.clientToken, req.requestUser
         )
         rate_limiter.reset(request.client.host, request.url.path)
-        return resp
+        return FastJSONResponse(resp)
 
     @router.post("/authserver/refresh")
     async def refresh(req: RefreshRequest):
@@ -56,9 +61,9 @@ def setup_routes(backend: YggdrasilBackend, db: Database, rate_limiter):
 
         request_user = getattr(req, "requestUser", False)
 
-        return await backend.refresh(
+        return FastJSONResponse(await backend.refresh(
             req.accessToken, req.clientToken, selected_profile_uuid, request_user
-        )
+        ))
 
     @router.post("/authserver/validate")
     async def validate(req: dict):
@@ -102,7 +107,7 @@ def setup_routes(backend: YggdrasilBackend, db: Database, rate_limiter):
         """检查是否已加入服务器"""
         profile = await backend.has_joined(username, serverId)
         if profile:
-            return backend.build_profile_json(profile, sign=True)
+            return FastJSONResponse(await backend.build_profile_json(profile, sign=True))
 
         # Fallback to configured services
         fallback_resp = await fallback_backend.has_joined(username, serverId, ip)
@@ -116,7 +121,7 @@ def setup_routes(backend: YggdrasilBackend, db: Database, rate_limiter):
         """获取角色信息"""
         profile = await backend.get_profile(uuid)
         if profile:
-            return backend.build_profile_json(profile, sign=not unsigned)
+            return FastJSONResponse(await backend.build_profile_json(profile, sign=not unsigned))
 
         # Fallback to configured services
         fallback_resp = await fallback_backend.get_profile(uuid, unsigned)
@@ -128,7 +133,7 @@ def setup_routes(backend: YggdrasilBackend, db: Database, rate_limiter):
     async def _local_or_fallback_lookup(player_name: str, fallback_fn):
         local = await backend.lookup_profile_by_name(player_name)
         if local:
-            return local
+            return FastJSONResponse(local)
         fallback_resp = await fallback_fn(player_name)
         if fallback_resp:
             return fallback_resp
@@ -152,20 +157,28 @@ def setup_routes(backend: YggdrasilBackend, db: Database, rate_limiter):
         # 1. 查询本地
         local_profiles = await backend.get_profiles_by_names(req)
 
-        # 2. 如果启用了转发，查询 Fallback 服务补全缺失的
+        # 2. 如果启用了转发，查询 Fallback 服务补全缺失的（大小写不敏感去重）
         found_names = {p["name"].lower() for p in local_profiles}
-        missing_names = [n for n in req if n.lower() not in found_names]
+        missing_names = []
+        for n in req:
+            if n and n.lower() not in found_names:
+                found_names.add(n.lower())
+                missing_names.append(n)
         if missing_names:
             mojang_profiles = await fallback_backend.bulk_lookup(missing_names)
             if isinstance(mojang_profiles, list):
                 local_profiles.extend(mojang_profiles)
 
-        return local_profiles
+        return FastJSONResponse(local_profiles)
 
     @router.get("/")
     async def get_api_metadata(request: Request):
-        """API元数据端点 (Yggdrasil服务发现)"""
-        return await backend.build_metadata()
+        """API元数据端点 (Yggdrasil服务发现)：预序列化文档 + ETag 条件请求"""
+        body, etag = await backend.metadata_document()
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
 
     @router.get("/api/minecraft/profile/lookup/name/{playerName}")
     @router.get("/minecraft/profile/lookup/name/{playerName}")
@@ -185,7 +198,10 @@ def setup_routes(backend: YggdrasilBackend, db: Database, rate_limiter):
     ):
         """材质上传（PUT 方法）"""
         token = _require_bearer_token(authorization)
-        content = await file.read()
+        try:
+            content = await read_upload(file, await resolve_max_texture_bytes(db))
+        except ValueError as e:
+            raise IllegalArgumentException(str(e))
         await backend.upload_texture(token, uuid, textureType, content, model)
         return Response(status_code=204)
 
@@ -1,3 +1,24 @@
 from .texture_storage import TextureStorage, assert_texture_size, resolve_max_texture_bytes
+from .texture_workers import TextureWorkerBusy, TextureWorkerPool
+from .texture_gc import TextureGarbageCollector
+from .texture_files import TextureFileCache
+from .fallback_cache import FallbackResponseCache
+from .fallback_health import FallbackHealth
+from .http_client import OutboundHTTPClient
+from .profile_signing import SignedPropertyCache, SigningBusy, SigningService
 
-__all__ = ["TextureStorage", "assert_texture_size", "resolve_max_texture_bytes"]
+__all__ = [
+    "FallbackHealth",
+    "FallbackResponseCache",
+    "OutboundHTTPClient",
+    "SignedPropertyCache",
+    "SigningBusy",
+    "SigningService",
+    "TextureFileCache",
+    "TextureGarbageCollector",
+    "TextureStorage",
+    "TextureWorkerBusy",
+    "TextureWorkerPool",
+    "assert_texture_size",
+    "resolve_max_texture_bytes",
+]
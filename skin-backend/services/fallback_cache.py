@@ -0,0 +1,126 @@
+"""回退服务（Mojang / 其它 Yggdrasil）响应的进程内缓存。
+
+本地查不到的角色、名称会转发到 fallback_endpoints 配置的上游，玩家名与 UUID
+被反复查询，每次都实时请求上游，很容易触发 Mojang 的限流（429）。这里按
+「端点 id + 请求」缓存上游的应答：成功应答按该端点的 cache_ttl（秒）缓存，
+明确的「不存在」（204 / 404）作为负结果短时缓存；超时、5xx、429 等失败不缓存。
+按条目数与估算字节数双重限界（LRU）。
+
+端点配置变更（save_endpoints）后 FallbackModule.version 递增，sync 发现版本变化即清空；
+回填时携带发起请求前的版本，期间配置有变则丢弃回填。hasJoined 不经过本缓存。
+"""
+
+import sys
+import time
+from collections import OrderedDict
+from typing import Any
+
+# 单个缓存项除内容本身外的固定开销估算（key tuple、OrderedDict 节点、对象头）
+_ENTRY_OVERHEAD = 200
+
+
+def _value_size(value: Any) -> int:
+    if value is None:
+        return _ENTRY_OVERHEAD
+    if isinstance(value, (bytes, str)):
+        return _ENTRY_OVERHEAD + len(value)
+    if isinstance(value, dict):
+        return _ENTRY_OVERHEAD + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    return _ENTRY_OVERHEAD + sys.getsizeof(value)
+
+
+class FallbackResponseCache:
+    """按端点与请求缓存回退服务应答的有界 LRU。
+
+    Args:
+        max_entries: 条目上限（含负结果）
+        max_bytes: 估算内存上限
+        negative_ttl_seconds: 负结果缓存时长上限，实际取 min(端点 cache_ttl, 本值)；0 表示不做负缓存
+    """
+
+    def __init__(self, max_entries: int = 20000, max_bytes: int = 16 * 1024 * 1024, negative_ttl_seconds: float = 10):
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(1, int(max_bytes))
+        self.negative_ttl_seconds = float(negative_ttl_seconds)
+        # {(endpoint_id, kind, *request): (bytes | dict | None, expires_at, size)}
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "flushes": 0}
+
+    @classmethod
+    def from_config(cls, config) -> "FallbackResponseCache":
+        """按 yggdrasil.fallback_cache.* 配置构建；config 为 None 时使用默认值。"""
+        if config is None:
+            return cls()
+        return cls(
+            max_entries=config.get("yggdrasil.fallback_cache.max_entries", 20000),
+            max_bytes=int(float(config.get("yggdrasil.fallback_cache.max_mb", 16)) * 1024 * 1024),
+            negative_ttl_seconds=config.get("yggdrasil.fallback_cache.negative_ttl_seconds", 10),
+        )
+
+    @property
+    def version(self):
+        """发起上游请求前读取，传给 fill；期间端点配置有变则回填被丢弃。"""
+        return self._version
+
+    def sync(self, version) -> None:
+        """对齐端点配置版本；版本变化（端点增删改）时清空全部缓存。"""
+        if version != self._version:
+            if self._version is not None:
+                self._stats["flushes"] += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._version = version
+
+    def lookup(self, key: tuple) -> tuple[bool, Any]:
+        """返回 (是否命中, 应答 | None)；命中且为 None 表示上游已答复不存在。"""
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() >= entry[1]:
+            if entry is not None:
+                self._remove(key)
+            self._stats["misses"] += 1
+            return False, None
+        self._entries.move_to_end(key)
+        if entry[0] is None:
+            self._stats["negative_hits"] += 1
+        else:
+            self._stats["hits"] += 1
+        return True, entry[0]
+
+    def fill(self, key: tuple, value: Any, cache_ttl: float, version) -> None:
+        """写回上游应答；value 为 None 表示不存在。cache_ttl 为端点配置的缓存秒数，0 表示该端点不缓存。"""
+        if version != self._version:
+            return
+        cache_ttl = float(cache_ttl or 0)
+        ttl = cache_ttl if value is not None else min(cache_ttl, self.negative_ttl_seconds)
+        if ttl <= 0:
+            return
+        size = _value_size(value)
+        self._remove(key)
+        self._entries[key] = (value, time.monotonic() + ttl, size)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: tuple) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        """命中/负命中/未命中/清空计数、命中率与当前占用，供指标端点输出。"""
+        lookups = self._stats["hits"] + self._stats["negative_hits"] + self._stats["misses"]
+        hit_ratio = (self._stats["hits"] + self._stats["negative_hits"]) / lookups if lookups else 0.0
+        return {
+            **self._stats,
+            "hit_ratio": round(hit_ratio, 4),
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,275 @@
+"""回退端点的健康跟踪：延迟观测、熔断器、对冲等待时长与自适应排序。
+
+- 延迟：每个端点保留最近 N 次上游应答（收到响应头）的耗时与 EWMA。
+  对冲策略先只请求首选端点，超过「该端点近期 p95 延迟」仍无应答时再补发下一个端点；
+  样本不足时使用默认等待时长，结果限制在 [min_delay_ms, max_delay_ms]。
+- 熔断：连接失败、超时、5xx、429 计为失败。最近窗口内失败率超过阈值或连续失败
+  达到上限时断开（open），open_seconds 内直接跳过该端点，不再逐个请求白等超时；
+  冷却后进入半开（half_open），只放行一个探测请求，成功则恢复、失败则重新断开。
+- 排序：可选按延迟 EWMA 对可用端点重新排序，代替管理员配置的静态 priority。
+
+端点配置变更（save_endpoints）后 FallbackModule.version 递增，sync 发现版本变化即清空
+各端点状态：删除的端点不再残留，修改了地址的端点也不沿用旧地址的熔断与延迟。
+"""
+
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+from utils.metrics import percentile
+
+# 每个端点保留的延迟样本数
+_LATENCY_WINDOW = 256
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_failure_status(status: int) -> bool:
+    """上游应答是否计为端点故障（限流与服务端错误）；其它状态码说明端点工作正常。"""
+    return status == 429 or status >= 500
+
+
+class _EndpointState:
+    __slots__ = (
+        "latency", "latency_ewma", "outcomes", "consecutive_failures",
+        "successes", "failures", "timeouts", "state", "opened_at", "probe_started",
+    )
+
+    def __init__(self, window: int):
+        self.latency: deque = deque(maxlen=_LATENCY_WINDOW)
+        self.latency_ewma: Optional[float] = None
+        self.outcomes: deque = deque(maxlen=window)  # 最近请求是否失败
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probe_started: Optional[float] = None
+
+
+class FallbackHealth:
+    """按端点 id 跟踪上游健康状况。
+
+    Args:
+        default_delay_ms: 样本不足时的对冲等待时长
+        min_delay_ms: 对冲等待时长下限，避免端点很快时几乎总是补发
+        max_delay_ms: 对冲等待时长上限
+        min_samples: 使用 p95 所需的最少样本数
+        window: 计算失败率的最近请求数
+        min_requests: 窗口内至少有这么多请求才按失败率熔断
+        failure_rate: 触发熔断的失败率
+        consecutive_failures: 触发熔断的连续失败次数
+        open_seconds: 熔断后跳过端点的时长，之后放行一个探测请求
+        probe_timeout_seconds: 探测请求未回报结果（如被取消）时，多久后允许再次探测
+        ewma_alpha: 延迟 EWMA 的平滑系数
+    """
+
+    def __init__(
+        self,
+        default_delay_ms: float = 500,
+        min_delay_ms: float = 50,
+        max_delay_ms: float = 2000,
+        min_samples: int = 20,
+        window: int = 20,
+        min_requests: int = 10,
+        failure_rate: float = 0.5,
+        consecutive_failures: int = 5,
+        open_seconds: float = 30,
+        probe_timeout_seconds: float = 10,
+        ewma_alpha: float = 0.2,
+    ):
+        self.default_delay_ms = float(default_delay_ms)
+        self.min_delay_ms = float(min_delay_ms)
+        self.max_delay_ms = max(self.min_delay_ms, float(max_delay_ms))
+        self.min_samples = max(1, int(min_samples))
+        self.window = max(1, int(window))
+        self.min_requests = max(1, int(min_requests))
+        self.failure_rate = float(failure_rate)
+        self.consecutive_failures = max(1, int(consecutive_failures))
+        self.open_seconds = float(open_seconds)
+        self.probe_timeout_seconds = float(probe_timeout_seconds)
+        self.ewma_alpha = float(ewma_alpha)
+        self._endpoints: dict = {}  # {endpoint_id: _EndpointState}
+        self._version = None
+        self._stats = {
+            "hedged_requests": 0, "hedges_sent": 0, "hedge_wins": 0, "skipped": 0, "trips": 0, "resets": 0,
+        }
+
+    @classmethod
+    def from_config(cls, config) -> "FallbackHealth":
+        """按 yggdrasil.fallback_hedge.* 与 yggdrasil.fallback_breaker.* 配置构建；config 为 None 时使用默认值。"""
+        if config is None:
+            return cls()
+        return cls(
+            default_delay_ms=config.get("yggdrasil.fallback_hedge.default_delay_ms", 500),
+            min_delay_ms=config.get("yggdrasil.fallback_hedge.min_delay_ms", 50),
+            max_delay_ms=config.get("yggdrasil.fallback_hedge.max_delay_ms", 2000),
+            min_samples=config.get("yggdrasil.fallback_hedge.min_samples", 20),
+            window=config.get("yggdrasil.fallback_breaker.window", 20),
+            min_requests=config.get("yggdrasil.fallback_breaker.min_requests", 10),
+            failure_rate=config.get("yggdrasil.fallback_breaker.failure_rate", 0.5),
+            consecutive_failures=config.get("yggdrasil.fallback_breaker.consecutive_failures", 5),
+            open_seconds=config.get("yggdrasil.fallback_breaker.open_seconds", 30),
+            probe_timeout_seconds=config.get("yggdrasil.fallback_breaker.probe_timeout_seconds", 10),
+        )
+
+    def sync(self, version) -> None:
+        """对齐端点配置版本；版本变化（端点增删改）时清空全部端点状态。"""
+        if version != self._version:
+            if self._version is not None:
+                self._stats["resets"] += 1
+            self._endpoints.clear()
+            self._version = version
+
+    def _get(self, endpoint_id) -> _EndpointState:
+        state = self._endpoints.get(endpoint_id)
+        if state is None:
+            state = self._endpoints[endpoint_id] = _EndpointState(self.window)
+        return state
+
+    # ---------- 结果回报 ----------
+
+    def observe(self, endpoint_id, latency_ms: float) -> None:
+        """记录一次成功的上游应答及其耗时（毫秒）。"""
+        state = self._get(endpoint_id)
+        state.latency.append(latency_ms)
+        if state.latency_ewma is None:
+            state.latency_ewma = latency_ms
+        else:
+            state.latency_ewma += self.ewma_alpha * (latency_ms - state.latency_ewma)
+        state.successes += 1
+        state.outcomes.append(False)
+        state.consecutive_failures = 0
+        if state.state != CLOSED:
+            # 探测成功：恢复
+            state.state = CLOSED
+            state.probe_started = None
+            state.outcomes.clear()
+
+    def record_failure(self, endpoint_id, error: Optional[BaseException] = None) -> None:
+        """记录一次失败（连接错误、超时、5xx、429）；达到阈值时断开端点。"""
+        state = self._get(endpoint_id)
+        state.failures += 1
+        if isinstance(error, asyncio.TimeoutError):
+            state.timeouts += 1
+        state.outcomes.append(True)
+        state.consecutive_failures += 1
+        if state.state == HALF_OPEN:
+            self._trip(state)
+            return
+        if state.state != CLOSED:
+            return
+        requests = len(state.outcomes)
+        failed = sum(state.outcomes)
+        if state.consecutive_failures >= self.consecutive_failures or (
+            requests >= self.min_requests and failed / requests >= self.failure_rate
+        ):
+            self._trip(state)
+
+    def _trip(self, state: _EndpointState) -> None:
+        state.state = OPEN
+        state.opened_at = time.monotonic()
+        state.probe_started = None
+        self._stats["trips"] += 1
+
+    # ---------- 调度 ----------
+
+    def available(self, endpoint_id) -> bool:
+        """端点当前是否可以接收请求（不改变状态）。"""
+        state = self._endpoints.get(endpoint_id)
+        if state is None or state.state == CLOSED:
+            return True
+        now = time.monotonic()
+        if state.state == OPEN:
+            return now - state.opened_at >= self.open_seconds
+        return state.probe_started is None or now - state.probe_started >= self.probe_timeout_seconds
+
+    def acquire(self, endpoint_id) -> bool:
+        """即将向端点发请求前调用；断开冷却结束后把本次请求作为半开探测放行。"""
+        state = self._endpoints.get(endpoint_id)
+        if state is None or state.state == CLOSED:
+            return True
+        if not self.available(endpoint_id):
+            self._stats["skipped"] += 1
+            return False
+        state.state = HALF_OPEN
+        state.probe_started = time.monotonic()
+        return True
+
+    def release(self, endpoint_id) -> None:
+        """探测请求被取消、未得到结果时交还探测名额，下一个请求可立即重新探测。"""
+        state = self._endpoints.get(endpoint_id)
+        if state is not None and state.state == HALF_OPEN:
+            state.probe_started = None
+
+    def order(self, services: list[dict], adaptive: bool = False) -> list[dict]:
+        """过滤掉处于熔断中的端点；adaptive 时按延迟 EWMA 升序重排（尚无样本的端点优先，以便测得延迟）。"""
+        candidates = [s for s in services if self.available(s.get("id"))]
+        skipped = len(services) - len(candidates)
+        if skipped:
+            self._stats["skipped"] += skipped
+        if adaptive:
+            candidates.sort(key=lambda s: self._ewma(s.get("id")))
+        return candidates
+
+    def _ewma(self, endpoint_id) -> float:
+        state = self._endpoints.get(endpoint_id)
+        if state is None or state.latency_ewma is None:
+            return 0.0
+        return state.latency_ewma
+
+    def p95(self, endpoint_id) -> Optional[float]:
+        """端点近期 p95 延迟；样本不足时返回 None。"""
+        state = self._endpoints.get(endpoint_id)
+        if state is None or len(state.latency) < self.min_samples:
+            return None
+        return percentile(sorted(state.latency), 0.95)
+
+    def hedge_delay(self, endpoint_id) -> float:
+        """等待该端点应答多久（秒）后向下一个端点补发请求。"""
+        p95 = self.p95(endpoint_id)
+        delay_ms = self.default_delay_ms if p95 is None else p95
+        return min(self.max_delay_ms, max(self.min_delay_ms, delay_ms)) / 1000
+
+    def record_hedge(self, sent: int, won: bool) -> None:
+        """一次对冲调度结束：sent 为补发的请求数，won 表示由补发的请求给出应答。"""
+        self._stats["hedged_requests"] += 1
+        self._stats["hedges_sent"] += sent
+        if won:
+            self._stats["hedge_wins"] += 1
+
+    # ---------- 观测 ----------
+
+    def snapshot(self) -> dict:
+        """各端点健康状态：熔断状态、失败率、超时数与延迟（毫秒），供管理端展示。"""
+        now = time.monotonic()
+        endpoints = {}
+        for endpoint_id, state in self._endpoints.items():
+            ordered = sorted(state.latency)
+            outcomes = len(state.outcomes)
+            retry_in = 0.0
+            if state.state == OPEN:
+                retry_in = max(0.0, self.open_seconds - (now - state.opened_at))
+            endpoints[str(endpoint_id)] = {
+                "state": state.state,
+                "error_rate": round(sum(state.outcomes) / outcomes, 4) if outcomes else 0.0,
+                "consecutive_failures": state.consecutive_failures,
+                "successes": state.successes,
+                "failures": state.failures,
+                "timeouts": state.timeouts,
+                "retry_in_seconds": round(retry_in, 1),
+                "samples": len(ordered),
+                "latency_ms_ewma": round(state.latency_ewma or 0.0, 2),
+                "latency_ms_p50": round(percentile(ordered, 0.5), 2),
+                "latency_ms_p95": round(percentile(ordered, 0.95), 2),
+                "hedge_delay_ms": round(self.hedge_delay(endpoint_id) * 1000, 2),
+            }
+        return endpoints
+
+    def stats(self) -> dict:
+        """对冲 / 熔断计数与各端点健康状态，供指标端点输出。"""
+        return {**self._stats, "endpoints": self.snapshot()}
@@ -0,0 +1,167 @@
+"""出站 HTTP 连接池：回退服务（Mojang / 其它 Yggdrasil）请求共用的长生命周期会话。
+
+每个请求新建 aiohttp.ClientSession 意味着每次转发 hasJoined / 角色查询都要重新
+做 DNS 解析与 TCP + TLS 握手，玩家登录直接多出上百毫秒。这里在应用 lifespan 中
+创建一个共享会话并在关闭时释放：总连接数与单主机连接数有上限、空闲连接保活复用、
+DNS 结果缓存，超时可配置。
+
+通过 aiohttp TraceConfig 统计在途请求、等待连接槽位的排队深度与等待耗时、
+新建 / 复用连接数，用于判断连接池是否饱和。未启动（测试、脚本）时 session()
+退化为临时会话，行为与逐请求建会话一致。
+"""
+
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+import aiohttp
+
+from utils.metrics import LATENCY_WINDOW, percentile
+
+
+class OutboundHTTPClient:
+    """共享出站 HTTP 会话。
+
+    Args:
+        limit: 连接总数上限
+        limit_per_host: 单个上游主机的连接上限
+        keepalive_seconds: 空闲连接保活时长
+        dns_cache_seconds: DNS 解析结果缓存时长
+        connect_timeout: 建立连接（含排队等待连接槽位）的超时秒数
+        total_timeout: 单个请求的总超时秒数
+    """
+
+    def __init__(
+        self,
+        limit: int = 100,
+        limit_per_host: int = 20,
+        keepalive_seconds: float = 30,
+        dns_cache_seconds: int = 300,
+        connect_timeout: float = 3,
+        total_timeout: float = 5,
+    ):
+        self.limit = max(1, int(limit))
+        self.limit_per_host = max(1, int(limit_per_host))
+        self.keepalive_seconds = float(keepalive_seconds)
+        self.dns_cache_seconds = int(dns_cache_seconds)
+        self.timeout = aiohttp.ClientTimeout(total=float(total_timeout), connect=float(connect_timeout))
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._in_flight = 0
+        self._queued = 0
+        self._wait_ms: deque = deque(maxlen=LATENCY_WINDOW)
+        self._stats = {
+            "requests": 0,
+            "failed": 0,
+            "queued_total": 0,
+            "connections_created": 0,
+            "connections_reused": 0,
+            "dns_cache_hits": 0,
+            "dns_cache_misses": 0,
+        }
+
+    @classmethod
+    def from_config(cls, config) -> "OutboundHTTPClient":
+        """按 yggdrasil.fallback_http.* 配置构建；config 为 None 时使用默认值。"""
+        if config is None:
+            return cls()
+        return cls(
+            limit=config.get("yggdrasil.fallback_http.limit", 100),
+            limit_per_host=config.get("yggdrasil.fallback_http.limit_per_host", 20),
+            keepalive_seconds=config.get("yggdrasil.fallback_http.keepalive_seconds", 30),
+            dns_cache_seconds=config.get("yggdrasil.fallback_http.dns_cache_seconds", 300),
+            connect_timeout=config.get("yggdrasil.fallback_http.connect_timeout", 3),
+            total_timeout=config.get("yggdrasil.fallback_http.total_timeout", 5),
+        )
+
+    @property
+    def started(self) -> bool:
+        return self._session is not None and not self._session.closed
+
+    async def start(self) -> None:
+        """在 lifespan 启动阶段调用（需要运行中的事件循环）。"""
+        if self.started:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_seconds,
+            ttl_dns_cache=self.dns_cache_seconds,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector, timeout=self.timeout, trace_configs=[self._trace_config()]
+        )
+
+    async def close(self) -> None:
+        session, self._session = self._session, None
+        if session is not None:
+            await session.close()
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[aiohttp.ClientSession]:
+        """取得共享会话；未启动时使用临时会话。"""
+        if self.started:
+            yield self._session
+            return
+        async with aiohttp.ClientSession(timeout=self.timeout) as session:
+            yield session
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            self._in_flight += 1
+            self._stats["requests"] += 1
+            ctx.queued_at = None
+
+        async def on_request_done(session, ctx, params):
+            self._in_flight -= 1
+            # 排队期间被取消（如并行策略中落败的请求）不会触发 queued_end
+            if ctx.queued_at is not None:
+                self._queued -= 1
+                ctx.queued_at = None
+
+        async def on_request_exception(session, ctx, params):
+            self._stats["failed"] += 1
+            await on_request_done(session, ctx, params)
+
+        async def on_queued_start(session, ctx, params):
+            self._queued += 1
+            self._stats["queued_total"] += 1
+            ctx.queued_at = time.perf_counter()
+
+        async def on_queued_end(session, ctx, params):
+            if ctx.queued_at is not None:
+                self._queued -= 1
+                self._wait_ms.append((time.perf_counter() - ctx.queued_at) * 1000)
+                ctx.queued_at = None
+
+        def counter(name):
+            async def on_event(session, ctx, params):
+                self._stats[name] += 1
+            return on_event
+
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_done)
+        trace.on_request_exception.append(on_request_exception)
+        trace.on_connection_queued_start.append(on_queued_start)
+        trace.on_connection_queued_end.append(on_queued_end)
+        trace.on_connection_create_end.append(counter("connections_created"))
+        trace.on_connection_reuseconn.append(counter("connections_reused"))
+        trace.on_dns_cache_hit.append(counter("dns_cache_hits"))
+        trace.on_dns_cache_miss.append(counter("dns_cache_misses"))
+        return trace
+
+    def stats(self) -> dict:
+        """连接池指标：在途请求（已发出、未收到响应头）、等待连接槽位的排队深度与耗时分位数（毫秒）、连接新建/复用计数。"""
+        wait_ms = sorted(self._wait_ms)
+        return {
+            **self._stats,
+            "started": self.started,
+            "limit": self.limit,
+            "limit_per_host": self.limit_per_host,
+            "in_flight": self._in_flight,
+            "queued": self._queued,
+            "queue_wait_ms_p50": round(percentile(wait_ms, 0.5), 2),
+            "queue_wait_ms_p95": round(percentile(wait_ms, 0.95), 2),
+        }
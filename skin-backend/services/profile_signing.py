@@ -0,0 +1,258 @@
+"""角色属性签名：textures 属性缓存与脱离事件循环的 RSA 签名服务。
+
+textures 属性值（base64 JSON）只由角色 id、名称、皮肤、披风、模型决定，外加一个
+timestamp。缓存在新鲜期内复用同一份 value 与签名；键除 profile id 外还带上这些字段的
+指纹，即便某条更新路径漏了失效通知，也只会 miss 而不会返回过期内容。
+
+缓存未命中时的签名交给 SigningService：在线程池中执行（cryptography 的 RSA 运算
+会释放 GIL，线程即可并行），同一事件循环轮次内到达的请求合并成小批提交，
+相同载荷的并发请求共享同一次签名，待签数超过上限时快速拒绝。
+"""
+
+import asyncio
+import concurrent.futures
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+from utils.metrics import LATENCY_WINDOW, percentile
+from utils.typing import PlayerProfile
+
+
+class SignedProperty:
+    """一份已序列化的 textures 属性；signature 在首次需要签名时补上。"""
+
+    __slots__ = ("fingerprint", "value", "signature", "created_at")
+
+    def __init__(self, fingerprint: tuple, value: str):
+        self.fingerprint = fingerprint
+        self.value = value
+        self.signature: Optional[str] = None
+        self.created_at = time.monotonic()
+
+
+def profile_fingerprint(profile: PlayerProfile) -> tuple:
+    """决定 textures 属性内容的角色字段。"""
+    return (profile.name, profile.skin_hash, profile.cape_hash, profile.texture_model)
+
+
+class SignedPropertyCache:
+    """按 profile id 缓存 textures 属性的有界 LRU。
+
+    Args:
+        max_entries: 缓存角色数上限
+        ttl_seconds: 新鲜期；属性内嵌的 timestamp 最多比当前时间旧这么久，0 表示不缓存
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self._entries: OrderedDict = OrderedDict()  # {profile_id: SignedProperty}
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    @classmethod
+    def from_config(cls, config) -> "SignedPropertyCache":
+        """按 yggdrasil.signed_cache.* 配置构建；config 为 None 时使用默认值。"""
+        if config is None:
+            return cls()
+        return cls(
+            max_entries=config.get("yggdrasil.signed_cache.max_entries", 10000),
+            ttl_seconds=config.get("yggdrasil.signed_cache.ttl_seconds", 300),
+        )
+
+    def get(self, profile: PlayerProfile) -> Optional[SignedProperty]:
+        """取新鲜且与当前角色字段一致的缓存项，否则返回 None。"""
+        entry = self._entries.get(profile.id)
+        if (
+            entry is None
+            or entry.fingerprint != profile_fingerprint(profile)
+            or time.monotonic() - entry.created_at >= self.ttl_seconds
+        ):
+            self._stats["misses"] += 1
+            return None
+        self._entries.move_to_end(profile.id)
+        self._stats["hits"] += 1
+        return entry
+
+    def put(self, profile: PlayerProfile, value: str) -> SignedProperty:
+        entry = SignedProperty(profile_fingerprint(profile), value)
+        if self.ttl_seconds <= 0:
+            return entry
+        self._entries[profile.id] = entry
+        self._entries.move_to_end(profile.id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self, profile_id: str) -> None:
+        """角色皮肤/披风/模型/名称变更或删除时调用。"""
+        if self._entries.pop(profile_id, None) is not None:
+            self._stats["invalidations"] += 1
+
+    def stats(self) -> dict:
+        """命中计数与当前缓存量，供指标端点输出。"""
+        return {**self._stats, "entries": len(self._entries)}
+
+
+class SigningBusy(Exception):
+    """待签名请求数达到上限，请求应被快速拒绝。"""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Signing service is busy, please retry later")
+        self.retry_after = retry_after
+
+
+def _sign_batch(crypto, payloads: list) -> list:
+    """在工作线程中依次签名，返回 [(signature | exception, 耗时毫秒)]。"""
+    results = []
+    for data in payloads:
+        started = time.perf_counter()
+        try:
+            outcome = crypto.sign_data(data)
+        except Exception as e:
+            outcome = e
+        results.append((outcome, (time.perf_counter() - started) * 1000))
+    return results
+
+
+class SigningService:
+    """异步 RSA 签名服务。
+
+    Args:
+        crypto: CryptoUtils（使用其 sign_data）
+        max_workers: 签名线程数，默认为 CPU 核数
+        max_pending: 待签名（排队 + 执行中）的不同载荷数上限，超过抛 SigningBusy
+        batch_size: 单个线程任务最多签名的载荷数
+        retry_after: 饱和拒绝时建议客户端等待的秒数
+    """
+
+    def __init__(
+        self,
+        crypto,
+        max_workers: Optional[int] = None,
+        max_pending: int = 1024,
+        batch_size: int = 16,
+        retry_after: int = 1,
+    ):
+        self.crypto = crypto
+        self.max_workers = max(1, int(max_workers or os.cpu_count() or 1))
+        self.max_pending = max(1, int(max_pending))
+        self.batch_size = max(1, int(batch_size))
+        self.retry_after = int(retry_after)
+
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._inflight: dict = {}   # {payload: Future}
+        self._queue: list = []      # [(payload, enqueued_at)]，等待本轮 flush
+        self._flush_scheduled = False
+        self._tasks: set = set()    # 持有批任务引用，防止执行中被回收
+        self._signed = 0
+        self._coalesced = 0
+        self._rejected = 0
+        self._failed = 0
+        self._batches = 0
+        self._wait_ms: deque = deque(maxlen=LATENCY_WINDOW)
+        self._sign_ms: deque = deque(maxlen=LATENCY_WINDOW)
+
+    @classmethod
+    def from_config(cls, crypto, config) -> "SigningService":
+        """按 yggdrasil.signing.* 配置构建；config 为 None 时使用默认值。"""
+        if config is None:
+            return cls(crypto)
+        return cls(
+            crypto,
+            max_workers=config.get("yggdrasil.signing.max_workers"),
+            max_pending=config.get("yggdrasil.signing.max_pending", 1024),
+            batch_size=config.get("yggdrasil.signing.batch_size", 16),
+            retry_after=config.get("yggdrasil.signing.retry_after_seconds", 1),
+        )
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="signer"
+            )
+        return self._executor
+
+    async def sign(self, data: str) -> str:
+        """签名 data（base64 结果）。
+
+        Raises:
+            SigningBusy: 待签名数已达上限
+        """
+        future = self._inflight.get(data)
+        if future is not None:
+            self._coalesced += 1
+            return await asyncio.shield(future)
+        if len(self._inflight) >= self.max_pending:
+            self._rejected += 1
+            raise SigningBusy(self.retry_after)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inflight[data] = future
+        self._queue.append((data, time.perf_counter()))
+        if not self._flush_scheduled:
+            # 本轮事件循环内到达的其它请求会被并入同一次 flush
+            self._flush_scheduled = True
+            loop.call_soon(self._flush)
+        return await asyncio.shield(future)
+
+    def _flush(self) -> None:
+        self._flush_scheduled = False
+        queued, self._queue = self._queue, []
+        if not queued:
+            return
+        # 批大小兼顾并行度：待签数少时每个线程分一小批，而不是一个线程包揽全部
+        size = max(1, min(self.batch_size, math.ceil(len(queued) / self.max_workers)))
+        for i in range(0, len(queued), size):
+            task = asyncio.ensure_future(self._run_batch(queued[i:i + size]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: list) -> None:
+        self._batches += 1
+        payloads = [data for data, _ in batch]
+        loop = asyncio.get_running_loop()
+        submitted_at = time.perf_counter()
+        try:
+            results = await loop.run_in_executor(self._get_executor(), _sign_batch, self.crypto, payloads)
+        except BaseException as e:
+            results = [(e, 0.0)] * len(payloads)
+        for (data, enqueued_at), (outcome, sign_ms) in zip(batch, results):
+            self._wait_ms.append((submitted_at - enqueued_at) * 1000)
+            future = self._inflight.pop(data, None)
+            if future is None or future.done():
+                continue
+            if isinstance(outcome, BaseException):
+                self._failed += 1
+                future.set_exception(outcome)
+            else:
+                self._signed += 1
+                self._sign_ms.append(sign_ms)
+                future.set_result(outcome)
+
+    def stats(self) -> dict:
+        """签名指标：待签深度、累计计数与最近签名的排队/执行耗时分位数（毫秒）。"""
+        wait_ms = sorted(self._wait_ms)
+        sign_ms = sorted(self._sign_ms)
+        return {
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "pending": len(self._inflight),
+            "signed": self._signed,
+            "coalesced": self._coalesced,
+            "rejected": self._rejected,
+            "failed": self._failed,
+            "batches": self._batches,
+            "wait_ms_p50": round(percentile(wait_ms, 0.5), 2),
+            "wait_ms_p95": round(percentile(wait_ms, 0.95), 2),
+            "sign_ms_p50": round(percentile(sign_ms, 0.5), 2),
+            "sign_ms_p95": round(percentile(sign_ms, 0.95), 2),
+        }
+
+    def shutdown(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
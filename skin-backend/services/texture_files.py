@@ -0,0 +1,173 @@
+"""材质静态文件缓存：供后端内置的 /static/textures/ 端点使用。
+
+材质与预览图按内容寻址（文件名即像素 hash），内容永不变化，非常适合常驻内存：
+小文件的字节直接缓存，命中时不触碰磁盘；超过单文件上限的只缓存路径与 stat 结果，
+由 FileResponse 发送（ASGI 服务器支持 pathsend 扩展时为零拷贝）。
+
+文件可能被 GC 删除、被迁移脚本从平铺布局移到分片布局、或被重压缩脚本原地替换，
+所以缓存项每隔 revalidate_seconds 重新 stat 一次，变化则重新加载或淘汰。
+"""
+
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from services.texture_storage import _preview_path, find_texture_file
+from utils.texture_preview import PREVIEW_KINDS
+
+
+# <hash>.png 或 <hash>.<kind>.png
+_STATIC_NAME_RE = re.compile(r"^([0-9a-f]{64})(?:\.([a-z]+))?\.png$")
+_PREVIEW_KIND_NAMES = {kind for kinds in PREVIEW_KINDS.values() for kind in kinds}
+
+
+class CachedTextureFile:
+    """一个已解析的材质文件；data 为 None 表示文件过大、只缓存元数据。"""
+
+    __slots__ = ("path", "stat", "etag", "data", "checked_at")
+
+    def __init__(self, path: str, stat: os.stat_result, etag: str, data: Optional[bytes]):
+        self.path = path
+        self.stat = stat
+        self.etag = etag
+        self.data = data
+        self.checked_at = time.monotonic()
+
+
+def _resolve_path(textures_dir: str, texture_hash: str, kind: Optional[str]) -> Optional[str]:
+    if kind is None:
+        return find_texture_file(textures_dir, texture_hash)
+    path = _preview_path(textures_dir, texture_hash, kind)
+    return path if os.path.exists(path) else None
+
+
+def _load(textures_dir: str, texture_hash: str, kind: Optional[str], max_file_bytes: int):
+    """解析并读取文件，返回 (path, stat, data)；不存在返回 None。"""
+    path = _resolve_path(textures_dir, texture_hash, kind)
+    if path is None:
+        return None
+    try:
+        st = os.stat(path)
+        data = None
+        if st.st_size <= max_file_bytes:
+            with open(path, "rb") as f:
+                data = f.read()
+        return path, st, data
+    except FileNotFoundError:
+        return None
+
+
+class TextureFileCache:
+    """按文件名缓存材质文件内容与 stat 的 LRU。
+
+    Args:
+        textures_dir: 材质目录
+        max_entries: 缓存项数上限
+        max_bytes: 缓存的文件内容总字节上限
+        max_file_bytes: 单文件内容缓存上限，超过只缓存元数据
+        revalidate_seconds: 缓存项重新 stat 的间隔
+    """
+
+    def __init__(
+        self,
+        textures_dir: str,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_file_bytes: int = 256 * 1024,
+        revalidate_seconds: float = 60,
+    ):
+        self.textures_dir = textures_dir
+        self.max_entries = max(1, int(max_entries))
+        self.max_bytes = max(0, int(max_bytes))
+        self.max_file_bytes = max(0, int(max_file_bytes))
+        self.revalidate_seconds = float(revalidate_seconds)
+        self._entries: OrderedDict = OrderedDict()  # {name: CachedTextureFile}
+        self._cached_bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "not_found": 0, "revalidated": 0}
+
+    @classmethod
+    def from_config(cls, textures_dir: str, config) -> "TextureFileCache":
+        """按 textures.serve.* 配置构建。"""
+        return cls(
+            textures_dir,
+            max_entries=config.get("textures.serve.cache_entries", 10000),
+            max_bytes=int(float(config.get("textures.serve.cache_mb", 64)) * 1024 * 1024),
+            revalidate_seconds=config.get("textures.serve.revalidate_seconds", 60),
+        )
+
+    @staticmethod
+    def parse_name(name: str) -> Optional[tuple[str, Optional[str]]]:
+        """解析静态文件名为 (texture_hash, kind)；kind 为 None 表示材质本身。不合法返回 None。"""
+        m = _STATIC_NAME_RE.match(name)
+        if m is None:
+            return None
+        texture_hash, kind = m.group(1), m.group(2)
+        if kind is not None and kind not in _PREVIEW_KIND_NAMES:
+            return None
+        return texture_hash, kind
+
+    async def get(self, name: str) -> Optional[CachedTextureFile]:
+        """按静态文件名取缓存项，未命中时从磁盘加载；文件不存在返回 None。"""
+        parsed = self.parse_name(name)
+        if parsed is None:
+            return None
+
+        entry = self._entries.get(name)
+        if entry is not None:
+            if time.monotonic() - entry.checked_at < self.revalidate_seconds:
+                self._entries.move_to_end(name)
+                self._stats["hits"] += 1
+                return entry
+            if await asyncio.to_thread(self._still_valid, entry):
+                entry.checked_at = time.monotonic()
+                self._entries.move_to_end(name)
+                self._stats["revalidated"] += 1
+                return entry
+            self._evict(name)
+
+        self._stats["misses"] += 1
+        loaded = await asyncio.to_thread(_load, self.textures_dir, *parsed, self.max_file_bytes)
+        if loaded is None:
+            self._stats["not_found"] += 1
+            return None
+        path, st, data = loaded
+        etag = f'"{parsed[0]}"' if parsed[1] is None else f'"{parsed[0]}.{parsed[1]}"'
+        entry = CachedTextureFile(path, st, etag, data)
+        self._store(name, entry)
+        return entry
+
+    @staticmethod
+    def _still_valid(entry: CachedTextureFile) -> bool:
+        try:
+            st = os.stat(entry.path)
+        except FileNotFoundError:
+            return False
+        return st.st_size == entry.stat.st_size and st.st_mtime_ns == entry.stat.st_mtime_ns
+
+    def _store(self, name: str, entry: CachedTextureFile) -> None:
+        self._evict(name)
+        if entry.data is not None and len(entry.data) > self.max_bytes:
+            entry.data = None
+        self._entries[name] = entry
+        if entry.data is not None:
+            self._cached_bytes += len(entry.data)
+        while len(self._entries) > self.max_entries or self._cached_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            if evicted.data is not None:
+                self._cached_bytes -= len(evicted.data)
+
+    def _evict(self, name: str) -> None:
+        entry = self._entries.pop(name, None)
+        if entry is not None and entry.data is not None:
+            self._cached_bytes -= len(entry.data)
+
+    def stats(self) -> dict:
+        """命中/加载计数与当前占用，供指标端点输出。"""
+        return {
+            **self._stats,
+            "entries": len(self._entries),
+            "cached_bytes": self._cached_bytes,
+        }
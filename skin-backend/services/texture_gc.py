@@ -0,0 +1,235 @@
+"""材质文件垃圾回收：标记-清除，回收数据库中已无任何引用的材质文件。
+
+删除材质只会删数据库行（delete_texture / delete_from_library），文件留在磁盘上。
+GC 流程：
+1. 扫描：遍历材质目录（分片与旧平铺布局），mtime 早于宽限期的文件成为候选；
+2. 标记：以服务端游标流式读取所有被引用的 hash，从候选中剔除；
+3. 清除：剩余孤儿分批删除。删除前对每批做一次数据库二次确认并重新检查 mtime，
+   覆盖"标记之后又被引用/复用"的竞争窗口；批间休眠以限制 I/O；
+4. 清理指向已无引用材质的上传指纹行（texture_fingerprints）。
+
+宽限期同时保护正在上传中的文件：文件先落盘、后写库，新文件 mtime 必然在宽限期内。
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+from utils.texture_preview import PREVIEW_KINDS
+
+
+logger = logging.getLogger(__name__)
+
+# dry-run 报告中列出的孤儿 hash 数量上限
+REPORT_SAMPLE_SIZE = 100
+
+PREVIEW_KIND_NAMES = {kind for kinds in PREVIEW_KINDS.values() for kind in kinds}
+
+
+def _is_hex(name: str) -> bool:
+    return bool(name) and all(c in "0123456789abcdef" for c in name)
+
+
+class ScanResult:
+    """一次目录扫描的结果。"""
+
+    def __init__(self):
+        self.scanned = 0
+        self.present: set = set()        # 目录中存在的全部材质 hash
+        self.candidates: dict = {}       # {hash: (path, size)}，mtime 早于 cutoff 的材质
+        self.previews: dict = {}         # {hash: [path, ...]}，mtime 早于 cutoff 的预览图
+        self.stale_temps: list = []      # 写入中途崩溃遗留的临时文件
+
+
+def scan_texture_files(textures_dir: str, cutoff: float) -> ScanResult:
+    """扫描材质目录（分片与旧平铺布局）。
+
+    只有 mtime 早于 cutoff 的文件进入候选；非材质文件（不符合命名规则）一律忽略。
+    预览图（<hash>.<kind>.png）随其材质一起回收，不单独计入候选。
+    """
+    result = ScanResult()
+
+    def _visit(entry: os.DirEntry):
+        name = entry.name
+        st = entry.stat(follow_symlinks=False)
+        old = st.st_mtime < cutoff
+        if name.startswith(".") and name.endswith(".tmp"):
+            if old:
+                result.stale_temps.append(entry.path)
+            return
+        if not name.endswith(".png"):
+            return
+        stem = name[:-4]
+        if "." in stem:
+            texture_hash, kind = stem.split(".", 1)
+            if _is_hex(texture_hash) and kind in PREVIEW_KIND_NAMES and old:
+                result.previews.setdefault(texture_hash, []).append(entry.path)
+            return
+        if not _is_hex(stem):
+            return
+        result.scanned += 1
+        result.present.add(stem)
+        if old:
+            result.candidates[stem] = (entry.path, st.st_size)
+
+    def _walk(path: str, depth: int):
+        try:
+            it = os.scandir(path)
+        except FileNotFoundError:
+            return
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    # 分片目录为两级两位十六进制
+                    if depth < 2 and len(entry.name) == 2 and _is_hex(entry.name):
+                        _walk(entry.path, depth + 1)
+                elif entry.is_file(follow_symlinks=False):
+                    _visit(entry)
+
+    _walk(textures_dir, 0)
+    return result
+
+
+def _remove_if_still_old(path: str, cutoff: float) -> int:
+    """文件仍早于 cutoff 才删除（期间被复用会刷新 mtime），返回回收的字节数。"""
+    try:
+        st = os.stat(path)
+        if st.st_mtime >= cutoff:
+            return -1
+        os.remove(path)
+        return st.st_size
+    except FileNotFoundError:
+        return -1
+
+
+def _remove_batch(paths: list, cutoff: float) -> tuple[int, int]:
+    """删除一批文件，返回 (删除数, 回收字节数)。"""
+    deleted = 0
+    reclaimed = 0
+    for path in paths:
+        freed = _remove_if_still_old(path, cutoff)
+        if freed >= 0:
+            deleted += 1
+            reclaimed += freed
+    return deleted, reclaimed
+
+
+class TextureGarbageCollector:
+    """材质孤儿文件回收器。
+
+    Args:
+        db: Database（使用 db.texture 的 iter_live_hashes / filter_live_hashes / prune_fingerprints）
+        texture_storage: TextureStorage（取其 textures_dir）
+        grace_seconds: 宽限期，mtime 在此之内的文件不回收
+        batch_size: 每批删除的文件数
+        pause_seconds: 批间休眠
+    """
+
+    def __init__(
+        self,
+        db,
+        texture_storage,
+        grace_seconds: float = 86400,
+        batch_size: int = 200,
+        pause_seconds: float = 0.2,
+    ):
+        self.db = db
+        self.texture_storage = texture_storage
+        self.grace_seconds = grace_seconds
+        self.batch_size = max(1, int(batch_size))
+        self.pause_seconds = max(0.0, float(pause_seconds))
+        self.last_report: Optional[dict] = None
+        self._lock = asyncio.Lock()
+
+    @classmethod
+    def from_config(cls, db, texture_storage, config) -> "TextureGarbageCollector":
+        """按 textures.gc.* 配置构建。"""
+        return cls(
+            db,
+            texture_storage,
+            grace_seconds=float(config.get("textures.gc.grace_hours", 24)) * 3600,
+            batch_size=config.get("textures.gc.batch_size", 200),
+            pause_seconds=config.get("textures.gc.pause_seconds", 0.2),
+        )
+
+    async def run(self, dry_run: bool = False) -> dict:
+        """执行一轮 GC 并返回报告；同一时刻只允许一轮在跑。"""
+        async with self._lock:
+            report = await self._run(dry_run)
+        self.last_report = report
+        return report
+
+    async def _run(self, dry_run: bool) -> dict:
+        started = time.time()
+        cutoff = started - self.grace_seconds
+
+        scan = await asyncio.to_thread(
+            scan_texture_files, self.texture_storage.textures_dir, cutoff
+        )
+        candidates = scan.candidates
+        candidate_count = len(candidates)
+        # 材质文件已不存在的预览图（如材质被回滚删除）也按引用判断是否回收
+        dangling_previews = {h: paths for h, paths in scan.previews.items() if h not in scan.present}
+
+        live_count = 0
+        async for texture_hash in self.db.texture.iter_live_hashes(self.batch_size * 5):
+            live_count += 1
+            candidates.pop(texture_hash, None)
+            dangling_previews.pop(texture_hash, None)
+
+        orphans = sorted(candidates)
+        report = {
+            "dry_run": dry_run,
+            "scanned_files": scan.scanned,
+            "candidates": candidate_count,
+            "live_hashes": live_count,
+            "orphans": len(orphans),
+            "orphan_bytes": sum(candidates[h][1] for h in orphans),
+            "dangling_previews": sum(len(p) for p in dangling_previews.values()),
+            "stale_temp_files": len(scan.stale_temps),
+            "deleted": 0,
+            "reclaimed_bytes": 0,
+            "pruned_fingerprints": 0,
+            "sample": orphans[:REPORT_SAMPLE_SIZE],
+        }
+
+        if not dry_run:
+            await asyncio.to_thread(_remove_batch, scan.stale_temps, cutoff)
+            dangling = sorted(dangling_previews)
+            still_live = await self.db.texture.filter_live_hashes(dangling)
+            await asyncio.to_thread(
+                _remove_batch,
+                [p for h in dangling if h not in still_live for p in dangling_previews[h]],
+                cutoff,
+            )
+            for i in range(0, len(orphans), self.batch_size):
+                batch = orphans[i:i + self.batch_size]
+                # 二次确认：标记阶段之后新增的引用不能被删
+                still_live = await self.db.texture.filter_live_hashes(batch)
+                paths = [candidates[h][0] for h in batch if h not in still_live]
+                deleted, reclaimed = await asyncio.to_thread(_remove_batch, paths, cutoff)
+                report["deleted"] += deleted
+                report["reclaimed_bytes"] += reclaimed
+                # 预览图随材质回收（不计入 deleted）
+                previews = [p for h in batch if h not in still_live for p in scan.previews.get(h, ())]
+                await asyncio.to_thread(_remove_batch, previews, cutoff)
+                if i + self.batch_size < len(orphans):
+                    await asyncio.sleep(self.pause_seconds)
+            # 指向已无引用材质的上传指纹一并清除
+            report["pruned_fingerprints"] = await self.db.texture.prune_fingerprints(int(cutoff * 1000))
+
+        report["duration_ms"] = round((time.time() - started) * 1000, 1)
+        report["finished_at"] = int(time.time() * 1000)
+        logger.info(
+            "texture gc finished: dry_run=%s orphans=%d deleted=%d reclaimed=%d bytes",
+            dry_run, report["orphans"], report["deleted"], report["reclaimed_bytes"],
+        )
+        return report
+
+    def stats(self) -> dict:
+        """最近一轮 GC 报告（不含 sample），供指标端点输出。"""
+        if self.last_report is None:
+            return {}
+        return {k: v for k, v in self.last_report.items() if k != "sample"}
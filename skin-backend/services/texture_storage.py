@@ -4,13 +4,24 @@
 """
 
 import asyncio
+import concurrent.futures
+import hashlib
+import logging
 import os
+import tempfile
+from typing import Optional
 
 from utils.image_utils import (
     validate_texture_dimensions,
     compute_texture_hash_from_image,
-    normalize_png,
+    decode_png,
+    encode_png,
 )
+from utils.texture_preview import PREVIEW_KINDS, render_preview
+from services.texture_workers import TextureWorkerBusy, TextureWorkerPool
+
+
+logger = logging.getLogger(__name__)
 
 
 # max_texture_size 设置缺失时的兜底（KB）。与 settings_backend 默认值保持一致。
@@ -44,80 +55,379 @@ async def assert_texture_size(db, file_bytes: bytes) -> None:
         raise ValueError("Texture file too large.")
 
 
+def upload_fingerprint(file_bytes: bytes) -> str:
+    """原始上传字节的快速指纹（BLAKE2b-160），用于识别逐字节相同的重复上传。
+
+    与规范材质 hash 不同：同一像素的不同 PNG 编码指纹不同，只是缓存键。
+    """
+    return hashlib.blake2b(file_bytes, digest_size=20).hexdigest()
+
+
+# 新材质的写入布局。flat：<dir>/<hash>.png（升级前的布局，nginx 无需改动）；
+# sharded：<dir>/ab/cd/<hash>.png，需先给 nginx 加上分片 try_files 规则并运行
+# migrate_textures_sharded.py。读取始终兼容两种布局。
+TEXTURE_LAYOUTS = ("flat", "sharded")
+
+
+def texture_relpath(texture_hash: str) -> str:
+    """材质在存储目录内的分片相对路径：ab/cd/<hash>.png（取 hash 前两字节做两级目录）。
+
+    平铺目录在数十万文件时目录操作与 nginx 查找都会变慢；两级 256 分片把每个
+    目录的文件数压到百量级。对外 URL 不变（/static/textures/<hash>.png），
+    由 nginx 按同样规则改写到分片路径。
+    """
+    return os.path.join(texture_hash[0:2], texture_hash[2:4], f"{texture_hash}.png")
+
+
+def _texture_path(textures_dir: str, texture_hash: str) -> str:
+    return os.path.join(textures_dir, texture_relpath(texture_hash))
+
+
+def _legacy_texture_path(textures_dir: str, texture_hash: str) -> str:
+    """迁移前的平铺布局 <dir>/<hash>.png，过渡期内仍可读。"""
+    return os.path.join(textures_dir, f"{texture_hash}.png")
+
+
+def find_texture_file(textures_dir: str, texture_hash: str) -> Optional[str]:
+    """返回材质文件的实际路径：优先分片布局，其次旧平铺布局；都不存在返回 None。"""
+    for path in (
+        _texture_path(textures_dir, texture_hash),
+        _legacy_texture_path(textures_dir, texture_hash),
+    ):
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def preview_relpath(texture_hash: str, kind: str) -> str:
+    """预览图与材质同分片目录：ab/cd/<hash>.<kind>.png（kind 为 head/body/cape）。"""
+    return os.path.join(texture_hash[0:2], texture_hash[2:4], f"{texture_hash}.{kind}.png")
+
+
+def _preview_path(textures_dir: str, texture_hash: str, kind: str) -> str:
+    return os.path.join(textures_dir, preview_relpath(texture_hash, kind))
+
+
+def touch_texture_file(path: str) -> None:
+    """刷新 mtime，标记文件刚被复用。
+
+    GC 只回收 mtime 早于宽限期的孤儿文件；复用已有文件的上传在写库前就刷新
+    mtime，避免 GC 在"复用 → 写库"的窗口里把即将被引用的文件删掉。
+    """
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def _write_new_file(file_path: str, data: bytes) -> bool:
+    """原子地新建文件：先写同目录临时文件，再链接到最终路径。
+
+    返回 True 表示本次新建；目标已存在（并发上传了同一材质）返回 False。
+    读者永远只会看到完整文件，不会读到写了一半的 PNG。
+    """
+    directory = os.path.dirname(file_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        try:
+            # link 不覆盖已存在的目标，天然具备 O_EXCL 语义
+            os.link(tmp_path, file_path)
+        except FileExistsError:
+            return False
+        except OSError:
+            # 不支持硬链接的文件系统：退化为 rename（内容寻址，覆盖也是同一内容）
+            if os.path.exists(file_path):
+                return False
+            os.replace(tmp_path, file_path)
+        return True
+    finally:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+def write_previews(textures_dir: str, texture_hash: str, texture_type: str, img) -> int:
+    """为已解码的材质生成缺失的预览图，返回本次新生成的数量。
+
+    预览图内容只由材质像素决定，与材质一样按 hash 寻址，已存在即跳过。
+    """
+    written = 0
+    for kind in PREVIEW_KINDS.get(texture_type.lower(), ()):
+        path = _preview_path(textures_dir, texture_hash, kind)
+        if os.path.exists(path):
+            continue
+        if _write_new_file(path, encode_png(render_preview(img, kind))):
+            written += 1
+    return written
+
+
+def _write_previews_safely(textures_dir: str, texture_hash: str, texture_type: str, img) -> None:
+    # 预览图只是加速手段：生成失败不影响材质入库，缺失的预览可按需补生成
+    try:
+        write_previews(textures_dir, texture_hash, texture_type, img)
+    except Exception:
+        logger.warning("failed to render previews for %s", texture_hash, exc_info=True)
+
+
+def ensure_preview(textures_dir: str, texture_hash: str, kind: str) -> Optional[str]:
+    """返回预览图路径，缺失时从材质文件补生成；材质不存在或与预览类型不符返回 None。"""
+    path = _preview_path(textures_dir, texture_hash, kind)
+    if os.path.exists(path):
+        return path
+    texture_type = next((t for t, kinds in PREVIEW_KINDS.items() if kind in kinds), None)
+    source = find_texture_file(textures_dir, texture_hash)
+    if texture_type is None or source is None:
+        return None
+    with open(source, "rb") as f:
+        img = decode_png(f.read())
+    if not validate_texture_dimensions(img, texture_type == "cape"):
+        return None
+    _write_new_file(path, encode_png(render_preview(img, kind)))
+    return path
+
+
+def ingest_texture(
+    textures_dir: str, file_bytes: bytes, texture_type: str, sharded: bool = False
+) -> tuple[str, bool]:
+    """材质入库流水线，返回 (texture_hash, created)。
+
+    只解码一次：解码 → 校验尺寸 → 计算 hash → 检查是否已落盘。
+    同 hash 文件已存在（分片或旧平铺布局）时直接返回 (hash, False)，
+    跳过 PNG 编码与写盘；否则编码并原子写入 sharded 指定的布局（默认平铺）。
+    复用同一份已解码图像顺带生成缺失的预览图。
+
+    模块级函数且只接收可 pickle 的参数，以便提交到进程池执行。
+    """
+    img = decode_png(file_bytes)
+
+    is_cape = texture_type.lower() == "cape"
+    if not validate_texture_dimensions(img, is_cape):
+        raise ValueError("Invalid texture dimensions")
+
+    texture_hash = compute_texture_hash_from_image(img)
+
+    # 快路径：重复上传同一材质时不必编码
+    existing = find_texture_file(textures_dir, texture_hash)
+    if existing is not None:
+        touch_texture_file(existing)
+        # 同一像素可能先以另一种类型上传过（如 64x32 既是旧皮肤也是披风），补齐本类型的预览
+        _write_previews_safely(textures_dir, texture_hash, texture_type, img)
+        return texture_hash, False
+
+    target = _texture_path if sharded else _legacy_texture_path
+    created = _write_new_file(target(textures_dir, texture_hash), encode_png(img))
+    _write_previews_safely(textures_dir, texture_hash, texture_type, img)
+    return texture_hash, created
+
+
+def iter_legacy_textures(textures_dir: str):
+    """遍历存储目录顶层的旧平铺材质文件，产出 texture_hash。"""
+    with os.scandir(textures_dir) as it:
+        for entry in it:
+            name = entry.name
+            if name.endswith(".png") and not name.startswith(".") and entry.is_file():
+                yield name[:-4]
+
+
+def shard_legacy_texture(textures_dir: str, texture_hash: str) -> bool:
+    """把一个旧平铺文件迁到分片路径，返回是否实际迁移。
+
+    先硬链接到新路径再删除旧路径：迁移过程中文件始终至少在一处可读，
+    在线迁移期间 nginx 的 try_files（分片 → 平铺）不会出现 404 空窗。
+    """
+    legacy = _legacy_texture_path(textures_dir, texture_hash)
+    target = _texture_path(textures_dir, texture_hash)
+    if not os.path.exists(legacy):
+        return False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.link(legacy, target)
+    except FileExistsError:
+        pass
+    except OSError:
+        os.replace(legacy, target)
+        return True
+    os.remove(legacy)
+    return True
+
+
+def recompress_texture(textures_dir: str, texture_hash: str, dry_run: bool = False) -> tuple[int, int]:
+    """以最高压缩率重新编码一个材质文件，返回 (原大小, 新大小)。
+
+    替换前校验不变量：原文件与新编码解码后的像素 hash 都必须等于文件名中的 hash，
+    否则抛 ValueError 且不改动文件。新编码不更小时保留原文件（返回的两个大小相等）。
+    替换通过同目录临时文件 + os.replace 原子完成，并保留 mtime，不影响 GC 宽限期判断。
+    """
+    path = find_texture_file(textures_dir, texture_hash)
+    if path is None:
+        raise FileNotFoundError(texture_hash)
+    with open(path, "rb") as f:
+        original = f.read()
+    img = decode_png(original)
+    if compute_texture_hash_from_image(img) != texture_hash:
+        raise ValueError(f"Texture {texture_hash} does not match its pixel hash")
+
+    candidate = encode_png(img, optimize=True)
+    if len(candidate) >= len(original):
+        return len(original), len(original)
+    if compute_texture_hash_from_image(decode_png(candidate)) != texture_hash:
+        raise ValueError(f"Recompressed texture {texture_hash} changed pixel hash")
+    if dry_run:
+        return len(original), len(candidate)
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(candidate)
+        # 期间可能有重复上传刷新了 mtime，以替换前的最新值为准
+        st = os.stat(path)
+        os.utime(tmp_path, (st.st_atime, st.st_mtime))
+        os.replace(tmp_path, path)
+    finally:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+    return len(original), len(candidate)
+
+
 class TextureStorage:
-    def __init__(self, textures_dir: str):
+    def __init__(
+        self,
+        textures_dir: str,
+        workers: Optional[TextureWorkerPool] = None,
+        fingerprints=None,
+        layout: str = "flat",
+    ):
+        if layout not in TEXTURE_LAYOUTS:
+            raise ValueError(f"Unknown texture layout: {layout}")
         self.textures_dir = textures_dir
+        # 新材质写入分片布局还是平铺布局，见 TEXTURE_LAYOUTS
+        self.sharded = layout == "sharded"
+        # 材质工作池；为 None 时异步路径退化为 asyncio.to_thread（脚本/单测场景）
+        self.workers = workers
+        # 上传指纹索引（db.texture，提供 lookup/record/forget_fingerprint）；为 None 时不启用
+        self.fingerprints = fingerprints
         os.makedirs(self.textures_dir, exist_ok=True)
 
+    def _file_path(self, texture_hash: str) -> str:
+        return _texture_path(self.textures_dir, texture_hash)
+
     def process_and_save(self, file_bytes: bytes, texture_type: str) -> str:
         """规范化图像、校验尺寸、计算 hash、落盘，返回 texture_hash。
 
         校验失败（非 PNG / 尺寸非法）抛 ValueError。
 
-        注意：这是 CPU 密集的同步函数（解码 + 逐像素哈希）。在异步请求处理中
+        注意：这是 CPU 密集的同步函数（解码 + 哈希 + 编码）。在异步请求处理中
         请改用 process_and_save_async，避免阻塞事件循环。
         """
-        normalized_bytes, img = normalize_png(file_bytes)
-
-        is_cape = texture_type.lower() == "cape"
-        if not validate_texture_dimensions(img, is_cape):
-            raise ValueError("Invalid texture dimensions")
+        texture_hash, _ = self.process_and_save_tracked(file_bytes, texture_type)
+        return texture_hash
 
-        texture_hash = compute_texture_hash_from_image(img)
+    def process_and_save_tracked(self, file_bytes: bytes, texture_type: str) -> tuple[str, bool]:
+        """同 process_and_save，但额外返回 created（True 表示本次新建文件）。
 
-        file_path = os.path.join(self.textures_dir, f"{texture_hash}.png")
-        with open(file_path, "wb") as f:
-            f.write(normalized_bytes)
+        created 为 False 表示同 hash 文件已存在（复用）；DB 写入失败时调用方
+        可据此决定是否物理删除本次刚写入的文件。流程见 ingest_texture。
+        """
+        return ingest_texture(self.textures_dir, file_bytes, texture_type, self.sharded)
 
+    async def process_and_save_async(self, file_bytes: bytes, texture_type: str) -> str:
+        """process_and_save 的异步包装：在材质工作池中执行，避免阻塞事件循环。"""
+        texture_hash, _ = await self.process_and_save_async_tracked(file_bytes, texture_type)
         return texture_hash
 
-    def process_and_save_tracked(self, file_bytes: bytes, texture_type: str) -> tuple[str, bool]:
-        """同 process_and_save，但额外返回 created（True 表示本次新建文件）。
+    async def process_and_save_async_tracked(self, file_bytes: bytes, texture_type: str) -> tuple[str, bool]:
+        """process_and_save_tracked 的异步包装，返回 (hash, created)。
+
+        任务提交到材质工作池（未配置时用 asyncio.to_thread）。工作池饱和时
+        TextureWorkerBusy 原样上抛；工作进程内存超限或超时归一化为 ValueError。
 
-        当文件已经存在时（同 hash 已落盘），created 为 False；DB 写入失败时调用方
-        可据此决定是否物理删除本次刚写入的文件。
+        created 如实反映本次是否新建了文件，回滚路径只需在 created 为 True 时
+        考虑删除文件，复用已有文件时不会产生多余的 exists 查询与删除。
+
+        配置了指纹索引时，逐字节相同的重复上传直接命中指纹 → 材质 hash，
+        完全跳过图像解码；命中但文件已不存在时走完整流程重新落盘。
         """
-        normalized_bytes, img = normalize_png(file_bytes)
+        texture_type = texture_type.lower()
+        fingerprint = None
+        if self.fingerprints is not None:
+            fingerprint = upload_fingerprint(file_bytes)
+            try:
+                texture_hash = await self.fingerprints.lookup_fingerprint(fingerprint, texture_type)
+            except Exception:
+                logger.warning("texture fingerprint lookup failed", exc_info=True)
+                texture_hash = None
+            if texture_hash is not None:
+                existing = find_texture_file(self.textures_dir, texture_hash)
+                if existing is not None:
+                    touch_texture_file(existing)
+                    return texture_hash, False
+                self.fingerprints.forget_fingerprint(fingerprint, texture_type)
 
-        is_cape = texture_type.lower() == "cape"
-        if not validate_texture_dimensions(img, is_cape):
-            raise ValueError("Invalid texture dimensions")
+        result = await self._ingest_async(file_bytes, texture_type)
 
-        texture_hash = compute_texture_hash_from_image(img)
+        if fingerprint is not None:
+            try:
+                await self.fingerprints.record_fingerprint(fingerprint, texture_type, result[0])
+            except Exception:
+                # 指纹只是加速手段，记录失败不影响本次上传
+                logger.warning("texture fingerprint record failed", exc_info=True)
+        return result
 
-        file_path = os.path.join(self.textures_dir, f"{texture_hash}.png")
+    async def _ingest_async(self, file_bytes: bytes, texture_type: str) -> tuple[str, bool]:
         try:
-            fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
-        except FileExistsError:
-            return texture_hash, False
-        try:
-            with os.fdopen(fd, "wb") as f:
-                f.write(normalized_bytes)
-        except Exception:
-            try:
-                os.remove(file_path)
-            except FileNotFoundError:
-                pass
-            raise
-        return texture_hash, True
+            if self.workers is None:
+                return await asyncio.to_thread(
+                    ingest_texture, self.textures_dir, file_bytes, texture_type, self.sharded
+                )
+            return await self.workers.submit(
+                ingest_texture, self.textures_dir, file_bytes, texture_type, self.sharded
+            )
+        except MemoryError:
+            raise ValueError("Texture is too large to process")
+        except TimeoutError:
+            raise ValueError("Texture processing timed out")
+        except concurrent.futures.BrokenExecutor:
+            # 工作进程处理该图时崩溃（通常是触发了内存上限）
+            raise ValueError("Texture could not be processed")
 
-    async def process_and_save_async(self, file_bytes: bytes, texture_type: str) -> str:
-        """process_and_save 的异步包装：在线程池中执行，避免阻塞事件循环。"""
-        return await asyncio.to_thread(self.process_and_save, file_bytes, texture_type)
+    def find_file(self, texture_hash: str) -> Optional[str]:
+        """材质文件的实际路径（兼容旧平铺布局），不存在返回 None。"""
+        return find_texture_file(self.textures_dir, texture_hash)
 
-    async def process_and_save_async_tracked(self, file_bytes: bytes, texture_type: str) -> tuple[str, bool]:
-        """优先复用 process_and_save_async（保留既有 mock 兼容），返回 (hash, created)。
+    async def ensure_preview_async(self, texture_hash: str, kind: str) -> Optional[str]:
+        """ensure_preview 的异步包装：补生成预览需要解码，走材质工作池。
 
-        同步路径若额外能区分新建/复用则用 process_and_save_tracked。直接复用
-        process_and_save_async 时无法判别，按"已新建"保守处理（最坏情况是 DB 失败
-        回滚时多删一次本就该被复用的文件，这个文件会在下一次上传时被重新写入）。
+        材质无法生成预览（文件损坏无法解码、期间被删除、工作进程内存超限或崩溃）
+        与材质不存在一样返回 None；工作池饱和或处理超时抛 TextureWorkerBusy。
         """
-        # 让 process_and_save 的 mock 在测试场景下仍能拦截（业务路径会走线程池）
-        texture_hash = await self.process_and_save_async(file_bytes, texture_type)
-        return texture_hash, True
+        try:
+            if self.workers is None:
+                return await asyncio.to_thread(ensure_preview, self.textures_dir, texture_hash, kind)
+            return await self.workers.submit(ensure_preview, self.textures_dir, texture_hash, kind)
+        except TimeoutError:
+            raise TextureWorkerBusy(self.workers.retry_after if self.workers is not None else 1)
+        except (ValueError, MemoryError, FileNotFoundError, concurrent.futures.BrokenExecutor):
+            logger.warning("texture preview %s/%s could not be rendered", texture_hash, kind, exc_info=True)
+            return None
 
     def delete_file(self, texture_hash: str) -> None:
-        """物理删除材质文件（幂等）。"""
-        file_path = os.path.join(self.textures_dir, f"{texture_hash}.png")
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        """物理删除材质文件及其预览图（幂等，分片与旧平铺布局都会清理）。"""
+        previews = [
+            _preview_path(self.textures_dir, texture_hash, kind)
+            for kinds in PREVIEW_KINDS.values()
+            for kind in kinds
+        ]
+        for file_path in (
+            self._file_path(texture_hash),
+            _legacy_texture_path(self.textures_dir, texture_hash),
+            *previews,
+        ):
+            if os.path.exists(file_path):
+                os.remove(file_path)
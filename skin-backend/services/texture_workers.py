@@ -0,0 +1,230 @@
+"""材质处理工作池：把 CPU 密集的图像处理（解码、哈希、编码）隔离到独立的执行器。
+
+- 普通 CPython：使用进程池，图像处理不与事件循环争抢 GIL；每个工作进程通过
+  RLIMIT_AS 限制地址空间，单个恶意/超大图最多拖垮一个工作进程。
+- 自由线程构建（Dockerfile 中的 3.14t，GIL 关闭）：线程即可真正并行，改用线程池，
+  省去进程间拷贝。线程模式无法做进程级内存上限，依赖 image_utils 中的尺寸闸门
+  与 MAX_IMAGE_PIXELS。
+
+准入控制：执行中 + 排队中的任务总数有上限，超过即抛 TextureWorkerBusy
+（由应用层映射为 503 + Retry-After），而不是让请求无限堆积占用内存。
+排队在事件循环内完成（信号量），因此排队深度与等待时间可以精确统计。
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import sys
+import time
+from collections import deque
+from typing import Any, Callable, Optional
+
+from utils.metrics import LATENCY_WINDOW, percentile
+
+from utils.metrics import LATENCY_WINDOW, percentile
+
+
+logger = logging.getLogger(__name__)
+
+class TextureWorkerBusy(Exception):
+    """工作池已饱和（执行中 + 排队数达到上限），请求应被快速拒绝。"""
+
+    def __init__(self, retry_after: int = 1):
+        super().__init__("Texture workers are busy, please retry later")
+        self.retry_after = retry_after
+
+
+def gil_disabled() -> bool:
+    """当前解释器是否运行在 GIL 关闭的自由线程模式下。"""
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def _limit_worker_memory(memory_limit_bytes: int) -> None:
+    """进程池 initializer：限制工作进程的地址空间，超限时分配失败抛 MemoryError。"""
+    if memory_limit_bytes <= 0:
+        return
+    try:
+        import resource
+
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit_bytes, memory_limit_bytes))
+    except (ImportError, ValueError, OSError):
+        # 非 Linux 平台或当前硬上限更低时保持默认
+        pass
+
+
+class TextureWorkerPool:
+    """有界的材质处理工作池。
+
+    Args:
+        mode: "process" / "thread" / "auto"（GIL 关闭时用线程，否则用进程）
+        max_workers: 并行执行的任务数
+        max_queue: 允许排队等待的任务数，超过后新任务直接被拒绝
+        timeout_seconds: 单个任务从开始执行起的耗时上限
+        memory_limit_mb: 进程模式下每个工作进程的地址空间上限（<=0 表示不限制）
+        retry_after: 饱和拒绝时建议客户端等待的秒数
+    """
+
+    def __init__(
+        self,
+        mode: str = "auto",
+        max_workers: Optional[int] = None,
+        max_queue: int = 32,
+        timeout_seconds: float = 30.0,
+        memory_limit_mb: int = 1024,
+        retry_after: int = 2,
+    ):
+        if mode not in ("auto", "process", "thread"):
+            raise ValueError(f"Unknown texture worker mode: {mode}")
+        if mode == "auto":
+            mode = "thread" if gil_disabled() else "process"
+        self.mode = mode
+        self.max_workers = max(1, int(max_workers or min(4, os.cpu_count() or 1)))
+        self.max_queue = max(0, int(max_queue))
+        self.timeout_seconds = float(timeout_seconds)
+        self.memory_limit_bytes = int(memory_limit_mb) * 1024 * 1024
+        self.retry_after = int(retry_after)
+
+        self._executor: Optional[concurrent.futures.Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._admitted = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._wait_ms: deque = deque(maxlen=LATENCY_WINDOW)
+        self._run_ms: deque = deque(maxlen=LATENCY_WINDOW)
+
+    @classmethod
+    def from_config(cls, config) -> "TextureWorkerPool":
+        """按 textures.workers.* 配置构建工作池。"""
+        return cls(
+            mode=config.get("textures.workers.mode", "auto"),
+            max_workers=config.get("textures.workers.max_workers"),
+            max_queue=config.get("textures.workers.max_queue", 32),
+            timeout_seconds=config.get("textures.workers.timeout_seconds", 30),
+            memory_limit_mb=config.get("textures.workers.memory_limit_mb", 1024),
+            retry_after=config.get("textures.workers.retry_after_seconds", 2),
+        )
+
+    def _get_executor(self) -> concurrent.futures.Executor:
+        if self._executor is None:
+            if self.mode == "process":
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=_limit_worker_memory,
+                    initargs=(self.memory_limit_bytes,),
+                )
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="texture-worker"
+                )
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # 信号量绑定事件循环：首次提交时创建，事件循环更换（如测试）时重建
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_workers)
+            self._slots_loop = loop
+        return self._slots
+
+    def _recycle_executor(self, executor: concurrent.futures.Executor) -> None:
+        """超时或崩溃后丢弃执行器。进程模式下终止工作进程，真正回收失控任务。
+
+        只回收任务提交时所用的那个执行器：它已被其它任务回收、换上了新执行器时不再动作，
+        避免受牵连的任务把新执行器（及其上的新任务）也一并终止。
+        """
+        if self._executor is not executor:
+            return
+        self._executor = None
+        if self.mode == "process":
+            try:
+                terminate = getattr(executor, "terminate_workers", None)
+                if terminate is not None:
+                    terminate()
+                    return
+                # Python < 3.14 没有 terminate_workers：直接终止工作进程
+                for process in list((getattr(executor, "_processes", None) or {}).values()):
+                    process.terminate()
+            except Exception:
+                logger.warning("failed to terminate texture workers", exc_info=True)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    async def submit(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """提交任务并等待结果。
+
+        进程模式下 fn 与参数必须可 pickle（模块级函数）。
+
+        Raises:
+            TextureWorkerBusy: 执行中 + 排队数已达上限；或执行器因其它任务超时/崩溃被回收，
+                本任务受牵连中断（可重试）
+            TimeoutError: 任务执行超过 timeout_seconds
+            concurrent.futures.BrokenExecutor: 工作进程在执行本任务时崩溃（如触发内存上限）
+        """
+        if self._admitted >= self.max_workers + self.max_queue:
+            self._rejected += 1
+            raise TextureWorkerBusy(self.retry_after)
+
+        self._admitted += 1
+        try:
+            enqueued_at = time.perf_counter()
+            async with self._get_slots():
+                started_at = time.perf_counter()
+                self._wait_ms.append((started_at - enqueued_at) * 1000)
+                self._running += 1
+                try:
+                    loop = asyncio.get_running_loop()
+                    executor = self._get_executor()
+                    future = loop.run_in_executor(executor, fn, *args)
+                    try:
+                        result = await asyncio.wait_for(future, self.timeout_seconds)
+                    except asyncio.TimeoutError:
+                        self._timeouts += 1
+                        self._recycle_executor(executor)
+                        raise TimeoutError("Texture processing timed out")
+                    except concurrent.futures.BrokenExecutor:
+                        if self._executor is not executor:
+                            # 执行器已因其它任务超时/崩溃被回收，本任务只是受牵连：提示客户端重试
+                            raise TextureWorkerBusy(self.retry_after)
+                        # 工作进程被杀（如触发内存上限后崩溃）：换一个新执行器供后续任务使用
+                        self._recycle_executor(executor)
+                        raise
+                except BaseException:
+                    self._failed += 1
+                    raise
+                finally:
+                    self._running -= 1
+                    self._run_ms.append((time.perf_counter() - started_at) * 1000)
+            self._completed += 1
+            return result
+        finally:
+            self._admitted -= 1
+
+    def stats(self) -> dict:
+        """工作池运行指标：并发/排队深度、累计计数与最近任务的耗时分位数（毫秒）。"""
+        wait_ms = sorted(self._wait_ms)
+        run_ms = sorted(self._run_ms)
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "running": self._running,
+            "queued": self._admitted - self._running,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "timeouts": self._timeouts,
+            "wait_ms_p50": round(percentile(wait_ms, 0.5), 2),
+            "wait_ms_p95": round(percentile(wait_ms, 0.95), 2),
+            "run_ms_p50": round(percentile(run_ms, 0.5), 2),
+            "run_ms_p95": round(percentile(run_ms, 0.95), 2),
+        }
+
+    def shutdown(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
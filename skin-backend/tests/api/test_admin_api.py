@@ -311,3 +311,22 @@ async def test_admin_skin_cape_independence(client, admin_headers, db_session, u
     assert profile.skin_hash is None
     assert profile.cape_hash is None
 
+
+
+@pytest.mark.asyncio
+async def test_api_admin_metrics_includes_texture_workers(client, admin_headers):
+    """管理员可查看材质工作池指标"""
+    resp = await client.get("/admin/metrics", cookies=admin_headers["cookies"])
+    assert resp.status_code == 200
+    stats = resp.json()["texture_workers"]
+    assert {"running", "queued", "rejected", "wait_ms_p95", "run_ms_p95"} <= set(stats)
+
+
+@pytest.mark.asyncio
+async def test_api_admin_texture_gc_defaults_to_dry_run(client, admin_headers):
+    """手动触发材质 GC：默认只出报告"""
+    resp = await client.post("/admin/textures/gc", cookies=admin_headers["cookies"])
+    assert resp.status_code == 200
+    report = resp.json()
+    assert report["dry_run"] is True
+    assert report["deleted"] == 0
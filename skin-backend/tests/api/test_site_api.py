@@ -259,8 +259,9 @@ async def test_api_remote_ygg_import_flow(client, auth_headers, db_session):
         mock_get_p.return_value = mock_profile_data
         mock_down.return_value = b"fake_image_bytes"
         
-        # process_and_save 需 mock，因为 fake_image_bytes 不是真的 PNG
-        with patch("services.texture_storage.TextureStorage.process_and_save", return_value="fake_hash"):
+        # process_and_save_async_tracked 需 mock，因为 fake_image_bytes 不是真的 PNG
+        with patch("services.texture_storage.TextureStorage.process_and_save_async_tracked",
+                   new_callable=AsyncMock, return_value=("fake_hash", True)):
             resp = await client.post("/remote-ygg/import-profiles",
                 json={
                     "api_url": "https://remote.com",
@@ -369,3 +370,131 @@ async def test_api_public_skin_library_search_query(client, db_session, user_fac
     # 空集合
     resp = await client.get("/public/skin-library", params={"q": "nothing_matches_xyz"})
     assert resp.json()["items"] == []
+
+
+@pytest.mark.asyncio
+async def test_api_texture_upload_busy_returns_503(client, auth_headers):
+    """材质工作池饱和时快速返回 503 + Retry-After"""
+    from unittest.mock import AsyncMock
+    from services import TextureWorkerBusy
+
+    from io import BytesIO
+    from PIL import Image
+
+    png = BytesIO()
+    Image.new("RGBA", size=(64, 64), color=(1, 2, 3, 255)).save(png, "png")
+
+    with patch("services.texture_storage.TextureStorage.process_and_save_async_tracked",
+               new_callable=AsyncMock, side_effect=TextureWorkerBusy(3)):
+        resp = await client.post("/me/textures",
+            data={"texture_type": "skin", "note": "", "is_public": "false", "model": "default"},
+            files={"file": ("skin.png", png.getvalue(), "image/png")},
+            cookies=auth_headers["cookies"],
+        )
+
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "3"
+
+
+@pytest.mark.asyncio
+async def test_api_texture_upload_rejects_non_png_before_processing(client, auth_headers):
+    """PNG 头嗅探：非 PNG 上传在读取阶段即 400，不进入图像处理"""
+    from unittest.mock import AsyncMock
+
+    with patch("services.texture_storage.TextureStorage.process_and_save_async_tracked",
+               new_callable=AsyncMock) as mock_process:
+        resp = await client.post("/me/textures",
+            data={"texture_type": "skin"},
+            files={"file": ("skin.png", b"GIF89a" + b"\x00" * 64, "image/png")},
+            cookies=auth_headers["cookies"],
+        )
+    assert resp.status_code == 400
+    mock_process.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_api_texture_upload_oversized_body_returns_413(client, auth_headers, db_session):
+    """请求体超过 max_texture_size（+ multipart 余量）时在接收阶段即 413"""
+    await db_session.setting.set("max_texture_size", "1")
+    resp = await client.post("/me/textures",
+        data={"texture_type": "skin"},
+        files={"file": ("skin.png", b"\x89PNG\r\n\x1a\n" + b"\x00" * (200 * 1024), "image/png")},
+        cookies=auth_headers["cookies"],
+    )
+    assert resp.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_api_texture_preview_served_after_upload(client, auth_headers):
+    """上传后头像预览可直接获取，并带长期缓存头；未知类型 / 非法 hash 404"""
+    from io import BytesIO
+    from PIL import Image
+
+    buf = BytesIO()
+    Image.new("RGBA", size=(64, 64), color=(0, 128, 255, 255)).save(buf, "png")
+    resp = await client.post("/me/textures",
+        data={"texture_type": "skin"},
+        files={"file": ("skin.png", buf.getvalue(), "image/png")},
+        cookies=auth_headers["cookies"],
+    )
+    tex_hash = resp.json()["hash"]
+
+    resp = await client.get(f"/textures/{tex_hash}/preview/head")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "image/png"
+    assert "immutable" in resp.headers["cache-control"]
+    assert Image.open(BytesIO(resp.content)).size == (64, 64)
+
+    assert (await client.get(f"/textures/{'0' * 64}/preview/head")).status_code == 404
+    assert (await client.get(f"/textures/{tex_hash}/preview/feet")).status_code == 404
+    assert (await client.get("/textures/../preview/head")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_api_texture_preview_undecodable_texture_404(client, texture_storage_fixture):
+    """材质文件损坏无法解码时返回 404，而不是 500"""
+    import os
+
+    tex_hash = "e" * 64
+    os.makedirs(texture_storage_fixture.textures_dir, exist_ok=True)
+    with open(os.path.join(texture_storage_fixture.textures_dir, f"{tex_hash}.png"), "wb") as f:
+        f.write(b"not a png")
+
+    resp = await client.get(f"/textures/{tex_hash}/preview/head")
+    assert resp.status_code == 404
+
+
+class _FailingWorkers:
+    retry_after = 7
+
+    def __init__(self, error):
+        self.error = error
+
+    async def submit(self, fn, *args):
+        raise self.error
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error_name, status", [
+    ("busy", 503),
+    ("timeout", 503),
+    ("broken", 404),
+    ("memory", 404),
+])
+async def test_api_texture_preview_worker_errors(client, texture_storage_fixture, monkeypatch, error_name, status):
+    """工作池饱和 / 超时 503 + Retry-After；工作进程崩溃或内存超限按无法生成预览 404"""
+    import concurrent.futures
+    from services import TextureWorkerBusy
+
+    error = {
+        "busy": TextureWorkerBusy(7),
+        "timeout": TimeoutError("Texture processing timed out"),
+        "broken": concurrent.futures.BrokenExecutor(),
+        "memory": MemoryError(),
+    }[error_name]
+    monkeypatch.setattr(texture_storage_fixture, "workers", _FailingWorkers(error))
+
+    resp = await client.get(f"/textures/{'a' * 64}/preview/body")
+    assert resp.status_code == status
+    if status == 503:
+        assert resp.headers["retry-after"] == "7"
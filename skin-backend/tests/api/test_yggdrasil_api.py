@@ -12,6 +12,24 @@ async def test_api_yggdrasil_metadata(client):
     assert "signaturePublickey" in data
     assert "skinDomains" in data
 
+
+@pytest.mark.asyncio
+async def test_api_metadata_etag_and_rebuild_on_site_name_change(client, db_session):
+    """元数据带强 ETag，If-None-Match 命中返回 304；修改站点名后 ETag 变化"""
+    resp = await client.get("/")
+    etag = resp.headers["etag"]
+    assert etag.startswith('"') and not etag.startswith("W/")
+
+    resp = await client.get("/", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.content == b""
+
+    await db_session.setting.set("site_name", "Renamed Station")
+    resp = await client.get("/", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["etag"] != etag
+    assert resp.json()["meta"]["serverName"] == "Renamed Station"
+
 @pytest.mark.asyncio
 async def test_api_yggdrasil_authenticate(client, user_factory, db_session):
     """测试 Yggdrasil 认证接口 (Authlib-Injector 核心流程)"""
@@ -140,6 +158,35 @@ async def test_api_yggdrasil_join_has_joined(client, user_factory, db_session):
     assert has_resp.json()["id"] == pid
 
 
+
+@pytest.mark.asyncio
+async def test_api_yggdrasil_revoked_token_stops_validating(client, user_factory, db_session):
+    """token 缓存下，invalidate / signout 之后 validate 立即失败"""
+    password = "Pass"
+    user = await user_factory(password=password)
+
+    async def login():
+        resp = await client.post("/authserver/authenticate", json={
+            "username": user.email, "password": password
+        })
+        token = resp.json()["accessToken"]
+        # 连续两次 validate，第二次命中缓存
+        for _ in range(2):
+            resp = await client.post("/authserver/validate", json={"accessToken": token})
+            assert resp.status_code == 204
+        return token
+
+    token = await login()
+    assert (await client.post("/authserver/invalidate", json={"accessToken": token})).status_code == 204
+    resp = await client.post("/authserver/validate", json={"accessToken": token})
+    assert resp.status_code == 403
+
+    token = await login()
+    resp = await client.post("/authserver/signout", json={"username": user.email, "password": password})
+    assert resp.status_code == 204
+    resp = await client.post("/authserver/validate", json={"accessToken": token})
+    assert resp.status_code == 403
+
 @pytest.mark.asyncio
 async def test_api_yggdrasil_name_lookup_local_hit(client, user_factory, db_session):
     """玩家名查询：命中本地角色时返回 {id,name}（覆盖共享 lookup helper）"""
@@ -179,3 +226,15 @@ async def test_api_yggdrasil_texture_delete_requires_bearer(client):
     """材质删除缺少 Bearer 头时返回 401"""
     resp = await client.delete("/api/user/profile/some_uuid/skin")
     assert resp.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_api_bulk_profile_lookup_case_insensitive(client, user_factory, db_session):
+    """批量按名查询：不同大小写命中本地角色，返回库中真实名称且不重复"""
+    from utils.typing import PlayerProfile
+    user = await user_factory()
+    await db_session.user.create_profile(PlayerProfile("bulk_pid", user.id, "BulkPlayer"))
+
+    resp = await client.post("/api/profiles/minecraft", json=["bulkplayer", "BULKPLAYER", "Nobody"])
+    assert resp.status_code == 200
+    assert resp.json() == [{"id": "bulk_pid", "name": "BulkPlayer"}]
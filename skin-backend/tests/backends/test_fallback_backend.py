@@ -3,6 +3,7 @@ import aiohttp
 import asyncio
 from unittest.mock import AsyncMock, patch, MagicMock
 from backends.fallback_backend import FallbackBackend
+from services.fallback_health import FallbackHealth
 from fastapi.responses import Response
 
 @pytest.mark.asyncio
@@ -136,3 +137,343 @@ async def test_fallback_whitelist_filter(db_session):
         assert res is not None
         assert res.status_code == 200
         mock_get.assert_called_once()
+
+
+def _mock_resp(status, body=b"", json_data=None):
+    m = AsyncMock()
+    m.status = status
+    m.read.return_value = body
+    m.json.return_value = json_data
+    m.__aenter__.return_value = m
+    return m
+
+
+async def _save_single_endpoint(db_session, cache_ttl=60, note="CacheNode"):
+    await db_session.fallback.save_endpoints([{
+        "id": None,
+        "priority": 1,
+        "session_url": "https://mock-session.com",
+        "account_url": "https://mock-account.com",
+        "services_url": "https://mock-services.com",
+        "cache_ttl": cache_ttl,
+        "enable_profile": True,
+        "enable_hasjoined": True,
+        "note": note,
+    }])
+
+
+@pytest.mark.asyncio
+async def test_fallback_response_cache_hits(db_session):
+    """同一端点的相同请求在 cache_ttl 内只访问上游一次，名称查询大小写不敏感"""
+    backend = FallbackBackend(db_session)
+    await _save_single_endpoint(db_session)
+
+    body = b'{"id":"abc","name":"Steve"}'
+    with patch('aiohttp.ClientSession.get', return_value=_mock_resp(200, body)) as mock_get:
+        first = await backend.get_profile_by_name("Steve")
+        second = await backend.get_profile_by_name("steve")
+        assert first.body == body and second.body == body
+        assert second.status_code == 200
+        mock_get.assert_called_once()
+
+        await backend.get_profile("abc")
+        await backend.get_profile("abc")
+        await backend.get_profile("abc", unsigned=False)
+        assert mock_get.call_count == 3
+
+    stats = backend.cache.stats()
+    assert stats["hits"] == 2
+    assert stats["entries"] == 3
+
+
+@pytest.mark.asyncio
+async def test_fallback_response_cache_negative_and_errors(db_session):
+    """204/404 作为负结果缓存；5xx、429 不缓存"""
+    backend = FallbackBackend(db_session)
+    await _save_single_endpoint(db_session)
+
+    with patch('aiohttp.ClientSession.get', return_value=_mock_resp(404)) as mock_get:
+        assert await backend.services_lookup("Nobody") is None
+        assert await backend.services_lookup("Nobody") is None
+        mock_get.assert_called_once()
+    assert backend.cache.stats()["negative_hits"] == 1
+
+    with patch('aiohttp.ClientSession.get', return_value=_mock_resp(429)) as mock_get:
+        assert await backend.get_profile_by_name("Limited") is None
+        assert await backend.get_profile_by_name("Limited") is None
+        assert mock_get.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_fallback_response_cache_respects_zero_ttl(db_session):
+    """端点 cache_ttl 为 0 时不缓存"""
+    backend = FallbackBackend(db_session)
+    await _save_single_endpoint(db_session, cache_ttl=0)
+
+    with patch('aiohttp.ClientSession.get', return_value=_mock_resp(200, b'{}')) as mock_get:
+        await backend.get_profile("abc")
+        await backend.get_profile("abc")
+        assert mock_get.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_fallback_response_cache_flushed_on_save_endpoints(db_session):
+    """保存端点配置后缓存整体清空"""
+    backend = FallbackBackend(db_session)
+    await _save_single_endpoint(db_session)
+
+    with patch('aiohttp.ClientSession.get', return_value=_mock_resp(200, b'{"v":1}')) as mock_get:
+        await backend.get_profile("abc")
+        await backend.get_profile("abc")
+        mock_get.assert_called_once()
+
+    endpoints = await db_session.fallback.list_endpoints()
+    await db_session.fallback.save_endpoints([{**endpoints[0], "session_url": "https://other.com"}])
+
+    with patch('aiohttp.ClientSession.get', return_value=_mock_resp(200, b'{"v":2}')) as mock_get:
+        res = await backend.get_profile("abc")
+        assert res.body == b'{"v":2}'
+        mock_get.assert_called_once()
+        assert "https://other.com" in mock_get.call_args[0][0]
+    assert backend.cache.stats()["flushes"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fallback_bulk_lookup_caches_per_name(db_session):
+    """批量查询按名称缓存，只向上游查询未缓存的名称，缺席的名称记为负结果"""
+    backend = FallbackBackend(db_session)
+    await _save_single_endpoint(db_session)
+
+    alex = {"id": "a1", "name": "Alex"}
+    with patch('aiohttp.ClientSession.post', return_value=_mock_resp(200, json_data=[alex])) as mock_post:
+        assert await backend.bulk_lookup(["Alex", "Ghost"]) == [alex]
+        mock_post.assert_called_once()
+        assert mock_post.call_args.kwargs["json"] == ["Alex", "Ghost"]
+
+    steve = {"id": "s1", "name": "Steve"}
+    with patch('aiohttp.ClientSession.post', return_value=_mock_resp(200, json_data=[steve])) as mock_post:
+        result = await backend.bulk_lookup(["alex", "ghost", "Steve"])
+        assert result == [alex, steve]
+        assert mock_post.call_args.kwargs["json"] == ["Steve"]
+
+    with patch('aiohttp.ClientSession.post') as mock_post:
+        assert await backend.bulk_lookup(["Ghost", "Alex"]) == [alex]
+        mock_post.assert_not_called()
+
+
+async def _save_two_endpoints(db_session):
+    await db_session.setting.set("fallback_strategy", "hedged")
+    await db_session.fallback.save_endpoints([
+        {
+            "id": None, "priority": i,
+            "session_url": f"https://{name}.com", "account_url": f"https://{name}.com",
+            "services_url": f"https://{name}.com", "cache_ttl": 0,
+            "enable_profile": True, "enable_hasjoined": True, "note": name,
+        }
+        for i, name in enumerate(("primary", "secondary"), start=1)
+    ])
+
+
+def _mock_get_by_host(responses: dict, calls: list):
+    """按域名返回 (延迟秒数, 状态码, 内容) 的 session.get 替身"""
+    def mock_get_impl(url, *args, **kwargs):
+        host = url.split("/")[2]
+        calls.append(host)
+        delay, status, body = responses[host]
+        m = _mock_resp(status, body)
+
+        async def delayed_aenter(*a, **kw):
+            await asyncio.sleep(delay)
+            return m
+        m.__aenter__ = delayed_aenter
+        return m
+    return mock_get_impl
+
+
+@pytest.mark.asyncio
+async def test_fallback_strategy_hedged_sends_backup_after_delay(db_session):
+    """首选端点超过等待时长未应答时补发下一个端点，先到的有效应答胜出"""
+    backend = FallbackBackend(db_session, health=FallbackHealth(default_delay_ms=50, min_delay_ms=10))
+    await _save_two_endpoints(db_session)
+
+    calls = []
+    responses = {"primary.com": (1.0, 200, b'{"from":"primary"}'), "secondary.com": (0, 200, b'{"from":"secondary"}')}
+    with patch('aiohttp.ClientSession.get', side_effect=_mock_get_by_host(responses, calls)):
+        started = asyncio.get_running_loop().time()
+        res = await backend.get_profile("abc")
+        elapsed = asyncio.get_running_loop().time() - started
+
+    assert res.body == b'{"from":"secondary"}'
+    assert calls == ["primary.com", "secondary.com"]
+    assert elapsed < 0.5
+    stats = backend.health.stats()
+    assert stats["hedges_sent"] == 1 and stats["hedge_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_fallback_strategy_hedged_fast_primary_no_backup(db_session):
+    """首选端点在等待时长内应答时不补发"""
+    backend = FallbackBackend(db_session, health=FallbackHealth(default_delay_ms=200))
+    await _save_two_endpoints(db_session)
+
+    calls = []
+    responses = {"primary.com": (0, 200, b'{"from":"primary"}'), "secondary.com": (0, 200, b'{"from":"secondary"}')}
+    with patch('aiohttp.ClientSession.get', side_effect=_mock_get_by_host(responses, calls)):
+        res = await backend.get_profile("abc")
+
+    assert res.body == b'{"from":"primary"}'
+    assert calls == ["primary.com"]
+    assert backend.health.stats()["hedges_sent"] == 0
+
+
+@pytest.mark.asyncio
+async def test_fallback_strategy_hedged_moves_on_after_not_found(db_session):
+    """首选端点答复不存在时立即转向下一个端点"""
+    backend = FallbackBackend(db_session, health=FallbackHealth(default_delay_ms=2000, max_delay_ms=2000))
+    await _save_two_endpoints(db_session)
+
+    calls = []
+    responses = {"primary.com": (0, 404, b""), "secondary.com": (0, 200, b'{"from":"secondary"}')}
+    with patch('aiohttp.ClientSession.get', side_effect=_mock_get_by_host(responses, calls)):
+        started = asyncio.get_running_loop().time()
+        res = await backend.get_profile("abc")
+        elapsed = asyncio.get_running_loop().time() - started
+
+    assert res.body == b'{"from":"secondary"}'
+    assert elapsed < 0.5
+    assert backend.health.stats()["hedges_sent"] == 0
+
+
+@pytest.mark.asyncio
+async def test_fallback_breaker_skips_failing_endpoint(db_session):
+    """持续失败的端点被熔断，之后的请求直接跳过它"""
+    backend = FallbackBackend(db_session, health=FallbackHealth(consecutive_failures=2, open_seconds=60))
+    await _save_two_endpoints(db_session)
+    await db_session.setting.set("fallback_strategy", "serial")
+
+    calls = []
+    responses = {"primary.com": (0, 503, b""), "secondary.com": (0, 200, b'{"from":"secondary"}')}
+    with patch('aiohttp.ClientSession.get', side_effect=_mock_get_by_host(responses, calls)):
+        for _ in range(3):
+            res = await backend.get_profile("abc")
+            assert res.body == b'{"from":"secondary"}'
+
+    assert calls == ["primary.com", "secondary.com", "primary.com", "secondary.com", "secondary.com"]
+    endpoints = await db_session.fallback.list_endpoints()
+    assert backend.health.snapshot()[str(endpoints[0]["id"])]["state"] == "open"
+
+
+def _half_open_health() -> FallbackHealth:
+    """一次失败即断开、冷却立即结束；探测名额被占用后 60 秒内不再放行"""
+    return FallbackHealth(consecutive_failures=1, open_seconds=0, probe_timeout_seconds=60)
+
+
+async def _trip(backend: FallbackBackend, db_session, index: int = 0) -> int:
+    endpoint_id = (await db_session.fallback.list_endpoints())[index]["id"]
+    backend.health.sync(db_session.fallback.version)
+    backend.health.record_failure(endpoint_id)
+    return endpoint_id
+
+
+@pytest.mark.asyncio
+async def test_fallback_probe_not_taken_by_cache_hit(db_session):
+    """缓存命中不发请求，不占用半开端点的探测名额"""
+    backend = FallbackBackend(db_session, health=_half_open_health())
+    await _save_single_endpoint(db_session)
+
+    body = b'{"id":"abc","name":"Steve"}'
+    with patch('aiohttp.ClientSession.get', return_value=_mock_resp(200, body)) as mock_get:
+        await backend.get_profile("abc")
+        endpoint_id = await _trip(backend, db_session)
+        assert (await backend.get_profile("abc")).body == body
+        assert mock_get.call_count == 1
+        assert backend.health.available(endpoint_id)
+
+        # 真正的探测请求成功后端点恢复
+        assert (await backend.get_profile("def")).body == body
+        assert mock_get.call_count == 2
+    assert backend.health.snapshot()[str(endpoint_id)]["state"] == "closed"
+
+
+@pytest.mark.asyncio
+async def test_fallback_probe_not_taken_by_disabled_endpoint(db_session):
+    """端点关闭了 hasJoined 转发时直接返回，不占用探测名额"""
+    backend = FallbackBackend(db_session, health=_half_open_health())
+    await db_session.fallback.save_endpoints([{
+        "id": None, "priority": 1,
+        "session_url": "https://mock-session.com", "account_url": "https://mock-account.com",
+        "services_url": "https://mock-services.com", "cache_ttl": 0,
+        "enable_profile": True, "enable_hasjoined": False, "note": "NoJoin",
+    }])
+    endpoint_id = await _trip(backend, db_session)
+
+    body = b'{"id":"abc","name":"Steve"}'
+    with patch('aiohttp.ClientSession.get', return_value=_mock_resp(200, body)) as mock_get:
+        assert await backend.has_joined("Steve", "server") is None
+        mock_get.assert_not_called()
+        assert backend.health.available(endpoint_id)
+        assert (await backend.get_profile("abc")).body == body
+
+
+@pytest.mark.asyncio
+async def test_fallback_cancelled_hedge_releases_probe(db_session):
+    """对冲中落败被取消的探测请求交还名额，下一个请求可以立即重新探测"""
+    health = _half_open_health()
+    health.default_delay_ms = health.min_delay_ms = 10
+    backend = FallbackBackend(db_session, health=health)
+    await _save_two_endpoints(db_session)
+    primary_id = await _trip(backend, db_session)
+
+    calls = []
+    responses = {"primary.com": (1.0, 200, b'{"from":"primary"}'), "secondary.com": (0, 200, b'{"from":"secondary"}')}
+    with patch('aiohttp.ClientSession.get', side_effect=_mock_get_by_host(responses, calls)):
+        res = await backend.get_profile("abc")
+        assert res.body == b'{"from":"secondary"}'
+        await asyncio.sleep(0)
+        assert backend.health.available(primary_id)
+
+        responses["primary.com"] = (0, 200, b'{"from":"primary"}')
+        res = await backend.get_profile("def")
+
+    assert res.body == b'{"from":"primary"}'
+    assert calls == ["primary.com", "secondary.com", "primary.com"]
+
+
+@pytest.mark.asyncio
+async def test_fallback_adaptive_order_prefers_faster_endpoint(db_session):
+    """开启自适应排序后按实测延迟选择端点"""
+    backend = FallbackBackend(db_session)
+    await _save_two_endpoints(db_session)
+    await db_session.setting.set("fallback_strategy", "serial")
+    await db_session.setting.set("fallback_adaptive_order", "true")
+    primary, secondary = await db_session.fallback.list_endpoints()
+    backend.health.sync(db_session.fallback.version)
+    backend.health.observe(primary["id"], 800)
+    backend.health.observe(secondary["id"], 40)
+
+    calls = []
+    responses = {"primary.com": (0, 200, b'{"from":"primary"}'), "secondary.com": (0, 200, b'{"from":"secondary"}')}
+    with patch('aiohttp.ClientSession.get', side_effect=_mock_get_by_host(responses, calls)):
+        res = await backend.get_profile("abc")
+
+    assert res.body == b'{"from":"secondary"}'
+    assert calls == ["secondary.com"]
+
+
+@pytest.mark.asyncio
+async def test_fallback_concurrent_lookups_coalesced(db_session):
+    """相同玩家名的并发查询只向上游发一次，每个请求各自拿到独立的 Response"""
+    backend = FallbackBackend(db_session)
+    await _save_single_endpoint(db_session, cache_ttl=0)
+
+    calls = []
+    responses = {"mock-account.com": (0.05, 200, b'{"id":"abc","name":"Steve"}')}
+    with patch('aiohttp.ClientSession.get', side_effect=_mock_get_by_host(responses, calls)):
+        results = await asyncio.gather(
+            *(backend.get_profile_by_name(name) for name in ("Steve", "steve", "STEVE", "Steve"))
+        )
+
+    assert calls == ["mock-account.com"]
+    assert all(r.body == b'{"id":"abc","name":"Steve"}' for r in results)
+    assert len({id(r) for r in results}) == 4
+    assert backend.flights.stats()["coalesced"] == 3
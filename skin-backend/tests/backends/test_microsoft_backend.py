@@ -96,7 +96,8 @@ async def test_microsoft_import_profile_skin_and_cape(db_session, test_config, u
     user = await user_factory()
 
     with patch("backends.microsoft_backend.download_texture", new_callable=AsyncMock) as mock_dl, \
-         patch.object(texture_storage, "process_and_save", side_effect=["skin_h", "cape_h"]):
+         patch.object(texture_storage, "process_and_save_async_tracked", new_callable=AsyncMock,
+                      side_effect=[("skin_h", True), ("cape_h", True)]):
         mock_dl.return_value = b"bytes"
         result = await backend.import_profile(
             user.id, "ms_uuid_1", "MsImported",
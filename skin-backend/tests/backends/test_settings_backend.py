@@ -3,6 +3,7 @@
 import pytest
 from fastapi import HTTPException
 from backends.settings_backend import SettingsBackend, SETTING_DEFAULTS
+from services.fallback_health import FallbackHealth
 
 
 @pytest.mark.asyncio
@@ -77,6 +78,35 @@ async def test_save_invalid_profile_uuid_mode_rejected(db_session):
     assert (await backend.get_site_settings())["profile_uuid_mode"] == "random"
 
 
+@pytest.mark.asyncio
+async def test_save_fallback_strategy_validated(db_session):
+    backend = SettingsBackend(db_session)
+    await backend.save_settings_group("fallback", {"fallback_strategy": "Hedged"})
+    assert (await backend.get_fallback_settings())["fallback_strategy"] == "hedged"
+
+    with pytest.raises(HTTPException) as exc:
+        await backend.save_settings_group("fallback", {"fallback_strategy": "random"})
+    assert exc.value.status_code == 400
+    assert (await backend.get_fallback_settings())["fallback_strategy"] == "hedged"
+
+
+@pytest.mark.asyncio
+async def test_fallback_settings_include_health(db_session):
+    health = FallbackHealth(consecutive_failures=1)
+    health.sync(db_session.fallback.version)
+    health.record_failure(7)
+    backend = SettingsBackend(db_session, fallback_health=health)
+
+    await backend.save_settings_group("fallback", {"fallback_adaptive_order": True})
+    settings = await backend.get_fallback_settings()
+    assert settings["fallback_adaptive_order"] is True
+    assert settings["fallback_health"]["7"]["state"] == "open"
+
+    # 端点增删改后旧状态被清空
+    await db_session.fallback.save_endpoints([])
+    assert (await backend.get_fallback_settings())["fallback_health"] == {}
+
+
 @pytest.mark.asyncio
 async def test_empty_smtp_password_is_skipped(db_session):
     """空 smtp_password 不覆盖既有值（保留语义，而非写空串）"""
@@ -321,7 +321,8 @@ async def test_upload_and_apply_texture_three_steps(db_session, test_config, use
     profile = await backend.create_profile(user.id, "ApplyTarget", "default")
     pid = profile["id"]
 
-    with patch.object(texture_storage, "process_and_save", return_value="applied_hash"):
+    with patch.object(texture_storage, "process_and_save_async_tracked",
+                      new_callable=AsyncMock, return_value=("applied_hash", True)):
         result = await backend.upload_and_apply_texture(
             user.id, pid, b"fake-png-bytes", "skin", model="slim", is_public=False
         )
@@ -115,10 +115,11 @@ async def test_yggdrasil_texture_management(ygg_backend_fixture, user_factory, d
 # ========== Phase 4: presentation logic moved from yggdrasil router ==========
 
 
-def test_build_profile_json_skin_slim_and_cape(ygg_backend_fixture):
+@pytest.mark.asyncio
+async def test_build_profile_json_skin_slim_and_cape(ygg_backend_fixture):
     """slim 皮肤带 model metadata，cape 出现在 textures，且 SKIN url 含 hash"""
     profile = PlayerProfile("uuid1", "owner", "SlimGuy", "slim", "skinhash", "capehash")
-    data = ygg_backend_fixture.build_profile_json(profile, sign=False)
+    data = await ygg_backend_fixture.build_profile_json(profile, sign=False)
 
     assert data["id"] == "uuid1"
     assert data["name"] == "SlimGuy"
@@ -134,20 +135,22 @@ def test_build_profile_json_skin_slim_and_cape(ygg_backend_fixture):
     assert any(p["name"] == "uploadableTextures" for p in data["properties"])
 
 
-def test_build_profile_json_default_model_no_metadata(ygg_backend_fixture):
+@pytest.mark.asyncio
+async def test_build_profile_json_default_model_no_metadata(ygg_backend_fixture):
     """default 模型不带 metadata，无 cape 时不出现 CAPE"""
     profile = PlayerProfile("uuid2", "owner", "Plain", "default", "sh", None)
-    data = ygg_backend_fixture.build_profile_json(profile, sign=False)
+    data = await ygg_backend_fixture.build_profile_json(profile, sign=False)
     textures_prop = next(p for p in data["properties"] if p["name"] == "textures")
     decoded = json.loads(base64.b64decode(textures_prop["value"]).decode("utf-8"))
     assert "metadata" not in decoded["textures"]["SKIN"]
     assert "CAPE" not in decoded["textures"]
 
 
-def test_build_profile_json_sign_adds_signature(ygg_backend_fixture):
+@pytest.mark.asyncio
+async def test_build_profile_json_sign_adds_signature(ygg_backend_fixture):
     """sign=True 时 textures 属性附带 signature"""
     profile = PlayerProfile("uuid3", "owner", "Signed", "default", "sh", None)
-    data = ygg_backend_fixture.build_profile_json(profile, sign=True)
+    data = await ygg_backend_fixture.build_profile_json(profile, sign=True)
     textures_prop = next(p for p in data["properties"] if p["name"] == "textures")
     assert textures_prop.get("signature")
 
@@ -191,3 +194,54 @@ async def test_build_metadata_shape(ygg_backend_fixture, db_session):
     assert meta["meta"]["serverName"] == "My Ygg Station"
     assert isinstance(meta["skinDomains"], list)
     assert meta["signaturePublickey"]
+
+
+class _Config:
+    def __init__(self, values):
+        self.values = values
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+
+@pytest.mark.asyncio
+async def test_backend_served_textures_use_api_url(ygg_backend_fixture, db_session, monkeypatch):
+    """开启 textures.serve 后材质 URL 指向后端 API 地址，且其域名加入 skinDomains"""
+    monkeypatch.setattr(ygg_backend_fixture, "config", _Config({
+        "server.site_url": "https://skin.example.com",
+        "server.api_url": "https://api.example.net/skinapi",
+        "textures.serve.enabled": True,
+    }))
+    profile = PlayerProfile("uuid1", "owner", "Served", "default", "skinhash")
+    data = await ygg_backend_fixture.build_profile_json(profile)
+    decoded = json.loads(base64.b64decode(data["properties"][0]["value"]).decode("utf-8"))
+    assert decoded["textures"]["SKIN"]["url"] == "https://api.example.net/skinapi/static/textures/skinhash.png"
+
+    meta = await ygg_backend_fixture.build_metadata()
+    assert "api.example.net" in meta["skinDomains"]
+    assert "skin.example.com" in meta["skinDomains"]
+
+
+@pytest.mark.asyncio
+async def test_signed_textures_cached_until_profile_changes(ygg_backend_fixture, user_factory, db_session, monkeypatch):
+    """签名结果在新鲜期内复用；换皮肤后 UserModule 通知失效并重新签名"""
+    user = await user_factory()
+    await db_session.user.create_profile(PlayerProfile("cachedpid", user.id, "Cached", "default", "skin1"))
+
+    calls = []
+    original_sign = ygg_backend_fixture.crypto.sign_data
+    monkeypatch.setattr(ygg_backend_fixture.crypto, "sign_data", lambda data: calls.append(data) or original_sign(data))
+
+    profile = await db_session.user.get_profile_by_id("cachedpid")
+    first = await ygg_backend_fixture.build_profile_json(profile, sign=True)
+    second = await ygg_backend_fixture.build_profile_json(profile, sign=True)
+    assert first == second
+    assert len(calls) == 1
+
+    await db_session.user.update_profile_skin("cachedpid", "skin2")
+    assert ygg_backend_fixture.signed_properties.get(profile) is None
+    profile = await db_session.user.get_profile_by_id("cachedpid")
+    third = await ygg_backend_fixture.build_profile_json(profile, sign=True)
+    assert len(calls) == 2
+    decoded = json.loads(base64.b64decode(third["properties"][0]["value"]).decode("utf-8"))
+    assert decoded["textures"]["SKIN"]["url"].endswith("skin2.png")
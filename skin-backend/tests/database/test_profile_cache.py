@@ -0,0 +1,73 @@
+import time
+
+from database_module.profile_cache import ProfileCache
+from utils.typing import PlayerProfile
+
+
+def _profile(pid="p1", name="Steve"):
+    return PlayerProfile(pid, "u1", name)
+
+
+def test_lookup_by_id_and_name():
+    cache = ProfileCache()
+    assert cache.lookup_id("p1") == (False, None)
+    cache.fill_name("steve", _profile(), cache.generation)
+    hit, profile = cache.lookup_name("STEVE")
+    assert hit and profile.id == "p1"
+    hit, profile = cache.lookup_id("p1")
+    assert hit and profile.name == "Steve"
+
+    cache.fill_name("ghost", None, cache.generation)
+    cache.fill_id("nope", None, cache.generation)
+    assert cache.lookup_name("Ghost") == (True, None)
+    assert cache.lookup_id("nope") == (True, None)
+    stats = cache.stats()
+    assert stats["hits"] == 2 and stats["negative_hits"] == 2 and stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.8
+
+
+def test_invalidate_clears_old_and_new_names():
+    cache = ProfileCache()
+    cache.fill_name("Steve", _profile(), cache.generation)
+    cache.fill_name("Alex", None, cache.generation)
+    # 改名 Steve -> Alex
+    cache.invalidate("p1", "Alex")
+    assert cache.lookup_id("p1") == (False, None)
+    assert cache.lookup_name("Steve") == (False, None)
+    assert cache.lookup_name("Alex") == (False, None)
+
+
+def test_stale_name_entry_is_a_miss():
+    """名称项残留但 id 项已是新名称时不得返回改名前的角色"""
+    cache = ProfileCache()
+    cache.fill_name("Steve", _profile(), cache.generation)
+    cache.fill_id("p1", _profile(name="Renamed"), cache.generation)
+    assert cache.lookup_name("Steve") == (False, None)
+
+
+def test_fill_dropped_after_concurrent_invalidation():
+    cache = ProfileCache()
+    generation = cache.generation
+    cache.invalidate("p1")
+    cache.fill_id("p1", _profile(), generation)
+    assert cache.lookup_id("p1") == (False, None)
+
+
+def test_bounds_and_ttl():
+    cache = ProfileCache(max_entries=2)
+    for i in range(3):
+        cache.fill_id(f"p{i}", _profile(f"p{i}"), cache.generation)
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup_id("p0") == (False, None)
+
+    cache = ProfileCache(max_bytes=1000)
+    for i in range(10):
+        cache.fill_id(f"p{i}", _profile(f"p{i}"), cache.generation)
+    assert 0 < cache.stats()["bytes"] <= 1000
+
+    cache = ProfileCache(ttl_seconds=0.05, negative_ttl_seconds=0)
+    cache.fill_id("neg", None, cache.generation)
+    assert cache.stats()["entries"] == 0
+    cache.fill_id("p1", _profile(), cache.generation)
+    time.sleep(0.06)
+    assert cache.lookup_id("p1") == (False, None)
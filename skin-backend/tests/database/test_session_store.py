@@ -0,0 +1,54 @@
+import time
+
+from database_module.session_store import MemorySessionStore
+from utils.typing import Session
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+def test_put_get_delete():
+    store = MemorySessionStore()
+    store.put(Session("srv", "tok", "1.1.1.1", _now()))
+    assert store.get("srv").access_token == "tok"
+    assert store.get("missing") is None
+    store.delete("srv")
+    assert store.get("srv") is None
+    stats = store.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2
+    assert stats["backend"] == "memory" and stats["entries"] == 0
+
+
+def test_expired_session_not_returned():
+    store = MemorySessionStore(ttl_ms=50, tick_ms=10)
+    # 写入时已过期的会话直接丢弃
+    store.put(Session("stale", "tok", None, _now() - 1000))
+    assert store.stats()["entries"] == 0
+
+    store.put(Session("srv", "tok", None, _now()))
+    assert store.get("srv") is not None
+    time.sleep(0.08)
+    assert store.get("srv") is None
+    stats = store.stats()
+    assert stats["entries"] == 0 and stats["expired"] == 1
+
+
+def test_overwrite_keeps_latest_expiry():
+    store = MemorySessionStore(ttl_ms=50, tick_ms=10)
+    store.put(Session("srv", "tok", None, _now() - 40))
+    store.put(Session("srv", "tok2", None, _now()))
+    time.sleep(0.02)
+    # 旧刻度到期时不应删掉覆盖后的会话
+    assert store.get("srv").access_token == "tok2"
+
+
+def test_max_entries_evicts_oldest():
+    store = MemorySessionStore(max_entries=2)
+    now = _now()
+    for i in range(3):
+        store.put(Session(f"s{i}", "tok", None, now))
+    assert store.get("s0") is None
+    assert store.get("s1") is not None and store.get("s2") is not None
+    stats = store.stats()
+    assert stats["evicted"] == 1 and stats["entries"] == 2
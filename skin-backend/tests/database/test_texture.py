@@ -280,3 +280,54 @@ async def test_add_to_wardrobe_owner_recovers_private(db_session, user_factory):
     info = await db_session.texture.get_texture_info(owner.id, priv_hash, "skin")
     assert info is not None
     assert info["is_public"] == 1
+
+
+@pytest.mark.asyncio
+async def test_texture_fingerprint_lru_and_table(db_session):
+    """上传指纹：未命中 → 记录 → 内存命中；清空 LRU 后从指纹表回填"""
+    fp = "f" * 40
+    assert await db_session.texture.lookup_fingerprint(fp, "skin") is None
+
+    await db_session.texture.record_fingerprint(fp, "skin", "b" * 64)
+    assert await db_session.texture.lookup_fingerprint(fp, "skin") == "b" * 64
+    # 同一字节按不同类型校验结果不同，类型是键的一部分
+    assert await db_session.texture.lookup_fingerprint(fp, "cape") is None
+
+    db_session.texture.init()
+    assert await db_session.texture.lookup_fingerprint(fp, "skin") == "b" * 64
+
+    stats = db_session.texture.fingerprint_stats()
+    assert stats["memory_hits"] == 0
+    assert stats["db_hits"] == 1
+    assert stats["size"] == 1
+
+
+@pytest.mark.asyncio
+async def test_prune_fingerprints_keeps_live_and_recent(db_session, user_factory):
+    """只清除宽限期之前、且材质已无引用的指纹行"""
+    user = await user_factory()
+    await db_session.texture.add_to_library(user.id, "l" * 64, "skin")
+    await db_session.texture.record_fingerprint("1" * 40, "skin", "l" * 64)
+    await db_session.texture.record_fingerprint("2" * 40, "skin", "d" * 64)
+    await db_session.texture.record_fingerprint("3" * 40, "skin", "d" * 64)
+    await db_session.execute(
+        "UPDATE texture_fingerprints SET created_at = 0 WHERE fingerprint <> $1", "3" * 40
+    )
+
+    assert await db_session.texture.prune_fingerprints(1000) == 1
+    assert await db_session.texture.lookup_fingerprint("1" * 40, "skin") == "l" * 64
+    assert await db_session.texture.lookup_fingerprint("2" * 40, "skin") is None
+    assert await db_session.texture.lookup_fingerprint("3" * 40, "skin") == "d" * 64
+
+
+@pytest.mark.asyncio
+async def test_live_hashes_cover_all_references(db_session, user_factory):
+    """GC 标记阶段：库、衣柜、角色皮肤/披风、头像都算引用"""
+    user = await user_factory()
+    await db_session.texture.add_to_library(user.id, "l" * 64, "skin")
+    await db_session.user.update_avatar_hash(user.id, "v" * 64)
+
+    live = [h async for h in db_session.texture.iter_live_hashes(batch_size=1)]
+    assert sorted(live) == ["l" * 64, "v" * 64]
+    assert await db_session.texture.filter_live_hashes(["l" * 64, "x" * 64]) == {"l" * 64}
+    assert await db_session.texture.filter_live_hashes([]) == set()
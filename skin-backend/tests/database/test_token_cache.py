@@ -0,0 +1,64 @@
+import time
+
+from database_module.token_cache import TokenCache
+from utils.typing import Token
+
+
+def _token(access, user="u1", profile="p1"):
+    return Token(access, "client", user, profile, int(time.time() * 1000))
+
+
+def test_lookup_fill_and_negative():
+    cache = TokenCache()
+    assert cache.lookup("a") == (False, None)
+    cache.fill("a", _token("a"), cache.generation)
+    hit, token = cache.lookup("a")
+    assert hit and token.access_token == "a"
+
+    cache.fill("missing", None, cache.generation)
+    assert cache.lookup("missing") == (True, None)
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["negative_hits"] == 1 and stats["misses"] == 1
+
+
+def test_fill_dropped_after_concurrent_invalidation():
+    """查询进行中发生失效，旧结果不得写回"""
+    cache = TokenCache()
+    generation = cache.generation
+    cache.invalidate_token("a")
+    cache.fill("a", _token("a"), generation)
+    assert cache.lookup("a") == (False, None)
+
+
+def test_invalidate_by_user_and_profile():
+    cache = TokenCache()
+    cache.fill("a", _token("a", "u1", "p1"), cache.generation)
+    cache.fill("b", _token("b", "u1", "p2"), cache.generation)
+    cache.fill("c", _token("c", "u2", "p3"), cache.generation)
+
+    cache.invalidate_profile("p2")
+    assert cache.lookup("b") == (False, None)
+    assert cache.lookup("a")[0]
+
+    cache.invalidate_user("u1")
+    assert cache.lookup("a") == (False, None)
+    assert cache.lookup("c")[0]
+
+
+def test_ttl_and_bounds():
+    cache = TokenCache(max_entries=2, ttl_seconds=0.05, negative_ttl_seconds=0)
+    cache.fill("neg", None, cache.generation)
+    assert cache.lookup("neg") == (False, None)
+
+    for name in ("a", "b", "c"):
+        cache.fill(name, _token(name), cache.generation)
+    assert cache.stats()["entries"] == 2
+    assert cache.lookup("a") == (False, None)
+    time.sleep(0.06)
+    assert cache.lookup("c") == (False, None)
+
+
+def test_disabled():
+    cache = TokenCache(ttl_seconds=0)
+    cache.fill("a", _token("a"), cache.generation)
+    assert cache.stats()["entries"] == 0
@@ -490,3 +490,224 @@ async def test_create_user_with_profile_consumes_invite(db_session):
     assert inv.used_count == 1
     assert inv.used_by == "invited@test.com"
 
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["memory", "postgres"])
+async def test_join_session_and_joined_profile_single_query(db_session, user_factory, monkeypatch, backend):
+    """join_session 校验 token/角色归属后写入会话；get_joined_profile 一次查出角色与封禁时间"""
+    if backend == "postgres":
+        monkeypatch.setattr(db_session.user, "session_store", None)
+    user = await user_factory()
+    other = await user_factory()
+    await db_session.user.create_profile(PlayerProfile("jp1", user.id, "Joiner"))
+    await db_session.user.create_profile(PlayerProfile("jp2", other.id, "Other"))
+    now = int(time.time() * 1000)
+    await db_session.user.add_token(Token("tok-j", "client", user.id, "jp1", now))
+    await db_session.user.add_token(Token("tok-x", "client", user.id, "jp2", now))
+
+    assert await db_session.user.join_session(Session("srv", "tok-j", "1.1.1.1", now), "jp1")
+    # 重复 join 覆盖同一 serverId 而不是撞主键
+    assert await db_session.user.join_session(Session("srv", "tok-j", "2.2.2.2", now + 1), "jp1")
+    assert (await db_session.user.get_session("srv")).ip == "2.2.2.2"
+    # token 未绑定该角色 / 角色不属于 token 用户 / token 不存在
+    assert not await db_session.user.join_session(Session("srv2", "tok-j", None, now), "jp2")
+    assert not await db_session.user.join_session(Session("srv2", "tok-x", None, now), "jp2")
+    assert not await db_session.user.join_session(Session("srv2", "nope", None, now), "jp1")
+    assert await db_session.user.get_session("srv2") is None
+
+    profile, banned_until = await db_session.user.get_joined_profile("srv", "Joiner", now - 30000)
+    assert profile.id == "jp1" and banned_until is None
+    assert await db_session.user.get_joined_profile("srv", "Other", now - 30000) is None
+    assert await db_session.user.get_joined_profile("srv", "Joiner", now + 10) is None
+
+
+@pytest.mark.asyncio
+async def test_delete_expired_sessions_postgres(db_session, monkeypatch):
+    """Postgres 会话表按 created_at 清理过期行"""
+    monkeypatch.setattr(db_session.user, "session_store", None)
+    await db_session.user.add_session(Session("old", "t", None, 1000))
+    await db_session.user.add_session(Session("new", "t", None, 5000))
+    await db_session.user.delete_expired_sessions(2000)
+    assert await db_session.user.get_session("old") is None
+    assert await db_session.user.get_session("new") is not None
+
+
+@pytest.mark.asyncio
+async def test_token_cache_revocation_is_immediate(db_session, user_factory):
+    """token 缓存命中后，各删除路径必须让 get_token 立即返回 None"""
+    user = await user_factory()
+    await db_session.user.create_profile(PlayerProfile("tcp1", user.id, "Cached"))
+    now = int(time.time() * 1000)
+    user_mod = db_session.user
+
+    async def issue(access, profile_id=None, created_at=now):
+        await user_mod.add_token(Token(access, "client", user.id, profile_id, created_at))
+        # 两次读取：第二次来自缓存
+        assert (await user_mod.get_token(access)).access_token == access
+        assert (await user_mod.get_token(access)).access_token == access
+
+    # 负缓存：先查不存在的 token，写入后必须立刻可见
+    assert await user_mod.get_token("later") is None
+    assert await user_mod.get_token("later") is None
+    await issue("later")
+
+    await user_mod.delete_token("later")
+    assert await user_mod.get_token("later") is None
+
+    await issue("old")
+    assert await user_mod.rotate_token("old", Token("new", "client", user.id, None, now))
+    assert await user_mod.get_token("old") is None
+    assert (await user_mod.get_token("new")).access_token == "new"
+
+    await user_mod.delete_tokens_by_user(user.id)
+    assert await user_mod.get_token("new") is None
+
+    await issue("expired", created_at=now - 1000)
+    await user_mod.delete_expired_tokens(user.id, now)
+    assert await user_mod.get_token("expired") is None
+
+    for i in range(3):
+        await issue(f"s{i}", created_at=now + i)
+    await user_mod.delete_surplus_tokens(user.id, keep=1)
+    assert await user_mod.get_token("s0") is None
+    assert await user_mod.get_token("s2") is not None
+
+    await issue("bound", profile_id="tcp1")
+    await user_mod.delete_profile_cascade("tcp1")
+    assert await user_mod.get_token("bound") is None
+
+    assert user_mod.token_cache.stats()["hits"] > 0
+
+
+@pytest.mark.asyncio
+async def test_get_token_rejects_foreign_profile_binding(db_session, user_factory):
+    """token 绑定的角色不属于 token 用户时视同不存在（归属校验并入同一查询）"""
+    user = await user_factory()
+    other = await user_factory()
+    await db_session.user.create_profile(PlayerProfile("fp1", other.id, "Foreign"))
+    now = int(time.time() * 1000)
+    await db_session.user.add_token(Token("tok-f", "client", user.id, "fp1", now))
+    await db_session.user.add_token(Token("tok-n", "client", user.id, None, now))
+    assert await db_session.user.get_token("tok-f") is None
+    assert (await db_session.user.get_token("tok-n")).profile_id is None
+
+
+@pytest.mark.asyncio
+async def test_get_login_candidate_by_email_or_profile_name(db_session, user_factory):
+    """一次查询按邮箱或角色名解析登录账号，邮箱优先"""
+    user = await user_factory()
+    await db_session.user.create_profile(PlayerProfile("lc1", user.id, "LoginName"))
+
+    found, profile = await db_session.user.get_login_candidate(user.email)
+    assert found.id == user.id and found.password == user.password and profile is None
+
+    found, profile = await db_session.user.get_login_candidate("LoginName")
+    assert found.id == user.id
+    assert profile.id == "lc1" and profile.user_id == user.id
+
+    assert await db_session.user.get_login_candidate("nobody") is None
+
+
+@pytest.mark.asyncio
+async def test_issue_and_rotate_token_trim_in_one_statement(db_session, user_factory):
+    """issue_token / rotate_token 写入新 token 时同一语句裁掉过期与超额 token"""
+    user = await user_factory()
+    other = await user_factory()
+    user_mod = db_session.user
+    now = int(time.time() * 1000)
+    await user_mod.add_token(Token("expired", "c", user.id, None, now - 100000))
+    for i in range(4):
+        await user_mod.add_token(Token(f"t{i}", "c", user.id, None, now - 1000 + i))
+    await user_mod.add_token(Token("foreign", "c", other.id, None, now - 100000))
+
+    trimmed = await user_mod.issue_token(Token("fresh", "c", user.id, None, now), now - 50000, keep=3)
+    assert set(trimmed) == {"expired", "t0", "t1"}
+    assert await user_mod.get_token("t2") is not None
+    assert await user_mod.get_token("fresh") is not None
+    assert await user_mod.get_token("foreign") is not None
+
+    # 轮换：旧 token 不计入保留数
+    assert await user_mod.rotate_token("t3", Token("rotated", "c", user.id, None, now + 1), now - 50000, keep=2)
+    assert await user_mod.get_token("t3") is None
+    assert await user_mod.get_token("t2") is None
+    assert await user_mod.get_token("fresh") is not None
+    assert await user_mod.get_token("rotated") is not None
+
+    # 旧 token 已被消费：不写入、不裁剪
+    assert not await user_mod.rotate_token("t3", Token("again", "c", user.id, None, now + 2), now, keep=1)
+    assert await user_mod.get_token("again") is None
+    assert await user_mod.get_token("fresh") is not None
+
+
+@pytest.mark.asyncio
+async def test_search_profiles_by_names_case_insensitive(db_session, user_factory):
+    """批量解析大小写不敏感、按小写去重、结果按输入顺序；同名异大小写时优先精确匹配"""
+    user = await user_factory()
+    await db_session.user.create_profile(PlayerProfile("ci1", user.id, "Alpha"))
+    await db_session.user.create_profile(PlayerProfile("ci2", user.id, "beta"))
+    await db_session.user.create_profile(PlayerProfile("ci3", user.id, "BETA"))
+
+    results = await db_session.user.search_profiles_by_names(["beta", "ALPHA", "alpha", "ghost"])
+    assert [p.id for p in results] == ["ci2", "ci1"]
+    results = await db_session.user.search_profiles_by_names(["Beta", "BETA"])
+    assert [p.id for p in results] == ["ci3"]
+    results = await db_session.user.search_profiles_by_names(["alpha", "beta"], limit=1)
+    assert [p.id for p in results] == ["ci1"]
+
+
+@pytest.mark.asyncio
+async def test_search_profiles_by_names_non_ascii(db_session, user_factory):
+    """非 ASCII 名称：大小写折叠与 Postgres lower() 一致，匹配到的角色不会被丢弃"""
+    user = await user_factory()
+    await db_session.user.create_profile(PlayerProfile("na1", user.id, "Äpfel"))
+    await db_session.user.create_profile(PlayerProfile("na2", user.id, "İnci"))
+    await db_session.user.create_profile(PlayerProfile("na3", user.id, "玩家"))
+
+    results = await db_session.user.search_profiles_by_names(["玩家", "Äpfel", "ÄPFEL", "İnci"])
+    assert [p.id for p in results] == ["na3", "na1", "na2"]
+    results = await db_session.user.search_profiles_by_names(["İNCI"])
+    assert [p.id for p in results] == ["na2"]
+
+
+@pytest.mark.asyncio
+async def test_profile_lower_name_index_exists(db_session):
+    indexes = await db_session.fetch(
+        "SELECT indexname FROM pg_indexes WHERE tablename = 'profiles'"
+    )
+    assert "idx_profiles_lower_name" in {r[0] for r in indexes}
+
+
+@pytest.mark.asyncio
+async def test_profile_cache_invalidated_by_writes(db_session, user_factory):
+    """角色缓存命中后，创建 / 改名 / 材质与模型变更 / 删除都要立即可见"""
+    user = await user_factory()
+    user_mod = db_session.user
+
+    # 负缓存后创建
+    assert await user_mod.get_profile_by_name_cached("Cachy") is None
+    assert await user_mod.get_profile_by_name_cached("cachy") is None
+    await user_mod.create_profile(PlayerProfile("pc1", user.id, "Cachy"))
+    assert (await user_mod.get_profile_by_name_cached("CACHY")).id == "pc1"
+    assert (await user_mod.get_profile_by_id_cached("pc1")).name == "Cachy"
+
+    await user_mod.update_profile_skin("pc1", "skinhash")
+    assert (await user_mod.get_profile_by_id_cached("pc1")).skin_hash == "skinhash"
+
+    assert await user_mod.update_profile_name("pc1", "Renamed")
+    assert await user_mod.get_profile_by_name_cached("Cachy") is None
+    assert (await user_mod.get_profile_by_name_cached("renamed")).id == "pc1"
+
+    # 材质模块批量改写 texture_model 也要通知
+    await db_session.texture.update_model(user.id, "skinhash", "skin", "slim")
+    assert (await user_mod.get_profile_by_id_cached("pc1")).texture_model == "slim"
+
+    await user_mod.delete_profile_cascade("pc1")
+    assert await user_mod.get_profile_by_id_cached("pc1") is None
+    assert await user_mod.get_profile_by_name_cached("Renamed") is None
+
+    await user_mod.create_profile(PlayerProfile("pc2", user.id, "Gone"))
+    assert await user_mod.get_profile_by_id_cached("pc2") is not None
+    await user_mod.delete(user.id)
+    assert await user_mod.get_profile_by_id_cached("pc2") is None
+    assert user_mod.profile_cache.stats()["hits"] > 0
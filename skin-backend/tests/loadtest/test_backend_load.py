@@ -46,6 +46,8 @@ class StepSummary:
     statuses: dict[int, int]
     wall: float
     first_error: str = ""
+    pool_busy_avg: float = 0
+    pool_busy_max: int = 0
 
 
 @dataclass
@@ -139,7 +141,8 @@ async def test_real_backend_load():
                 f"fail_pct={summary.failure_pct:.2f} success_rps={summary.success_rps:.1f} "
                 f"total_rps={summary.rps:.1f} avg={format_duration(summary.avg)} "
                 f"p50={format_duration(summary.p50)} p95={format_duration(summary.p95)} "
-                f"p99={format_duration(summary.p99)} status={format_statuses(summary.statuses)}"
+                f"p99={format_duration(summary.p99)} status={format_statuses(summary.statuses)} "
+                f"pool_busy_avg={summary.pool_busy_avg:.1f} pool_busy_max={summary.pool_busy_max}"
             )
             if summary.first_error:
                 print(f"loadtest scenario={scenario.name} first_error={summary.first_error}")
@@ -337,6 +340,13 @@ def default_load_scenarios(seed: LoadSeed, user_cookie: str, admin_cookie: str)
         LoadScenario("Yggdrasil", "ygg-validate", "POST", "/authserver/validate", f'{{"accessToken":"{seed.ygg_access_token}","clientToken":"{seed.ygg_client_token}"}}'),
         LoadScenario("Yggdrasil", "ygg-profile", "GET", "/sessionserver/session/minecraft/profile/" + seed.profile_id),
         LoadScenario("Yggdrasil", "ygg-lookup-name", "GET", "/api/users/profiles/minecraft/" + seed.profile_name),
+        LoadScenario(
+            "Yggdrasil",
+            "ygg-join",
+            "POST",
+            "/sessionserver/session/minecraft/join",
+            f'{{"accessToken":"{seed.ygg_access_token}","selectedProfile":"{seed.profile_id}","serverId":"load_ygg_join_server"}}',
+        ),
         LoadScenario(
             "Yggdrasil",
             "ygg-has-joined",
@@ -396,10 +406,28 @@ async def run_step(base_url: str, scenario: LoadScenario, concurrency: int, dura
             async with lock:
                 results.extend(local_results)
 
+        pool_samples: list[int] = []
+        sampler = asyncio.create_task(sample_pool_occupancy(pool_samples))
         started = time.perf_counter()
-        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        try:
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+        finally:
+            sampler.cancel()
         wall = time.perf_counter() - started
-    return summarize(concurrency, results, wall)
+    summary = summarize(concurrency, results, wall)
+    if pool_samples:
+        summary.pool_busy_avg = sum(pool_samples) / len(pool_samples)
+        summary.pool_busy_max = max(pool_samples)
+    return summary
+
+
+async def sample_pool_occupancy(samples: list[int], interval: float = 0.005):
+    """周期采样数据库连接池中被借出的连接数（同进程内的服务端连接池）"""
+    while True:
+        pool = db._pool
+        if pool is not None:
+            samples.append(pool.get_size() - pool.get_idle_size())
+        await asyncio.sleep(interval)
 
 
 async def do_request(session: aiohttp.ClientSession, base_url: str, scenario: LoadScenario) -> tuple[int, float, str]:
@@ -547,8 +575,8 @@ async def write_load_test_report(path: Path, cfg: LoadConfig, concurrency: int,
             "",
             f"## Fixed-{concurrency} One-Second Results",
             "",
-            "| Area | Scenario | Concurrency | Requests | OK | Fail | Fail % | Successful req/s | Total req/s | Avg | P50 | P95 | P99 | Status | First Error |",
-            "| --- | --- | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: | --- | --- |",
+            "| Area | Scenario | Concurrency | Requests | OK | Fail | Fail % | Successful req/s | Total req/s | Avg | P50 | P95 | P99 | Pool Busy Avg | Pool Busy Max | Status | First Error |",
+            "| --- | --- | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: | ---: | --- | --- |",
         ]
     )
     for result in results:
@@ -558,6 +586,7 @@ async def write_load_test_report(path: Path, cfg: LoadConfig, concurrency: int,
             f"{summary.total} | {summary.success} | {summary.failed} | {summary.failure_pct:.2f} | "
             f"{summary.success_rps:.1f} | {summary.rps:.1f} | {format_duration(summary.avg)} | "
             f"{format_duration(summary.p50)} | {format_duration(summary.p95)} | {format_duration(summary.p99)} | "
+            f"{summary.pool_busy_avg:.1f} | {summary.pool_busy_max} | "
             f"`{format_statuses(summary.statuses)}` | `{escape_table(summary.first_error)}` |"
         )
 
@@ -570,6 +599,7 @@ async def write_load_test_report(path: Path, cfg: LoadConfig, concurrency: int,
             "- `Successful req/s` is the useful per-second throughput under that fixed concurrency.",
             "- This report covers public, site, admin, and common Yggdrasil client endpoints; destructive write endpoints are intentionally excluded from high-concurrency runs.",
             "- A failure is any request with a transport error or non-2xx/3xx response.",
+            "- `Pool Busy` samples the backend database pool every 5ms during the window: connections checked out at once (average and peak).",
             "- The test harness closes the local HTTP server, closes the database pool, terminates leftover database sessions, and drops the temporary PostgreSQL database during cleanup.",
         ]
     )
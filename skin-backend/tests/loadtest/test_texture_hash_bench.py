@@ -0,0 +1,67 @@
+"""材质 hash 吞吐基准：逐像素参考实现 vs 向量化实现，按分辨率输出 img/s。
+
+默认跳过；`BENCHMARK_ENABLE=1 pytest tests/loadtest/test_texture_hash_bench.py -q -s` 运行。
+"""
+
+import hashlib
+import os
+import random
+import struct
+import time
+
+import pytest
+from PIL import Image
+
+from utils.image_utils import compute_texture_hash_from_image
+
+
+RESOLUTIONS = [(64, 32), (64, 64), (128, 128), (256, 256), (512, 512), (1024, 1024)]
+
+
+def _per_pixel_hash(img: Image.Image) -> str:
+    width, height = img.size
+    buf = bytearray(width * height * 4 + 8)
+    struct.pack_into(">II", buf, 0, width, height)
+    pos = 8
+    pixels = img.load()
+    for x in range(width):
+        for y in range(height):
+            r, g, b, a = pixels[x, y]
+            if a == 0:
+                r = g = b = 0
+            buf[pos:pos + 4] = bytes((a, r, g, b))
+            pos += 4
+    return hashlib.sha256(buf).hexdigest()
+
+
+def _sample(width: int, height: int) -> Image.Image:
+    rng = random.Random(width * 10007 + height)
+    raw = bytes(rng.randrange(256) for _ in range(width * height * 4))
+    return Image.frombytes("RGBA", (width, height), raw)
+
+
+def _throughput(fn, img: Image.Image, min_seconds: float) -> float:
+    runs = 0
+    started = time.perf_counter()
+    while True:
+        fn(img)
+        runs += 1
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return runs / elapsed
+
+
+def test_texture_hash_throughput():
+    if os.getenv("BENCHMARK_ENABLE") != "1":
+        pytest.skip("set BENCHMARK_ENABLE=1 to run the texture hash benchmark")
+
+    min_seconds = float(os.getenv("BENCHMARK_MIN_SECONDS", "0.5"))
+    print()
+    print("| Resolution | Per-pixel img/s | Vectorized img/s | Speedup |")
+    print("| --- | ---: | ---: | ---: |")
+    for width, height in RESOLUTIONS:
+        img = _sample(width, height)
+        assert compute_texture_hash_from_image(img) == _per_pixel_hash(img)
+        before = _throughput(_per_pixel_hash, img, min_seconds)
+        after = _throughput(compute_texture_hash_from_image, img, min_seconds)
+        print(f"| {width}x{height} | {before:.1f} | {after:.1f} | {after / before:.1f}x |")
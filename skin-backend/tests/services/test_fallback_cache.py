@@ -0,0 +1,60 @@
+import time
+
+from services.fallback_cache import FallbackResponseCache
+
+
+def test_fill_and_lookup_with_endpoint_ttl():
+    cache = FallbackResponseCache()
+    cache.sync(1)
+    key = (1, "profile", "abc", True)
+
+    assert cache.lookup(key) == (False, None)
+    cache.fill(key, b'{"id":"abc"}', 60, cache.version)
+    assert cache.lookup(key) == (True, b'{"id":"abc"}')
+
+    # 端点 cache_ttl 为 0 不缓存
+    cache.fill((2, "profile", "abc", True), b"{}", 0, cache.version)
+    assert cache.lookup((2, "profile", "abc", True)) == (False, None)
+
+
+def test_negative_ttl_is_capped(monkeypatch):
+    cache = FallbackResponseCache(negative_ttl_seconds=5)
+    cache.sync(1)
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+    cache.fill((1, "name", "ghost"), None, 60, cache.version)
+    assert cache.lookup((1, "name", "ghost")) == (True, None)
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 6)
+    assert cache.lookup((1, "name", "ghost")) == (False, None)
+
+
+def test_version_change_flushes_and_drops_stale_fill():
+    cache = FallbackResponseCache()
+    cache.sync(1)
+    cache.fill((1, "name", "steve"), b"{}", 60, cache.version)
+    stale_version = cache.version
+
+    cache.sync(2)
+    assert cache.lookup((1, "name", "steve")) == (False, None)
+    assert cache.stats()["flushes"] == 1
+
+    # 配置变更前发起的请求，结果不再写回
+    cache.fill((1, "name", "alex"), b"{}", 60, stale_version)
+    assert cache.lookup((1, "name", "alex")) == (False, None)
+
+
+def test_bounded_by_entries_and_bytes():
+    cache = FallbackResponseCache(max_entries=2)
+    cache.sync(1)
+    for name in ("a", "b", "c"):
+        cache.fill((1, "name", name), b"{}", 60, cache.version)
+    assert cache.lookup((1, "name", "a")) == (False, None)
+    assert cache.stats()["entries"] == 2
+
+    cache = FallbackResponseCache(max_bytes=1000)
+    cache.sync(1)
+    cache.fill((1, "profile", "x", True), b"x" * 600, 60, cache.version)
+    cache.fill((1, "profile", "y", True), b"y" * 600, 60, cache.version)
+    assert cache.lookup((1, "profile", "x", True)) == (False, None)
+    assert cache.stats()["bytes"] <= 1000
@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import pytest
+
+from services.fallback_health import FallbackHealth
+
+
+def test_hedge_delay_defaults_until_enough_samples():
+    health = FallbackHealth(default_delay_ms=500, min_samples=5)
+    for _ in range(4):
+        health.observe(1, 100)
+    assert health.p95(1) is None
+    assert health.hedge_delay(1) == 0.5
+
+    health.observe(1, 100)
+    assert health.p95(1) == 100
+    assert health.hedge_delay(1) == 0.1
+
+
+def test_hedge_delay_follows_p95_within_bounds():
+    health = FallbackHealth(min_delay_ms=50, max_delay_ms=1000, min_samples=1)
+    for ms in range(1, 101):
+        health.observe("fast", ms * 0.1)
+        health.observe("slow", ms * 20)
+        health.observe("mid", ms * 4)
+    assert health.hedge_delay("fast") == 0.05
+    assert health.hedge_delay("slow") == 1.0
+    assert health.hedge_delay("mid") == pytest.approx(0.38)
+
+
+def test_stats_report_per_endpoint_latency():
+    health = FallbackHealth(min_samples=1)
+    health.observe(1, 10)
+    health.observe(1, 30)
+    health.record_hedge(1, True)
+    health.record_hedge(0, False)
+
+    stats = health.stats()
+    assert stats["hedged_requests"] == 2
+    assert stats["hedges_sent"] == 1
+    assert stats["hedge_wins"] == 1
+    assert stats["endpoints"]["1"]["samples"] == 2
+    assert stats["endpoints"]["1"]["latency_ms_p95"] == 30
+
+
+def test_breaker_opens_on_consecutive_failures_and_probes(monkeypatch):
+    health = FallbackHealth(consecutive_failures=3, open_seconds=30)
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+
+    for _ in range(3):
+        assert health.acquire(1)
+        health.record_failure(1, asyncio.TimeoutError())
+    assert health.snapshot()["1"]["state"] == "open"
+    assert health.snapshot()["1"]["timeouts"] == 3
+    assert not health.available(1)
+    assert health.order([{"id": 1}, {"id": 2}]) == [{"id": 2}]
+
+    # 冷却结束：只放行一个探测请求
+    now[0] += 31
+    assert health.available(1)
+    assert health.acquire(1)
+    assert health.snapshot()["1"]["state"] == "half_open"
+    assert not health.acquire(1)
+
+    # 探测失败重新断开，探测成功恢复
+    health.record_failure(1)
+    assert health.snapshot()["1"]["state"] == "open"
+    now[0] += 31
+    assert health.acquire(1)
+    health.observe(1, 20)
+    assert health.snapshot()["1"]["state"] == "closed"
+    assert health.acquire(1) and health.acquire(1)
+
+
+def test_breaker_opens_on_failure_rate():
+    health = FallbackHealth(window=10, min_requests=10, failure_rate=0.5, consecutive_failures=100)
+    for i in range(9):
+        if i % 2:
+            health.record_failure(1)
+        else:
+            health.observe(1, 10)
+    assert health.snapshot()["1"]["state"] == "closed"
+    health.record_failure(1)
+    assert health.snapshot()["1"]["state"] == "open"
+    assert health.stats()["trips"] == 1
+
+
+def test_lost_probe_expires(monkeypatch):
+    health = FallbackHealth(consecutive_failures=1, open_seconds=10, probe_timeout_seconds=5)
+    now = [0.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    health.record_failure(1)
+    now[0] = 11
+    assert health.acquire(1)
+    # 探测请求被取消，没有回报结果
+    now[0] = 14
+    assert not health.available(1)
+    now[0] = 17
+    assert health.acquire(1)
+
+
+def test_adaptive_order_by_latency_ewma():
+    health = FallbackHealth()
+    services = [{"id": 1}, {"id": 2}, {"id": 3}]
+    health.observe(1, 300)
+    health.observe(2, 50)
+    assert health.order(services) == services
+    # 尚无样本的端点排在最前，以便测得延迟
+    assert [s["id"] for s in health.order(services, adaptive=True)] == [3, 2, 1]
+
+
+def test_sync_resets_endpoints_on_version_change():
+    health = FallbackHealth(consecutive_failures=1, open_seconds=60)
+    health.sync(0)
+    health.observe(1, 10)
+    health.record_failure(2)
+    assert not health.available(2)
+
+    health.sync(0)
+    assert set(health.snapshot()) == {"1", "2"}
+
+    # 端点被删除或修改后，旧的熔断与延迟状态不再保留
+    health.sync(1)
+    assert health.snapshot() == {}
+    assert health.available(2)
+    assert health.stats()["resets"] == 1
+
+
+def test_release_returns_probe_slot():
+    health = FallbackHealth(consecutive_failures=1, open_seconds=0, probe_timeout_seconds=60)
+    health.record_failure(1)
+    assert health.acquire(1)
+    assert not health.available(1)
+
+    health.release(1)
+    assert health.available(1)
+    assert health.acquire(1)
+    health.observe(1, 10)
+    health.release(1)
+    assert health.snapshot()["1"]["state"] == "closed"
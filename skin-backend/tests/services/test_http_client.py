@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from services.http_client import OutboundHTTPClient
+
+
+@pytest.fixture
+async def upstream():
+    """本地上游：/slow 延迟应答，用于制造连接排队"""
+
+    async def ok(request):
+        return web.json_response({"ok": True})
+
+    async def slow(request):
+        await asyncio.sleep(0.1)
+        return web.json_response({"ok": True})
+
+    app = web.Application()
+    app.router.add_get("/ok", ok)
+    app.router.add_get("/slow", slow)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}"
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_shared_session_reuses_connections(upstream):
+    client = OutboundHTTPClient()
+    await client.start()
+    try:
+        for _ in range(3):
+            async with client.session() as session:
+                async with session.get(f"{upstream}/ok") as resp:
+                    assert resp.status == 200
+                    await resp.read()
+        stats = client.stats()
+        assert stats["started"] is True
+        assert stats["requests"] == 3
+        assert stats["connections_created"] == 1
+        assert stats["connections_reused"] == 2
+        assert stats["in_flight"] == 0
+    finally:
+        await client.close()
+    assert client.started is False
+
+
+@pytest.mark.asyncio
+async def test_per_host_limit_queues_requests(upstream):
+    client = OutboundHTTPClient(limit_per_host=1)
+    await client.start()
+    try:
+        async def fetch():
+            async with client.session() as session:
+                async with session.get(f"{upstream}/slow") as resp:
+                    return await resp.read()
+
+        await asyncio.gather(*(fetch() for _ in range(3)))
+        stats = client.stats()
+        assert stats["queued_total"] == 2
+        assert stats["queued"] == 0
+        assert stats["queue_wait_ms_p95"] > 0
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_cancelled_while_queued_is_not_counted(upstream):
+    client = OutboundHTTPClient(limit_per_host=1)
+    await client.start()
+    try:
+        async def fetch():
+            async with client.session() as session:
+                async with session.get(f"{upstream}/slow") as resp:
+                    return await resp.read()
+
+        first = asyncio.create_task(fetch())
+        await asyncio.sleep(0.02)
+        waiting = asyncio.create_task(fetch())
+        await asyncio.sleep(0.02)
+        assert client.stats()["queued"] == 1
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        await first
+        stats = client.stats()
+        assert stats["queued"] == 0
+        assert stats["in_flight"] == 0
+        assert stats["failed"] == 1
+    finally:
+        await client.close()
+
+
+@pytest.mark.asyncio
+async def test_unstarted_client_uses_temporary_session(upstream):
+    client = OutboundHTTPClient()
+    async with client.session() as session:
+        async with session.get(f"{upstream}/ok") as resp:
+            assert resp.status == 200
+    assert client.started is False
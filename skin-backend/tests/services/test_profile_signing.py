@@ -0,0 +1,110 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services import SignedPropertyCache, SigningBusy, SigningService
+from utils.typing import PlayerProfile
+
+
+def _profile(**overrides):
+    fields = dict(id="pid", user_id="uid", name="Steve", texture_model="default",
+                  skin_hash="skin", cape_hash=None)
+    fields.update(overrides)
+    return PlayerProfile(**fields)
+
+
+def test_hit_requires_matching_fingerprint():
+    cache = SignedPropertyCache()
+    cache.put(_profile(), "value")
+    assert cache.get(_profile()).value == "value"
+    assert cache.get(_profile(skin_hash="other")) is None
+    assert cache.get(_profile(name="Alex")) is None
+    assert cache.get(_profile(texture_model="slim")) is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = SignedPropertyCache(ttl_seconds=0.05)
+    cache.put(_profile(), "value")
+    time.sleep(0.06)
+    assert cache.get(_profile()) is None
+
+
+def test_zero_ttl_disables_caching():
+    cache = SignedPropertyCache(ttl_seconds=0)
+    assert cache.put(_profile(), "value").value == "value"
+    assert cache.stats()["entries"] == 0
+
+
+def test_lru_bound_and_invalidate():
+    cache = SignedPropertyCache(max_entries=2)
+    for pid in ("a", "b", "c"):
+        cache.put(_profile(id=pid), pid)
+    assert cache.get(_profile(id="a")) is None
+    cache.invalidate("b")
+    assert cache.get(_profile(id="b")) is None
+    assert cache.stats()["invalidations"] == 1
+
+
+# ========== 签名服务 ==========
+
+
+class _SlowCrypto:
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.calls = []
+        self.threads = set()
+
+    def sign_data(self, data):
+        self.calls.append(data)
+        self.threads.add(threading.get_ident())
+        time.sleep(self.delay)
+        if data == "boom":
+            raise ValueError("bad key")
+        return f"sig:{data}"
+
+
+@pytest.mark.asyncio
+async def test_sign_runs_off_loop_and_coalesces_duplicates():
+    crypto = _SlowCrypto()
+    signer = SigningService(crypto, max_workers=2)
+    results = await asyncio.gather(*(signer.sign(d) for d in ["a", "a", "b", "a"]))
+    assert results == ["sig:a", "sig:a", "sig:b", "sig:a"]
+    assert sorted(crypto.calls) == ["a", "b"]
+    assert threading.get_ident() not in crypto.threads
+    stats = signer.stats()
+    assert stats["signed"] == 2 and stats["coalesced"] == 2 and stats["pending"] == 0
+    signer.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_sign_micro_batches_concurrent_requests():
+    crypto = _SlowCrypto(delay=0)
+    signer = SigningService(crypto, max_workers=2, batch_size=4)
+    await asyncio.gather(*(signer.sign(str(i)) for i in range(16)))
+    assert signer.stats()["batches"] == 4
+    signer.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_sign_rejects_when_saturated():
+    signer = SigningService(_SlowCrypto(), max_workers=1, max_pending=2)
+    first = asyncio.gather(signer.sign("a"), signer.sign("b"))
+    await asyncio.sleep(0)
+    with pytest.raises(SigningBusy):
+        await signer.sign("c")
+    assert await first == ["sig:a", "sig:b"]
+    assert signer.stats()["rejected"] == 1
+    signer.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_sign_failure_propagates_per_payload():
+    signer = SigningService(_SlowCrypto(delay=0), max_workers=1)
+    ok, failed = await asyncio.gather(signer.sign("ok"), signer.sign("boom"), return_exceptions=True)
+    assert ok == "sig:ok"
+    assert isinstance(failed, ValueError)
+    assert signer.stats()["failed"] == 1
+    signer.shutdown()
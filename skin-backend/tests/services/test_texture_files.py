@@ -0,0 +1,110 @@
+import os
+import time
+from io import BytesIO
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from PIL import Image
+
+from routers import texture_routes
+from services import TextureFileCache, TextureStorage
+
+
+def _png_bytes(color=(10, 20, 30, 255)):
+    buf = BytesIO()
+    Image.new("RGBA", size=(64, 64), color=color).save(buf, "png")
+    return buf.getvalue()
+
+
+@pytest.fixture(scope="module")
+def served(tmp_path_factory):
+    """只构建一次路由（setup_routes 向模块级 router 注册）"""
+    storage = TextureStorage(str(tmp_path_factory.mktemp("served")))
+    cache = TextureFileCache(storage.textures_dir, revalidate_seconds=3600)
+    app = FastAPI()
+    app.include_router(texture_routes.setup_routes(cache))
+    return storage, cache, app
+
+
+@pytest.fixture
+async def client(served):
+    async with AsyncClient(transport=ASGITransport(app=served[2]), base_url="http://test") as c:
+        yield c
+
+
+def test_parse_name():
+    h = "a" * 64
+    assert TextureFileCache.parse_name(f"{h}.png") == (h, None)
+    assert TextureFileCache.parse_name(f"{h}.head.png") == (h, "head")
+    assert TextureFileCache.parse_name(f"{h}.feet.png") is None
+    assert TextureFileCache.parse_name("../secret.png") is None
+    assert TextureFileCache.parse_name(f"{h.upper()}.png") is None
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_skips_disk_and_revalidates(tmp_path):
+    storage = TextureStorage(str(tmp_path / "textures"))
+    tex_hash = storage.process_and_save(_png_bytes(), "skin")
+    cache = TextureFileCache(storage.textures_dir, revalidate_seconds=0.05)
+
+    entry = await cache.get(f"{tex_hash}.png")
+    assert entry.etag == f'"{tex_hash}"'
+    with open(storage.find_file(tex_hash), "rb") as f:
+        assert entry.data == f.read()
+    assert await cache.get(f"{tex_hash}.png") is entry
+    assert cache.stats()["hits"] == 1
+
+    storage.delete_file(tex_hash)
+    time.sleep(0.06)
+    assert await cache.get(f"{tex_hash}.png") is None
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_by_byte_budget(tmp_path):
+    storage = TextureStorage(str(tmp_path / "textures"))
+    hashes = [storage.process_and_save(_png_bytes((i, 0, 0, 255)), "skin") for i in range(3)]
+    size = os.path.getsize(storage.find_file(hashes[0]))
+    cache = TextureFileCache(storage.textures_dir, max_bytes=size * 2)
+    for h in hashes:
+        await cache.get(f"{h}.png")
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["cached_bytes"] <= size * 2
+
+
+@pytest.mark.asyncio
+async def test_large_file_served_from_disk(tmp_path):
+    storage = TextureStorage(str(tmp_path / "textures"))
+    tex_hash = storage.process_and_save(_png_bytes(), "skin")
+    cache = TextureFileCache(storage.textures_dir, max_file_bytes=0)
+    entry = await cache.get(f"{tex_hash}.png")
+    assert entry.data is None and entry.path == storage.find_file(tex_hash)
+
+
+@pytest.mark.asyncio
+async def test_serve_texture_with_conditional_get(served, client):
+    storage = served[0]
+    tex_hash = storage.process_and_save(_png_bytes((1, 2, 3, 255)), "skin")
+
+    resp = await client.get(f"/static/textures/{tex_hash}.png")
+    assert resp.status_code == 200
+    assert resp.headers["etag"] == f'"{tex_hash}"'
+    assert "immutable" in resp.headers["cache-control"]
+    assert resp.headers["content-type"] == "image/png"
+    assert Image.open(BytesIO(resp.content)).size == (64, 64)
+
+    resp = await client.get(f"/static/textures/{tex_hash}.png", headers={"If-None-Match": f'W/"{tex_hash}"'})
+    assert resp.status_code == 304
+    assert resp.content == b""
+    assert resp.headers["etag"] == f'"{tex_hash}"'
+
+    resp = await client.get(f"/static/textures/{tex_hash}.head.png")
+    assert resp.status_code == 200
+    assert resp.headers["etag"] == f'"{tex_hash}.head"'
+
+
+@pytest.mark.asyncio
+async def test_serve_texture_not_found(client):
+    assert (await client.get(f"/static/textures/{'0' * 64}.png")).status_code == 404
+    assert (await client.get("/static/textures/readme.txt")).status_code == 404
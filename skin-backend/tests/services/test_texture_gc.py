@@ -0,0 +1,133 @@
+import os
+import time
+
+import pytest
+
+from services import TextureGarbageCollector, TextureStorage
+from services.texture_gc import scan_texture_files
+from services.texture_storage import preview_relpath, texture_relpath
+from utils.typing import PlayerProfile
+
+
+OLD = time.time() - 3 * 86400
+
+
+def _h(ch: str) -> str:
+    return ch * 64
+
+
+def _place(storage: TextureStorage, texture_hash: str, old: bool = True, legacy: bool = False,
+           preview: str = None) -> str:
+    rel = f"{texture_hash}.png" if legacy else texture_relpath(texture_hash)
+    if preview:
+        rel = preview_relpath(texture_hash, preview)
+    path = os.path.join(storage.textures_dir, rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"png" * 10)
+    if old:
+        os.utime(path, (OLD, OLD))
+    return path
+
+
+@pytest.fixture
+def storage(tmp_path):
+    return TextureStorage(str(tmp_path / "textures"))
+
+
+def test_scan_ignores_young_and_foreign_files(storage):
+    _place(storage, _h("a"))
+    _place(storage, _h("b"), old=False)
+    _place(storage, _h("c"), legacy=True)
+    with open(os.path.join(storage.textures_dir, "README.txt"), "w") as f:
+        f.write("not a texture")
+
+    scan = scan_texture_files(storage.textures_dir, time.time() - 86400)
+    assert scan.scanned == 3
+    assert set(scan.candidates) == {_h("a"), _h("c")}
+    assert scan.stale_temps == []
+
+
+@pytest.mark.asyncio
+async def test_gc_deletes_only_old_orphans(db_session, user_factory, storage):
+    user = await user_factory()
+    await db_session.texture.add_to_library(user.id, _h("1"), "skin")
+    await db_session.user.create_profile(PlayerProfile("gcprofile", user.id, "GcRole", "default"))
+    await db_session.user.update_profile_cape("gcprofile", _h("2"))
+    await db_session.user.update_avatar_hash(user.id, _h("3"))
+
+    live = [_place(storage, _h(c)) for c in "123"]
+    orphan = _place(storage, _h("4"))
+    legacy_orphan = _place(storage, _h("5"), legacy=True)
+    young_orphan = _place(storage, _h("6"), old=False)
+    temp = os.path.join(storage.textures_dir, ".crashed.tmp")
+    with open(temp, "wb") as f:
+        f.write(b"partial")
+    os.utime(temp, (OLD, OLD))
+    await db_session.texture.record_fingerprint("4" * 40, "skin", _h("4"))
+    await db_session.texture.record_fingerprint("1" * 40, "skin", _h("1"))
+    await db_session.execute("UPDATE texture_fingerprints SET created_at = 0")
+
+    gc = TextureGarbageCollector(db_session, storage, grace_seconds=86400, batch_size=1, pause_seconds=0)
+
+    report = await gc.run(dry_run=True)
+    assert report["orphans"] == 2
+    assert sorted(report["sample"]) == [_h("4"), _h("5")]
+    assert report["deleted"] == 0
+    assert report["pruned_fingerprints"] == 0
+    assert os.path.exists(orphan) and os.path.exists(temp)
+
+    report = await gc.run()
+    assert report["deleted"] == 2
+    assert report["pruned_fingerprints"] == 1
+    assert await db_session.texture.lookup_fingerprint("4" * 40, "skin") is None
+    assert await db_session.texture.lookup_fingerprint("1" * 40, "skin") == _h("1")
+    assert report["reclaimed_bytes"] == 60
+    assert not os.path.exists(orphan)
+    assert not os.path.exists(legacy_orphan)
+    assert not os.path.exists(temp)
+    assert all(os.path.exists(p) for p in live)
+    assert os.path.exists(young_orphan)
+    assert gc.stats()["deleted"] == 2
+
+
+@pytest.mark.asyncio
+async def test_gc_spares_files_reused_after_scan(db_session, storage):
+    path = _place(storage, _h("7"))
+    gc = TextureGarbageCollector(db_session, storage, grace_seconds=86400, pause_seconds=0)
+
+    original_iter = db_session.texture.iter_live_hashes
+
+    async def _iter_and_reuse(batch_size):
+        # 标记阶段中该文件被一次重复上传复用（刷新 mtime）
+        os.utime(path, None)
+        async for h in original_iter(batch_size):
+            yield h
+
+    db_session.texture.iter_live_hashes = _iter_and_reuse
+    try:
+        report = await gc.run()
+    finally:
+        del db_session.texture.iter_live_hashes
+    assert report["orphans"] == 1
+    assert report["deleted"] == 0
+    assert os.path.exists(path)
+
+
+@pytest.mark.asyncio
+async def test_gc_removes_previews_with_orphans(db_session, user_factory, storage):
+    user = await user_factory()
+    await db_session.texture.add_to_library(user.id, _h("8"), "skin")
+    live = [_place(storage, _h("8")), _place(storage, _h("8"), preview="head")]
+    orphan = [_place(storage, _h("9")), _place(storage, _h("9"), preview="head"),
+              _place(storage, _h("9"), preview="body")]
+    dangling = _place(storage, _h("d"), preview="cape")
+
+    gc = TextureGarbageCollector(db_session, storage, grace_seconds=86400, pause_seconds=0)
+    report = await gc.run()
+    assert report["scanned_files"] == 2
+    assert report["deleted"] == 1
+    assert report["dangling_previews"] == 1
+    assert all(os.path.exists(p) for p in live)
+    assert not any(os.path.exists(p) for p in orphan)
+    assert not os.path.exists(dangling)
@@ -5,6 +5,7 @@ import pytest
 from PIL import Image
 
 from services import TextureStorage
+from services.texture_storage import texture_relpath
 
 
 def _png_bytes(width=64, height=64, color=(255, 0, 0, 255)):
@@ -30,8 +31,7 @@ def test_process_and_save_valid_skin_returns_hash_and_writes_file(storage):
     tex_hash = storage.process_and_save(_png_bytes(64, 64), "skin")
 
     assert isinstance(tex_hash, str) and len(tex_hash) == 64  # sha256 hex
-    saved = os.path.join(storage.textures_dir, f"{tex_hash}.png")
-    assert os.path.exists(saved)
+    assert storage.find_file(tex_hash) is not None
 
 
 def test_process_and_save_hash_is_stable_for_same_pixels(storage):
@@ -47,7 +47,7 @@ def test_process_and_save_hash_is_stable_for_same_pixels(storage):
 
 def test_process_and_save_valid_cape(storage):
     tex_hash = storage.process_and_save(_png_bytes(64, 32), "cape")
-    assert os.path.exists(os.path.join(storage.textures_dir, f"{tex_hash}.png"))
+    assert storage.find_file(tex_hash) is not None
 
 
 def test_process_and_save_invalid_skin_dimensions_raises(storage):
@@ -76,8 +76,8 @@ def test_process_and_save_jpeg_bytes_raises(storage):
 
 def test_delete_file_is_idempotent(storage):
     tex_hash = storage.process_and_save(_png_bytes(64, 64), "skin")
-    path = os.path.join(storage.textures_dir, f"{tex_hash}.png")
-    assert os.path.exists(path)
+    path = storage.find_file(tex_hash)
+    assert path is not None
 
     storage.delete_file(tex_hash)
     assert not os.path.exists(path)
@@ -111,6 +111,36 @@ async def test_process_and_save_async_matches_sync(storage):
     assert sync_hash == async_hash
 
 
+def test_process_and_save_tracked_reports_created(storage):
+    h1, created1 = storage.process_and_save_tracked(_png_bytes(64, 64, (1, 2, 3, 255)), "skin")
+    h2, created2 = storage.process_and_save_tracked(_png_bytes(64, 64, (1, 2, 3, 255)), "skin")
+    assert h1 == h2
+    assert created1 is True
+    assert created2 is False
+
+
+def test_process_and_save_tracked_skips_encode_when_file_exists(storage, monkeypatch):
+    png = _png_bytes(64, 64, (4, 5, 6, 255))
+    tex_hash, _ = storage.process_and_save_tracked(png, "skin")
+
+    import services.texture_storage as ts
+
+    def _fail(_img):
+        raise AssertionError("encode_png must not run for an existing texture")
+
+    monkeypatch.setattr(ts, "encode_png", _fail)
+    assert storage.process_and_save_tracked(png, "skin") == (tex_hash, False)
+
+
+@pytest.mark.asyncio
+async def test_process_and_save_async_tracked_reports_reuse(storage):
+    png = _png_bytes(64, 64, (9, 9, 9, 255))
+    first = await storage.process_and_save_async_tracked(png, "skin")
+    second = await storage.process_and_save_async_tracked(png, "skin")
+    assert first[1] is True
+    assert second == (first[0], False)
+
+
 class _FakeSetting:
     def __init__(self, value):
         self._value = value
@@ -134,3 +164,197 @@ async def test_assert_texture_size_enforced():
     # over the limit: raises
     with pytest.raises(ValueError):
         await assert_texture_size(db, b"x" * (2 * 1024))
+
+
+class _FakeFingerprints:
+    def __init__(self):
+        self.data = {}
+        self.forgotten = []
+
+    async def lookup_fingerprint(self, fingerprint, texture_type):
+        return self.data.get((fingerprint, texture_type))
+
+    async def record_fingerprint(self, fingerprint, texture_type, texture_hash):
+        self.data[(fingerprint, texture_type)] = texture_hash
+
+    def forget_fingerprint(self, fingerprint, texture_type):
+        self.forgotten.append((fingerprint, texture_type))
+        self.data.pop((fingerprint, texture_type), None)
+
+
+@pytest.mark.asyncio
+async def test_fingerprint_hit_skips_decoding(tmp_path, monkeypatch):
+    fingerprints = _FakeFingerprints()
+    storage = TextureStorage(str(tmp_path / "textures"), fingerprints=fingerprints)
+    png = _png_bytes(64, 64, (3, 1, 4, 255))
+    tex_hash, created = await storage.process_and_save_async_tracked(png, "skin")
+    assert created is True
+
+    import services.texture_storage as ts
+
+    def _fail(_bytes):
+        raise AssertionError("decode_png must not run on a fingerprint hit")
+
+    monkeypatch.setattr(ts, "decode_png", _fail)
+    assert await storage.process_and_save_async_tracked(png, "SKIN") == (tex_hash, False)
+
+
+@pytest.mark.asyncio
+async def test_fingerprint_hit_with_missing_file_reingests(tmp_path):
+    fingerprints = _FakeFingerprints()
+    storage = TextureStorage(str(tmp_path / "textures"), fingerprints=fingerprints)
+    png = _png_bytes(64, 64, (2, 7, 1, 255))
+    tex_hash, _ = await storage.process_and_save_async_tracked(png, "skin")
+    storage.delete_file(tex_hash)
+
+    assert await storage.process_and_save_async_tracked(png, "skin") == (tex_hash, True)
+    assert len(fingerprints.forgotten) == 1
+    assert storage.find_file(tex_hash) is not None
+
+
+# ========== 分片布局 ==========
+
+
+@pytest.fixture
+def sharded_storage(tmp_path):
+    return TextureStorage(str(tmp_path / "sharded"), layout="sharded")
+
+
+def test_texture_relpath_is_two_level_shard():
+    h = "abcdef" + "0" * 58
+    assert texture_relpath(h) == os.path.join("ab", "cd", f"{h}.png")
+
+
+def test_default_layout_writes_flat(storage):
+    # 未切换布局前新材质仍写平铺路径，旧 nginx 配置可直接访问
+    tex_hash = storage.process_and_save(_png_bytes(64, 64, (4, 4, 4, 255)), "skin")
+    assert storage.find_file(tex_hash) == os.path.join(storage.textures_dir, f"{tex_hash}.png")
+
+
+def test_sharded_layout_writes_shard(sharded_storage):
+    tex_hash = sharded_storage.process_and_save(_png_bytes(64, 64, (4, 4, 4, 255)), "skin")
+    assert sharded_storage.find_file(tex_hash) == os.path.join(
+        sharded_storage.textures_dir, texture_relpath(tex_hash)
+    )
+
+
+def test_unknown_layout_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        TextureStorage(str(tmp_path / "textures"), layout="nested")
+
+
+def test_write_leaves_no_temp_files(storage, sharded_storage):
+    for store in (storage, sharded_storage):
+        tex_hash = store.process_and_save(_png_bytes(64, 64, (5, 5, 5, 255)), "skin")
+        directory = os.path.dirname(store.find_file(tex_hash))
+        assert not [name for name in os.listdir(directory) if name.endswith(".tmp")]
+
+
+def test_legacy_flat_file_is_reused_and_deleted(sharded_storage):
+    storage = sharded_storage
+    png = _png_bytes(64, 64, (8, 8, 8, 255))
+    tex_hash = storage.process_and_save(png, "skin")
+    sharded = os.path.join(storage.textures_dir, texture_relpath(tex_hash))
+    legacy = os.path.join(storage.textures_dir, f"{tex_hash}.png")
+    os.replace(sharded, legacy)
+
+    # 过渡期：旧平铺文件可读，重复上传视为已存在
+    assert storage.find_file(tex_hash) == legacy
+    assert storage.process_and_save_tracked(png, "skin") == (tex_hash, False)
+    assert not os.path.exists(sharded)
+
+    storage.delete_file(tex_hash)
+    assert storage.find_file(tex_hash) is None
+
+
+def test_shard_legacy_texture_moves_file(storage):
+    from services.texture_storage import iter_legacy_textures, shard_legacy_texture
+
+    tex_hash = storage.process_and_save(_png_bytes(64, 64, (6, 6, 6, 255)), "skin")
+    sharded = os.path.join(storage.textures_dir, texture_relpath(tex_hash))
+    legacy = os.path.join(storage.textures_dir, f"{tex_hash}.png")
+    assert storage.find_file(tex_hash) == legacy
+
+    assert list(iter_legacy_textures(storage.textures_dir)) == [tex_hash]
+    assert shard_legacy_texture(storage.textures_dir, tex_hash) is True
+    assert os.path.exists(sharded) and not os.path.exists(legacy)
+    assert list(iter_legacy_textures(storage.textures_dir)) == []
+    assert shard_legacy_texture(storage.textures_dir, tex_hash) is False
+
+
+# ========== 预览图 ==========
+
+
+def test_ingest_writes_previews_and_delete_removes_them(storage):
+    from services.texture_storage import preview_relpath
+
+    tex_hash = storage.process_and_save(_png_bytes(64, 64, (9, 9, 9, 255)), "skin")
+    previews = [os.path.join(storage.textures_dir, preview_relpath(tex_hash, k)) for k in ("head", "body")]
+    assert all(os.path.exists(p) for p in previews)
+    assert not os.path.exists(os.path.join(storage.textures_dir, preview_relpath(tex_hash, "cape")))
+
+    storage.delete_file(tex_hash)
+    assert not any(os.path.exists(p) for p in previews)
+
+
+@pytest.mark.asyncio
+async def test_ensure_preview_regenerates_missing(storage):
+    from services.texture_storage import preview_relpath
+
+    tex_hash = storage.process_and_save(_png_bytes(64, 32, (3, 3, 3, 255)), "cape")
+    path = os.path.join(storage.textures_dir, preview_relpath(tex_hash, "cape"))
+    os.remove(path)
+
+    assert await storage.ensure_preview_async(tex_hash, "cape") == path
+    assert os.path.exists(path)
+    # 同一 64x32 像素也是合法的旧版皮肤
+    assert await storage.ensure_preview_async(tex_hash, "head") is not None
+    assert await storage.ensure_preview_async("0" * 64, "head") is None
+
+
+# ========== 重压缩 ==========
+
+
+def _noisy_png(compress_level: int) -> bytes:
+    import random
+
+    rng = random.Random(7)
+    img = Image.new("RGBA", (64, 64))
+    img.putdata([(rng.randrange(4), rng.randrange(4), 0, 255) for _ in range(64 * 64)])
+    buf = BytesIO()
+    img.save(buf, "png", compress_level=compress_level)
+    return buf.getvalue()
+
+
+def test_recompress_texture_keeps_hash_and_mtime(storage):
+    from services.texture_storage import recompress_texture
+
+    tex_hash = storage.process_and_save(_noisy_png(9), "skin")
+    path = storage.find_file(tex_hash)
+    with open(path, "wb") as f:
+        f.write(_noisy_png(0))
+    os.utime(path, (1000, 1000))
+    before_size = os.path.getsize(path)
+
+    assert recompress_texture(storage.textures_dir, tex_hash, dry_run=True)[0] == before_size
+    assert os.path.getsize(path) == before_size
+
+    before, after = recompress_texture(storage.textures_dir, tex_hash)
+    assert (before, after) == (before_size, os.path.getsize(path))
+    assert after < before
+    assert os.stat(path).st_mtime == 1000
+    with open(path, "rb") as f:
+        assert storage.process_and_save_tracked(f.read(), "skin") == (tex_hash, False)
+    # 已是最优编码：不再改写
+    assert recompress_texture(storage.textures_dir, tex_hash) == (after, after)
+
+
+def test_recompress_texture_rejects_hash_mismatch(storage):
+    from services.texture_storage import recompress_texture
+
+    tex_hash = storage.process_and_save(_png_bytes(64, 64, (1, 2, 3, 255)), "skin")
+    path = storage.find_file(tex_hash)
+    with open(path, "wb") as f:
+        f.write(_png_bytes(64, 64, (3, 2, 1, 255)))
+    with pytest.raises(ValueError):
+        recompress_texture(storage.textures_dir, tex_hash)
@@ -0,0 +1,181 @@
+import asyncio
+import concurrent.futures
+import concurrent.futures.process
+import os
+import threading
+import time
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from services import TextureStorage, TextureWorkerBusy, TextureWorkerPool
+from services.texture_storage import ingest_texture, texture_relpath
+
+
+def _png_bytes(width=64, height=64, color=(255, 0, 0, 255)):
+    buf = BytesIO()
+    Image.new("RGBA", size=(width, height), color=color).save(buf, "png")
+    return buf.getvalue()
+
+
+def _double(x):
+    return x * 2
+
+
+def _crash():
+    os._exit(1)
+
+
+@pytest.mark.asyncio
+async def test_thread_pool_runs_jobs_and_records_stats():
+    pool = TextureWorkerPool(mode="thread", max_workers=2, max_queue=4)
+    try:
+        results = await asyncio.gather(*(pool.submit(_double, i) for i in range(5)))
+        assert results == [0, 2, 4, 6, 8]
+        stats = pool.stats()
+        assert stats["mode"] == "thread"
+        assert stats["completed"] == 5
+        assert stats["running"] == 0
+        assert stats["queued"] == 0
+        assert stats["rejected"] == 0
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_saturated_pool_rejects_fast():
+    pool = TextureWorkerPool(mode="thread", max_workers=1, max_queue=1, retry_after=7)
+    gate = threading.Event()
+    try:
+        running = asyncio.ensure_future(pool.submit(gate.wait, 5))
+        queued = asyncio.ensure_future(pool.submit(_double, 1))
+        await asyncio.sleep(0.05)
+        assert pool.stats()["running"] == 1
+        assert pool.stats()["queued"] == 1
+
+        with pytest.raises(TextureWorkerBusy) as exc_info:
+            await pool.submit(_double, 2)
+        assert exc_info.value.retry_after == 7
+        assert pool.stats()["rejected"] == 1
+
+        gate.set()
+        assert await running is True
+        assert await queued == 2
+    finally:
+        gate.set()
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_job_timeout_raises_and_is_counted():
+    pool = TextureWorkerPool(mode="thread", max_workers=1, max_queue=0, timeout_seconds=0.05)
+    try:
+        with pytest.raises(TimeoutError):
+            await pool.submit(time.sleep, 0.5)
+        stats = pool.stats()
+        assert stats["timeouts"] == 1
+        assert stats["running"] == 0
+        # 超时后执行器被替换，后续任务仍可正常执行
+        pool.timeout_seconds = 5
+        assert await pool.submit(_double, 21) == 42
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_process_pool_runs_ingest(tmp_path):
+    pool = TextureWorkerPool(mode="process", max_workers=1, max_queue=2)
+    try:
+        texture_hash, created = await pool.submit(
+            ingest_texture, str(tmp_path), _png_bytes(64, 32), "cape", True
+        )
+        assert created is True
+        assert os.path.exists(tmp_path / texture_relpath(texture_hash))
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_storage_submits_through_pool(tmp_path):
+    pool = TextureWorkerPool(mode="thread", max_workers=1, max_queue=0)
+    storage = TextureStorage(str(tmp_path / "textures"), pool)
+    try:
+        first = await storage.process_and_save_async_tracked(_png_bytes(), "skin")
+        second = await storage.process_and_save_async_tracked(_png_bytes(), "skin")
+        assert first[1] is True
+        assert second == (first[0], False)
+        assert pool.stats()["completed"] == 2
+
+        with pytest.raises(ValueError):
+            await storage.process_and_save_async_tracked(b"not a png", "skin")
+        assert pool.stats()["failed"] == 1
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_storage_maps_timeout_to_value_error(tmp_path):
+    pool = TextureWorkerPool(mode="thread", max_workers=1, max_queue=0, timeout_seconds=0)
+    storage = TextureStorage(str(tmp_path / "textures"), pool)
+    try:
+        with pytest.raises(ValueError):
+            await storage.process_and_save_async_tracked(_png_bytes(), "skin")
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_timeout_recycle_does_not_spread_to_new_executor():
+    """一个任务超时终止工作进程：同批受牵连的任务得到可重试的 Busy，新执行器不受影响"""
+    pool = TextureWorkerPool(mode="process", max_workers=2, max_queue=2, timeout_seconds=1)
+    try:
+        # 预热：让两个工作进程都启动起来，避免首个任务的启动耗时算进超时
+        await asyncio.gather(pool.submit(time.sleep, 0.2), pool.submit(time.sleep, 0.2))
+        stuck = asyncio.ensure_future(pool.submit(time.sleep, 30))
+        await asyncio.sleep(0.5)
+        # 同伴任务在 stuck 超时（约 1 秒）时仍在执行，自身尚未超时
+        sibling = asyncio.ensure_future(pool.submit(time.sleep, 0.8))
+        with pytest.raises(TimeoutError):
+            await stuck
+        # 超时回收后立即提交的新任务落在新执行器上
+        fresh = asyncio.ensure_future(pool.submit(_double, 21))
+        with pytest.raises(TextureWorkerBusy):
+            await sibling
+        assert await fresh == 42
+        assert pool.stats()["timeouts"] == 1
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_crashed_worker_maps_to_value_error(tmp_path):
+    pool = TextureWorkerPool(mode="process", max_workers=1, max_queue=1)
+    try:
+        with pytest.raises(concurrent.futures.BrokenExecutor):
+            await pool.submit(_crash)
+        # 崩溃后换上新执行器，后续任务正常
+        assert await pool.submit(_double, 2) == 4
+    finally:
+        pool.shutdown()
+
+    class _BrokenWorkers:
+        async def submit(self, *args):
+            raise concurrent.futures.process.BrokenProcessPool("worker died")
+
+    storage = TextureStorage(str(tmp_path / "textures"), _BrokenWorkers())
+    with pytest.raises(ValueError):
+        await storage.process_and_save_async_tracked(_png_bytes(), "skin")
+
+
+def test_from_config_reads_worker_settings():
+    class _Config:
+        def get(self, key, default=None):
+            return {
+                "textures.workers.mode": "thread",
+                "textures.workers.max_workers": 3,
+                "textures.workers.max_queue": 5,
+            }.get(key, default)
+
+    pool = TextureWorkerPool.from_config(_Config())
+    assert (pool.mode, pool.max_workers, pool.max_queue) == ("thread", 3, 5)
@@ -0,0 +1,36 @@
+import json
+
+import pytest
+from starlette.responses import JSONResponse
+
+from utils import fast_json
+from utils.fast_json import FastJSONResponse, dumps
+
+
+SAMPLE = {
+    "id": "abc",
+    "name": "玩家",
+    "properties": [{"name": "textures", "value": "e30=", "signature": None}],
+    "count": 3,
+    "ok": True,
+}
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_dumps_matches_starlette_output(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(fast_json, "orjson", None)
+    body = dumps(SAMPLE)
+    assert json.loads(body) == SAMPLE
+    assert body == JSONResponse(SAMPLE).body
+    assert FastJSONResponse(SAMPLE).body == body
+
+
+def test_dumps_falls_back_for_non_str_keys():
+    assert json.loads(dumps({1: "a"})) == {"1": "a"}
+
+
+def test_dumps_rejects_unknown_objects():
+    with pytest.raises(TypeError):
+        dumps({"obj": object()})
+
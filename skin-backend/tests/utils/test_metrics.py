@@ -0,0 +1,23 @@
+from utils import metrics
+from utils.metrics import percentile
+
+
+def test_percentile_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 0.5) == 51
+    assert percentile(values, 0.95) == 95
+    assert percentile(values, 1.0) == 100
+    assert percentile([7], 0.95) == 7
+    assert percentile([], 0.95) == 0.0
+
+
+def test_snapshot_isolates_failing_source():
+    metrics.register("ok", lambda: {"n": 1})
+    metrics.register("broken", lambda: 1 / 0)
+    try:
+        result = metrics.snapshot()
+        assert result["ok"] == {"n": 1}
+        assert result["broken"] is None
+    finally:
+        metrics.unregister("ok")
+        metrics.unregister("broken")
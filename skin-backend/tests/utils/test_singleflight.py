@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from utils.singleflight import SingleFlight
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    flights = SingleFlight()
+    executions = 0
+
+    async def fetch():
+        nonlocal executions
+        executions += 1
+        await asyncio.sleep(0.05)
+        return executions
+
+    results = await asyncio.gather(*(flights.do("steve", fetch) for _ in range(10)))
+    assert results == [1] * 10
+    assert executions == 1
+
+    stats = flights.stats()
+    assert stats["calls"] == 10
+    assert stats["executions"] == 1
+    assert stats["coalesced"] == 9
+    assert stats["in_flight"] == 0
+
+    # 执行结束后不再合并
+    assert await flights.do("steve", fetch) == 2
+
+
+@pytest.mark.asyncio
+async def test_different_keys_run_separately():
+    flights = SingleFlight()
+
+    async def fetch(value):
+        await asyncio.sleep(0.01)
+        return value
+
+    results = await asyncio.gather(flights.do("a", lambda: fetch("a")), flights.do("b", lambda: fetch("b")))
+    assert results == ["a", "b"]
+    assert flights.stats()["executions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_exception_propagates_to_all_waiters():
+    flights = SingleFlight()
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(*(flights.do("k", boom) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert flights.stats()["failed"] == 1
+    assert flights.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_others():
+    flights = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    first = asyncio.create_task(flights.do("k", fetch))
+    second = asyncio.create_task(flights.do("k", fetch))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == "ok"
+    with pytest.raises(asyncio.CancelledError):
+        await first
@@ -0,0 +1,85 @@
+"""材质 hash 的差分测试：向量化实现必须与规范的逐像素参考实现逐字节一致"""
+
+import hashlib
+import random
+import struct
+
+import pytest
+from PIL import Image
+
+from utils.image_utils import compute_texture_hash_from_image
+
+
+def _reference_hash(img: Image.Image) -> str:
+    """规范原文的逐像素实现（旧版），作为差分基准。"""
+    width, height = img.size
+    buf = bytearray(width * height * 4 + 8)
+    struct.pack_into(">I", buf, 0, width)
+    struct.pack_into(">I", buf, 4, height)
+    pos = 8
+    pixels = img.load()
+    for x in range(width):
+        for y in range(height):
+            r, g, b, a = pixels[x, y]
+            if a == 0:
+                r = g = b = 0
+            buf[pos] = a
+            buf[pos + 1] = r
+            buf[pos + 2] = g
+            buf[pos + 3] = b
+            pos += 4
+    return hashlib.sha256(buf).hexdigest()
+
+
+def _random_image(width: int, height: int, seed: int, alpha_choices=None) -> Image.Image:
+    rng = random.Random(seed)
+    data = bytearray()
+    for _ in range(width * height):
+        a = rng.choice(alpha_choices) if alpha_choices else rng.randrange(256)
+        data += bytes((rng.randrange(256), rng.randrange(256), rng.randrange(256), a))
+    return Image.frombytes("RGBA", (width, height), bytes(data))
+
+
+# 覆盖：正方形/2:1 皮肤、披风、非对称尺寸（行列优先错位时必然不一致）、
+# 全透明、全不透明、混合 alpha 以及 alpha=0 但 RGB 非零的"脏透明"像素
+CORPUS = [
+    ("skin-64x64-mixed", lambda: _random_image(64, 64, 1)),
+    ("skin-64x32-legacy", lambda: _random_image(64, 32, 2)),
+    ("cape-22x17", lambda: _random_image(22, 17, 3)),
+    ("cape-64x32-binary-alpha", lambda: _random_image(64, 32, 4, alpha_choices=[0, 255])),
+    ("skin-128x128-dirty-transparent", lambda: _random_image(128, 128, 5, alpha_choices=[0])),
+    ("skin-64x64-opaque", lambda: _random_image(64, 64, 6, alpha_choices=[255])),
+    ("skin-64x64-edge-alpha", lambda: _random_image(64, 64, 7, alpha_choices=[0, 1, 254, 255])),
+    ("asym-3x5", lambda: _random_image(3, 5, 8)),
+    ("asym-1x7", lambda: _random_image(1, 7, 9)),
+    ("solid-color", lambda: Image.new("RGBA", (64, 64), (12, 34, 56, 78))),
+]
+
+
+@pytest.mark.parametrize("name,factory", CORPUS, ids=[c[0] for c in CORPUS])
+def test_vectorized_hash_matches_reference(name, factory):
+    img = factory()
+    assert compute_texture_hash_from_image(img) == _reference_hash(img)
+
+
+def test_vectorized_hash_matches_reference_hd():
+    img = _random_image(256, 256, 42, alpha_choices=[0, 128, 255])
+    assert compute_texture_hash_from_image(img) == _reference_hash(img)
+
+
+def test_hash_ignores_rgb_of_transparent_pixels():
+    a = Image.new("RGBA", (64, 32), (10, 20, 30, 0))
+    b = Image.new("RGBA", (64, 32), (200, 100, 50, 0))
+    assert compute_texture_hash_from_image(a) == compute_texture_hash_from_image(b)
+
+
+def test_hash_does_not_mutate_input():
+    img = _random_image(64, 64, 11, alpha_choices=[0, 255])
+    before = img.tobytes()
+    compute_texture_hash_from_image(img)
+    assert img.tobytes() == before
+
+
+def test_hash_converts_non_rgba_input():
+    rgb = Image.new("RGB", (64, 64), (1, 2, 3))
+    assert compute_texture_hash_from_image(rgb) == _reference_hash(rgb.convert("RGBA"))
@@ -0,0 +1,45 @@
+from PIL import Image
+
+from utils.texture_preview import render_preview
+
+
+def _skin(width=64, height=64):
+    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    unit = width // 64
+    # 脸部区域 (8,8)-(16,16) 填红色，帽子层左上角一个像素填蓝色
+    img.paste((255, 0, 0, 255), (8 * unit, 8 * unit, 16 * unit, 16 * unit))
+    img.paste((0, 0, 255, 255), (40 * unit, 8 * unit, 41 * unit, 9 * unit))
+    return img
+
+
+def test_head_preview_composites_hat_layer():
+    head = render_preview(_skin(), "head")
+    assert head.size == (64, 64)
+    assert head.getpixel((0, 0)) == (0, 0, 255, 255)
+    assert head.getpixel((63, 63)) == (255, 0, 0, 255)
+
+
+def test_head_preview_normalizes_hd_skins():
+    assert render_preview(_skin(128, 128), "head").size == (64, 64)
+
+
+def test_body_preview_sizes_for_both_layouts():
+    body = render_preview(_skin(64, 64), "body")
+    assert body.size == (64, 128)
+    # 头部位于画布顶部居中
+    assert body.getpixel((32, 28)) == (255, 0, 0, 255)
+    assert render_preview(_skin(64, 32), "body").size == (64, 128)
+
+
+def test_legacy_skin_mirrors_limbs():
+    img = _skin(64, 32)
+    img.paste((0, 255, 0, 255), (44, 20, 45, 32))  # 右臂正面最左一列
+    body = render_preview(img, "body")
+    assert body.getpixel((0, 40)) == (0, 255, 0, 255)
+    assert body.getpixel((63, 40)) == (0, 255, 0, 255)
+
+
+def test_cape_preview_supports_both_layouts():
+    assert render_preview(Image.new("RGBA", (64, 32)), "cape").size == (40, 64)
+    assert render_preview(Image.new("RGBA", (22, 17)), "cape").size == (40, 64)
+    assert render_preview(Image.new("RGBA", (44, 34)), "cape").size == (40, 64)
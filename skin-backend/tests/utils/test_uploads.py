@@ -0,0 +1,91 @@
+import struct
+from io import BytesIO
+
+import pytest
+from PIL import Image
+from starlette.datastructures import UploadFile
+
+from utils.uploads import UploadTooLarge, read_upload, sniff_png_header
+
+
+def _png(width=64, height=64) -> bytes:
+    buf = BytesIO()
+    Image.new("RGBA", (width, height), (0, 0, 0, 255)).save(buf, "png")
+    return buf.getvalue()
+
+
+def _upload(data: bytes) -> UploadFile:
+    return UploadFile(file=BytesIO(data), filename="skin.png")
+
+
+def test_sniff_png_header_reads_ihdr_dimensions():
+    assert sniff_png_header(_png(64, 32)[:24]) == (64, 32)
+
+
+@pytest.mark.parametrize("head", [
+    b"",
+    b"GIF89a" + b"\x00" * 30,
+    b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\x0dIDAT" + b"\x00" * 8,
+])
+def test_sniff_png_header_rejects_non_png(head):
+    with pytest.raises(ValueError):
+        sniff_png_header(head)
+
+
+def test_sniff_png_header_rejects_oversize_dimensions():
+    head = b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\x0dIHDR" + struct.pack(">II", 6400, 6400)
+    with pytest.raises(ValueError):
+        sniff_png_header(head)
+
+
+@pytest.mark.asyncio
+async def test_read_upload_returns_full_body():
+    data = _png()
+    assert await read_upload(_upload(data), max_bytes=len(data)) == data
+
+
+@pytest.mark.asyncio
+async def test_read_upload_stops_at_cap():
+    data = b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\x0dIHDR" + struct.pack(">II", 64, 64) + b"\x00" * (300 * 1024)
+    with pytest.raises(UploadTooLarge):
+        await read_upload(_upload(data), max_bytes=100 * 1024)
+
+
+@pytest.mark.asyncio
+async def test_read_upload_without_sniff_accepts_other_formats():
+    data = b"RIFF....WEBPVP8 " + b"\x00" * 100
+    assert await read_upload(_upload(data), max_bytes=1024, sniff_png=False) == data
+
+
+@pytest.mark.asyncio
+async def test_middleware_aborts_streamed_body_without_content_length():
+    from fastapi import FastAPI, Request
+    from httpx import ASGITransport, AsyncClient
+
+    from utils.uploads import UploadSizeLimitMiddleware
+
+    app = FastAPI()
+    consumed = []
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        async for chunk in request.stream():
+            consumed.append(len(chunk))
+        return {"ok": True}
+
+    async def _limit():
+        return 1024
+
+    app.add_middleware(UploadSizeLimitMiddleware, rules=[("POST", r"/upload$", _limit)])
+
+    async def _body():
+        for _ in range(100):
+            yield b"\x00" * 16 * 1024
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        resp = await client.post("/upload", content=_body())
+        assert resp.status_code == 413
+        assert sum(consumed) < 100 * 16 * 1024
+
+        resp = await client.post("/upload", content=b"small")
+        assert resp.status_code == 200
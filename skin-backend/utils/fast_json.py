@@ -0,0 +1,39 @@
+"""快速 JSON 响应。
+
+路由返回 dict 时，FastAPI 会先用 jsonable_encoder 递归复制一遍，再交给标准库 json
+编码；对 Yggdrasil 角色 JSON、名称查询、公共设置这类高频小响应，这部分开销占比可观。
+热路径直接返回 FastJSONResponse：跳过 jsonable_encoder，装有 orjson（可选依赖）时用它编码，
+否则退回标准库（紧凑分隔符）。
+
+内容只能包含 JSON 原生类型；含模型对象、datetime 等的响应仍应走 FastAPI 默认的编码路径。
+"""
+
+import json
+from typing import Any
+
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，未安装时使用标准库
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """编码为 UTF-8 JSON 字节，与 starlette JSONResponse 的输出格式一致（紧凑、不转义非 ASCII）。"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(content)
+        except TypeError:
+            # orjson 不支持的输入（如非字符串键、超 64 位整数）交给标准库
+            pass
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """跳过 jsonable_encoder 的 JSONResponse，由处理函数直接返回。"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,12 @@
+"""HTTP 条件请求辅助函数"""
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match 是否命中 etag（支持 *、逗号分隔列表与弱校验前缀 W/）"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
@@ -13,7 +13,7 @@ from typing import Tuple
 MAX_TEXTURE_DIMENSION = 1024
 
 # 解压炸弹防护：声明像素数超过此值的图在解码时即抛 DecompressionBombError，
-# 由 normalize_png 的 except 统一转成 ValueError。合法材质最多 1024*1024≈1M 像素，
+# 由 decode_png 的 except 统一转成 ValueError。合法材质最多 1024*1024≈1M 像素，
 # 这里留出充裕余量（4096*4096≈16M），既不会误伤正常材质，也能拦住超大炸弹图。
 Image.MAX_IMAGE_PIXELS = 4096 * 4096
 
@@ -44,6 +44,10 @@ def compute_texture_hash_from_image(img: Image.Image) -> str:
     实现规范中定义的特殊材质 Hash 算法：基于像素数据的SHA-256
     规范要求计算缓冲区 (width, height, pixels) 的 SHA-256，而非 PNG 文件字节
 
+    缓冲区布局：宽、高各 4 字节（Big-Endian），随后按列优先（外层 x、内层 y）
+    逐像素写入 ARGB，Alpha 为 0 的像素 RGB 置零。整个缓冲区在 PIL 的 C 层用
+    波段操作一次性构建，避免逐像素的 Python 循环（1024x1024 约百万次迭代）。
+
     Args:
         img: PIL Image 对象（RGBA模式）
 
@@ -51,42 +55,38 @@ def compute_texture_hash_from_image(img: Image.Image) -> str:
         str: 材质 hash（SHA-256 十六进制字符串）
     """
     width, height = img.size
-    # 缓冲区大小: w * h * 4 + 8
-    buf = bytearray(width * height * 4 + 8)
-
-    # 写入宽和高 (Big-Endian)
-    struct.pack_into(">I", buf, 0, width)
-    struct.pack_into(">I", buf, 4, height)
-
-    pos = 8
-    pixels = img.load()
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
 
-    for x in range(width):
-        for y in range(height):
-            r, g, b, a = pixels[x, y]
-            # 规范：若 Alpha 为 0，则 RGB 皆处理为 0
-            if a == 0:
-                r = g = b = 0
+    # 规范：若 Alpha 为 0，则 RGB 皆处理为 0。
+    # 以 alpha 二值化得到的蒙版做 composite：不透明处取原像素，透明处取全零像素。
+    # 完全不含透明像素的图（最小 alpha > 0）无需处理。
+    alpha = img.getchannel("A")
+    if alpha.getextrema()[0] == 0:
+        mask = alpha.point(lambda a: 255 if a else 0)
+        img = Image.composite(img, Image.new("RGBA", img.size, (0, 0, 0, 0)), mask)
 
-            # 写入 ARGB
-            buf[pos] = a
-            buf[pos + 1] = r
-            buf[pos + 2] = g
-            buf[pos + 3] = b
-            pos += 4
+    # 转置后按行输出即为原图的列优先顺序；重排波段得到 ARGB 字节序
+    r, g, b, a = img.transpose(Image.Transpose.TRANSPOSE).split()
+    pixels = Image.merge("RGBA", (a, r, g, b)).tobytes()
 
-    return hashlib.sha256(buf).hexdigest()
+    digest = hashlib.sha256(struct.pack(">II", width, height))
+    digest.update(pixels)
+    return digest.hexdigest()
 
 
-def normalize_png(image_bytes: bytes) -> Tuple[bytes, Image.Image]:
+def decode_png(image_bytes: bytes) -> Image.Image:
     """
-    规范化 PNG 图像，移除多余数据
+    解码 PNG 并转为 RGBA，不做重新编码
+
+    入库流水线先解码、校验、计算 hash，确认文件尚未落盘后才需要编码；
+    把解码与编码拆开，重复上传同一材质时就可以完全跳过 PNG 编码。
 
     Args:
         image_bytes: 原始 PNG 字节
 
     Returns:
-        Tuple[bytes, Image.Image]: (规范化后的字节, PIL Image对象)
+        Image.Image: RGBA 模式的 PIL Image 对象
 
     Raises:
         ValueError: 无效的图像数据
@@ -105,14 +105,48 @@ def normalize_png(image_bytes: bytes) -> Tuple[bytes, Image.Image]:
                 f"Image dimensions {w}x{h} exceed allowed maximum {MAX_TEXTURE_DIMENSION}"
             )
 
-        # 转为 RGBA 并重新保存，去除多余信息
-        img = img.convert("RGBA")
-        output = BytesIO()
-        img.save(output, format="PNG")
-        return output.getvalue(), img
+        # 转为 RGBA，去除调色板/多余信息
+        return img.convert("RGBA")
     except ValueError:
         # 已是规范化的拒绝原因，原样上抛（避免被下面的兜底包成嵌套消息）
         raise
     except Exception as e:
         # 包含 PIL.Image.DecompressionBombError 等：统一归一化为 ValueError
         raise ValueError(f"Failed to normalize PNG: {str(e)}")
+
+
+def encode_png(img: Image.Image, optimize: bool = False) -> bytes:
+    """
+    将已解码的图像重新编码为规范化的 PNG 字节（不携带原文件的附加块）
+
+    Args:
+        img: PIL Image 对象（RGBA模式）
+        optimize: 使用最高 zlib 压缩级别并多轮尝试，体积更小但编码明显更慢，
+            用于离线重压缩而非上传热路径
+
+    Returns:
+        bytes: PNG 字节
+    """
+    output = BytesIO()
+    if optimize:
+        img.save(output, format="PNG", optimize=True, compress_level=9)
+    else:
+        img.save(output, format="PNG")
+    return output.getvalue()
+
+
+def normalize_png(image_bytes: bytes) -> Tuple[bytes, Image.Image]:
+    """
+    规范化 PNG 图像，移除多余数据（decode_png + encode_png）
+
+    Args:
+        image_bytes: 原始 PNG 字节
+
+    Returns:
+        Tuple[bytes, Image.Image]: (规范化后的字节, PIL Image对象)
+
+    Raises:
+        ValueError: 无效的图像数据
+    """
+    img = decode_png(image_bytes)
+    return encode_png(img), img
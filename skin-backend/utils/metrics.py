@@ -0,0 +1,46 @@
+"""进程内运行指标登记处。
+
+各组件（材质工作池等）在启动时登记一个返回 dict 的快照函数，
+管理端点按名称汇总输出。单实例部署下无需引入外部监控组件。
+各组件的延迟分位数共用本模块的 percentile 与统计窗口大小。
+"""
+
+import logging
+from typing import Callable, Dict
+
+
+logger = logging.getLogger(__name__)
+
+_sources: Dict[str, Callable[[], dict]] = {}
+
+# 延迟统计窗口：各组件保留最近 N 次耗时计算分位数
+LATENCY_WINDOW = 512
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """已排序样本的 q 分位数（0 <= q <= 1，取最近秩）；无样本时返回 0。"""
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+
+def register(name: str, snapshot: Callable[[], dict]) -> None:
+    """登记（或覆盖）一个指标来源。"""
+    _sources[name] = snapshot
+
+
+def unregister(name: str) -> None:
+    _sources.pop(name, None)
+
+
+def snapshot() -> dict:
+    """汇总所有指标来源；单个来源出错不影响其余来源。"""
+    result = {}
+    for name, fn in list(_sources.items()):
+        try:
+            result[name] = fn()
+        except Exception:
+            logger.warning("metrics source %s failed", name, exc_info=True)
+            result[name] = None
+    return result
@@ -0,0 +1,50 @@
+"""进程内请求合并（singleflight）：相同 key 的并发调用共享同一次执行与结果。
+
+热门玩家名 / UUID 不在本站时，Tab 列表插件、群组服的多台服务器会同时发起相同的
+回退查询；不合并时每个请求各打一次上游，加入高峰里很容易被 Mojang 限流。
+第一个调用者为 key 启动执行任务，其后到达的调用者等待同一任务；任务结束即从表中移除，
+之后的调用重新执行（结果缓存由调用方负责）。
+
+执行任务独立于调用者：任一调用者被取消（客户端断开）不影响其它等待者，
+任务本身也会继续完成。异常同样传给所有等待者。
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class SingleFlight:
+    """按 key 合并进行中的异步调用。"""
+
+    def __init__(self):
+        self._inflight: dict = {}  # {key: Task}
+        self._stats = {"calls": 0, "executions": 0, "coalesced": 0, "failed": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """key 无进行中的执行时调用 fn() 并登记；否则等待已有执行的结果。"""
+        self._stats["calls"] += 1
+        task = self._inflight.get(key)
+        if task is not None:
+            self._stats["coalesced"] += 1
+        else:
+            self._stats["executions"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 取走异常：所有等待者都已取消时避免「未获取的异常」告警
+        if not task.cancelled() and task.exception() is not None:
+            self._stats["failed"] += 1
+
+    def stats(self) -> dict:
+        """调用 / 实际执行 / 合并次数与当前进行中的 key 数，供指标端点输出。"""
+        calls = self._stats["calls"]
+        return {
+            **self._stats,
+            "coalesce_ratio": round(self._stats["coalesced"] / calls, 4) if calls else 0.0,
+            "in_flight": len(self._inflight),
+        }
@@ -0,0 +1,99 @@
+"""材质预览图渲染：从皮肤/披风 UV 布局裁切拼合出小尺寸平面预览。
+
+列表页每张卡片只需要一张几 KB 的预览图，而不是完整材质。坐标均以 64 宽的
+标准布局给出，按实际宽度等比缩放（支持 HD 材质）；输出统一放大为固定尺寸，
+使用最近邻插值保持像素风格。
+
+身体预览按经典（4 像素宽手臂）模型拼合；slim 模型的手臂只有 3 像素宽，
+正面多出的一列来自手臂侧面，作为列表缩略图可以接受。
+"""
+
+from PIL import Image
+
+
+PREVIEW_KINDS = {
+    "skin": ("head", "body"),
+    "cape": ("cape",),
+}
+
+# 输出放大倍数（相对 64 宽标准布局的 1 像素）
+_HEAD_SCALE = 8     # 8x8 → 64x64
+_BODY_SCALE = 4     # 16x32 → 64x128
+_CAPE_SCALE = 4     # 10x16 → 40x64
+
+
+def _crop(img: Image.Image, unit: int, box: tuple[int, int, int, int]) -> Image.Image:
+    x0, y0, x1, y1 = box
+    return img.crop((x0 * unit, y0 * unit, x1 * unit, y1 * unit))
+
+
+def _paste(canvas: Image.Image, part: Image.Image, unit: int, x: int, y: int) -> None:
+    canvas.alpha_composite(part, (x * unit, y * unit))
+
+
+def _upscale(img: Image.Image, unit: int, scale: int) -> Image.Image:
+    w, h = img.size
+    return img.resize((w // unit * scale, h // unit * scale), Image.Resampling.NEAREST)
+
+
+def render_skin_head(img: Image.Image) -> Image.Image:
+    """头部正面 + 帽子层。"""
+    unit = img.width // 64
+    head = _crop(img, unit, (8, 8, 16, 16))
+    head.alpha_composite(_crop(img, unit, (40, 8, 48, 16)))
+    return _upscale(head, unit, _HEAD_SCALE)
+
+
+def render_skin_body(img: Image.Image) -> Image.Image:
+    """正面全身：头、躯干、双臂、双腿（64x64 布局含外层；64x32 旧布局左肢镜像右肢）。"""
+    unit = img.width // 64
+    legacy = img.height * 2 == img.width
+    canvas = Image.new("RGBA", (16 * unit, 32 * unit), (0, 0, 0, 0))
+
+    right_arm = _crop(img, unit, (44, 20, 48, 32))
+    right_leg = _crop(img, unit, (4, 20, 8, 32))
+    if legacy:
+        left_arm = right_arm.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+        left_leg = right_leg.transpose(Image.Transpose.FLIP_LEFT_RIGHT)
+    else:
+        left_arm = _crop(img, unit, (36, 52, 40, 64))
+        left_leg = _crop(img, unit, (20, 52, 24, 64))
+
+    # 观察者视角：角色右侧肢体在画面左侧
+    _paste(canvas, _crop(img, unit, (8, 8, 16, 16)), unit, 4, 0)
+    _paste(canvas, _crop(img, unit, (20, 20, 28, 32)), unit, 4, 8)
+    _paste(canvas, right_arm, unit, 0, 8)
+    _paste(canvas, left_arm, unit, 12, 8)
+    _paste(canvas, right_leg, unit, 4, 20)
+    _paste(canvas, left_leg, unit, 8, 20)
+
+    # 外层：帽子（两种布局都有）；夹克/袖子/裤腿仅 64x64 布局
+    _paste(canvas, _crop(img, unit, (40, 8, 48, 16)), unit, 4, 0)
+    if not legacy:
+        _paste(canvas, _crop(img, unit, (20, 36, 28, 48)), unit, 4, 8)
+        _paste(canvas, _crop(img, unit, (44, 36, 48, 48)), unit, 0, 8)
+        _paste(canvas, _crop(img, unit, (52, 52, 56, 64)), unit, 12, 8)
+        _paste(canvas, _crop(img, unit, (4, 36, 8, 48)), unit, 4, 20)
+        _paste(canvas, _crop(img, unit, (4, 52, 8, 64)), unit, 8, 20)
+
+    return _upscale(canvas, unit, _BODY_SCALE)
+
+
+def render_cape_front(img: Image.Image) -> Image.Image:
+    """披风正面（64x32 与 22x17 两种布局的正面区域坐标相同）。"""
+    unit = img.width // 22 if img.width * 17 == img.height * 22 else img.width // 64
+    return _upscale(_crop(img, unit, (1, 1, 11, 17)), unit, _CAPE_SCALE)
+
+
+_RENDERERS = {
+    "head": render_skin_head,
+    "body": render_skin_body,
+    "cape": render_cape_front,
+}
+
+
+def render_preview(img: Image.Image, kind: str) -> Image.Image:
+    """按预览类型渲染；img 须为已通过尺寸校验的 RGBA 材质。"""
+    if img.mode != "RGBA":
+        img = img.convert("RGBA")
+    return _RENDERERS[kind](img)
@@ -0,0 +1,141 @@
+"""上传体积控制：ASGI 层的请求体硬上限 + 带 PNG 头嗅探的分块读取。
+
+两层防护：
+1. UploadSizeLimitMiddleware：在 ASGI receive 层累计请求体字节，超过上限立即 413，
+   multipart 解析（会把文件整体缓冲到临时文件）还没读完就被打断，超大请求不会被完整接收。
+2. read_upload：从 UploadFile 分块读取，首块即校验 PNG 签名与 IHDR 尺寸，
+   非 PNG / 尺寸超限在读完前就拒绝；累计超过上限立即中断，避免整体 read() 进内存。
+"""
+
+import re
+import struct
+from typing import Awaitable, Callable, Optional
+
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+from utils.image_utils import MAX_TEXTURE_DIMENSION
+
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# 签名(8) + IHDR 长度(4) + 类型(4) + 宽(4) + 高(4)
+_PNG_HEADER_BYTES = 24
+_CHUNK_SIZE = 64 * 1024
+
+# multipart 边界、字段头与其它表单字段的余量：请求体上限 = 文件上限 + 此值
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLarge(ValueError):
+    """上传体积超过上限。"""
+
+
+def sniff_png_header(head: bytes) -> tuple[int, int]:
+    """校验 PNG 签名与 IHDR，返回 (width, height)；不合法抛 ValueError。
+
+    只看前 24 字节，无需解码，可在文件其余部分到达前就拒绝垃圾上传。
+    """
+    if len(head) < _PNG_HEADER_BYTES or not head.startswith(PNG_SIGNATURE):
+        raise ValueError("Image must be PNG format")
+    if head[12:16] != b"IHDR":
+        raise ValueError("Invalid PNG header")
+    width, height = struct.unpack(">II", head[16:24])
+    if width <= 0 or height <= 0 or width > MAX_TEXTURE_DIMENSION or height > MAX_TEXTURE_DIMENSION:
+        raise ValueError(
+            f"Image dimensions {width}x{height} exceed allowed maximum {MAX_TEXTURE_DIMENSION}"
+        )
+    return width, height
+
+
+async def read_upload(file: UploadFile, max_bytes: int, sniff_png: bool = True) -> bytes:
+    """分块读取上传文件，超过 max_bytes 抛 UploadTooLarge；sniff_png 时首块校验 PNG 头。"""
+    buf = bytearray()
+    sniffed = not sniff_png
+    while True:
+        chunk = await file.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        buf += chunk
+        if len(buf) > max_bytes:
+            raise UploadTooLarge("Texture file too large.")
+        if not sniffed and len(buf) >= _PNG_HEADER_BYTES:
+            sniff_png_header(bytes(buf[:_PNG_HEADER_BYTES]))
+            sniffed = True
+    if not sniffed:
+        # 文件比 PNG 头还短
+        sniff_png_header(bytes(buf))
+    return bytes(buf)
+
+
+class UploadSizeLimitMiddleware:
+    """按路径对请求体设硬上限的纯 ASGI 中间件。
+
+    rules: [(method, path_regex, limit_resolver)]，limit_resolver 为返回字节上限的
+    异步函数（可读取运行期设置）。path_regex 以 re.search 匹配 scope["path"]，
+    建议以 $ 结尾锚定，兼容 root_path 前缀。
+    Content-Length 超限直接 413；否则边接收边累计，超限时在 receive 中抛 413。
+    """
+
+    def __init__(self, app, rules: list[tuple[str, str, Callable[[], Awaitable[int]]]]):
+        self.app = app
+        self.rules = [(method.upper(), re.compile(pattern), resolver) for method, pattern, resolver in rules]
+
+    def _match(self, scope) -> Optional[Callable[[], Awaitable[int]]]:
+        method = scope.get("method", "")
+        path = scope.get("path", "")
+        for rule_method, pattern, resolver in self.rules:
+            if method == rule_method and pattern.search(path):
+                return resolver
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        resolver = self._match(scope)
+        if resolver is None:
+            await self.app(scope, receive, send)
+            return
+
+        limit = await resolver() + MULTIPART_OVERHEAD_BYTES
+        for name, value in scope.get("headers", []):
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = 0
+                if declared > limit:
+                    await self._reject(scope, receive, send)
+                    return
+                break
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI 的表单解析会原样上抛 HTTPException
+                    raise HTTPException(status_code=413, detail="Request body too large")
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except HTTPException as exc:
+            if exc.status_code != 413 or response_started:
+                raise
+            await self._reject(scope, receive, send)
+
+    @staticmethod
+    async def _reject(scope, receive, send):
+        response = JSONResponse(status_code=413, content={"detail": "Request body too large"})
+        await response(scope, receive, send)